@@ -207,6 +207,169 @@ def test_proof(session):
     )
 
 
+@nox.session(python=DEFAULT_PYTHON, name="test-manifest")
+def test_manifest(session):
+    """
+    Check that the build manifest rebuilds notebooks after a configuration change.
+
+    Builds tests/base twice, the second time with rst_epilog set, and fails
+    if a notebook was not rebuilt with the epilog.
+    """
+    session.install("-e", ".")
+    session.run("python", "tests/builds/manifest_config.py", *session.posargs)
+
+
+@nox.session(python=DEFAULT_PYTHON, name="test-incremental")
+def test_incremental(session):
+    """
+    Check the rebuilds of unchanged documents.
+
+    Rebuilds tests/base with the build manifest, compare-before-write and
+    the translation cache, and fails if a notebook is translated again or
+    rewritten when it should not be, or differs from the first build.
+    """
+    session.install("-e", ".")
+    session.run("python", "tests/builds/incremental.py", *session.posargs)
+
+
+@nox.session(python=DEFAULT_PYTHON, name="test-deterministic")
+def test_deterministic(session):
+    """
+    Check that tojupyter_deterministic gives byte-identical notebooks.
+
+    Builds two copies of tests/base with SOURCE_DATE_EPOCH set and compares
+    their notebooks, dates and cell ids.
+    """
+    session.install("-e", ".")
+    session.run("python", "tests/builds/deterministic.py", *session.posargs)
+
+
+@nox.session(python=DEFAULT_PYTHON, name="test-variants")
+def test_variants(session):
+    """
+    Check the urlpaths and solutions of the notebook variants.
+
+    Builds tests/base with download notebooks and a solutions variant, and
+    checks the links, images, solutions and tests of each notebook.
+    """
+    session.install("-e", ".")
+    session.run("python", "tests/builds/variants.py", *session.posargs)
+
+
+@nox.session(python=DEFAULT_PYTHON, name="test-markdown-buffer")
+def test_markdown_buffer(session):
+    """
+    Check the deferred indentation of the markdown buffer.
+
+    Compares MarkdownBuffer with a list of strings indented in place, on nested
+    and overlapping indents, `strip_last` under an open indent and random
+    sequences of operations.
+    """
+    session.install("-e", ".")
+    session.run("python", "tests/builds/markdown_buffer.py", *session.posargs)
+
+
+@nox.session(python=DEFAULT_PYTHON, name="test-image-caches")
+def test_image_caches(session):
+    """
+    Check where the image and translation caches are stored and that they are pruned.
+
+    Builds tests/glue with image optimization and the translation cache, and
+    again with the size limits of the stores set to 0.
+    """
+    session.install("-e", ".", "myst-nb", "ipykernel", "matplotlib", "pillow")
+    session.run("python", "tests/builds/image_caches.py", *session.posargs)
+
+
+@nox.session(python=DEFAULT_PYTHON, name="test-coalesce-markdown")
+def test_coalesce_markdown(session):
+    """
+    Check which markdown cells are merged by markdown coalescing.
+
+    Builds tests/coalesce_markdown with coalescing off, on and with a small
+    limit, and checks the cells around a code cell, a cell-break and in a
+    notebook with slides.
+    """
+    session.install("-e", ".")
+    session.run("python", "tests/builds/coalesce_markdown.py", *session.posargs)
+
+
+@nox.session(python=DEFAULT_PYTHON, name="test-image-attachments")
+def test_image_attachments(session):
+    """
+    Check the glued images stored as cell attachments.
+
+    Builds tests/glue with `tojupyter_image_embed = "attachments"`, with and
+    without markdown coalescing, and compares the attachments each cell
+    references with the images of a build that embeds data URIs.
+    """
+    session.install("-e", ".", "myst-nb", "ipykernel", "matplotlib")
+    session.run("python", "tests/builds/image_attachments.py", *session.posargs)
+
+
+@nox.session(python=DEFAULT_PYTHON, name="test-batch-execution")
+def test_batch_execution(session):
+    """
+    Check that batched execution gives the same outputs as executing cell by cell.
+
+    Builds tests/batch_execution with and without `:execute: batch` and
+    compares the executed notebooks, including a failing cell and the cells
+    that are not batched.
+    """
+    session.install("-e", ".", "ipykernel")
+    session.run("python", "tests/builds/batch_execution.py", *session.posargs)
+
+
+@nox.session(python=DEFAULT_PYTHON, name="test-book-index")
+def test_book_index(session):
+    """
+    Check the index notebook of a pdf book.
+
+    Builds tests/book_index, whose toctrees list `self`, external links and
+    the references document next to the chapters, and checks that only the
+    chapter documents are included.
+    """
+    session.install("-e", ".")
+    session.run("python", "tests/builds/book_index.py", *session.posargs)
+
+
+@nox.session(python=DEFAULT_PYTHON, name="benchmark-import")
+def benchmark_import(session):
+    """
+    Check that importing the extension stays fast.
+
+    Fails if dask, nbconvert, nbclient, nbformat or yaml are imported when
+    the extension is loaded, or if the median import time regresses.
+    """
+    session.install("-e", ".")
+    session.run("python", "tests/benchmarks/import_time.py", *session.posargs)
+
+
+@nox.session(python=DEFAULT_PYTHON, name="benchmark-nested-lists")
+def benchmark_nested_lists(session):
+    """
+    Check that translating deeply nested lists scales linearly.
+
+    Fails if doubling the nesting depth of a list document multiplies
+    the translation time by more than the allowed ratio.
+    """
+    session.install("-e", ".")
+    session.run("python", "tests/benchmarks/nested_lists.py", *session.posargs)
+
+
+@nox.session(python=DEFAULT_PYTHON, name="benchmark-book-index")
+def benchmark_book_index(session):
+    """
+    Check that translating the index of a pdf book scales linearly.
+
+    Fails if the index notebook does not list the parts and chapters of
+    the book, or if doubling the chapters multiplies the translation time
+    by more than the allowed ratio.
+    """
+    session.install("-e", ".")
+    session.run("python", "tests/benchmarks/book_index.py", *session.posargs)
+
+
 @nox.session(python=DEFAULT_PYTHON)
 def docs(session):
     """Build documentation."""
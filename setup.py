@@ -52,6 +52,9 @@ setup(
         'nbdime',
     ],
     extras_require={
+        'images': [
+            'pillow',
+        ],
         'test': [
             'nox>=2024.3.2',
             'pytest>=7.0',
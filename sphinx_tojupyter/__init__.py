@@ -1,10 +1,3 @@
-import yaml
-
-try:
-    yaml.warnings({'YAMLLoadWarning': False})  # not all versions of YAML support this
-except AttributeError:
-    pass
-
 from .builders.jupyter import JupyterBuilder
 from .builders.jupyterpdf import JupyterPDFBuilder
 from .directive.jupyter import jupyter_node
@@ -95,6 +88,7 @@ def setup(app):
     app.add_config_value("tojupyter_download_nb", False, "jupyter")
     app.add_config_value("tojupyter_download_nb_urlpath", None, "jupyter")
     app.add_config_value("tojupyter_download_nb_image_urlpath", None, "jupyter")
+    app.add_config_value("tojupyter_notebook_variants", {}, "jupyter")
     app.add_config_value("tojupyter_images_markdown", True, "jupyter")
     app.add_config_value("tojupyter_urlpath", None, "jupyter")
     app.add_config_value("tojupyter_image_urlpath", None, "jupyter")
@@ -102,6 +96,23 @@ def setup(app):
     app.add_config_value("tojupyter_glue_images_urlpath", None, "jupyter")  # Alternative name for clarity
     app.add_config_value("tojupyter_latex_macros", None, "jupyter")  # LaTeX macros for MathJax
     app.add_config_value("tojuyter_drop_html_raw", True, "jupyter")
+    app.add_config_value("tojupyter_build_manifest", True, "jupyter")
+    app.add_config_value("tojupyter_compare_before_write", True, "jupyter")
+    app.add_config_value("tojupyter_deterministic", False, "jupyter")
+    app.add_config_value("tojupyter_write_threads", 0, "jupyter")
+    app.add_config_value("tojupyter_nb_serialization", {"validation": "strict", "compact": False}, "jupyter")
+    app.add_config_value("tojupyter_profile", False, "jupyter")
+    app.add_config_value("tojupyter_debug_translator", False, "jupyter")
+    app.add_config_value("tojupyter_image_cache", True, "jupyter")
+    app.add_config_value("tojupyter_image_embed", "data-uri", "jupyter")
+    app.add_config_value("tojupyter_image_optimization", {}, "jupyter")
+    app.add_config_value("tojupyter_coalesce_markdown", False, "jupyter")
+    app.add_config_value("tojupyter_coalesce_markdown_limit", 5000, "jupyter")
+    app.add_config_value("tojupyter_image_cache_memory", 64, "jupyter")
+    app.add_config_value("tojupyter_image_cache_size", 256, "jupyter")
+    app.add_config_value("tojupyter_translation_cache", False, "jupyter")
+    app.add_config_value("tojupyter_translation_cache_size", 256, "jupyter")
+    app.add_config_value("tojupyter_enumerable_directives", {}, "jupyter")
 
     # Jupyter pdf options
     app.add_config_value("tojupyter_latex_template", None, "jupyter")
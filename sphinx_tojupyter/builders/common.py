@@ -0,0 +1,228 @@
+import copy
+import os
+import os.path
+import pickle
+import shutil
+import tempfile
+import time
+from urllib.parse import quote
+
+from sphinx.util.console import bold
+from sphinx.util.osutil import os_path
+from ..writers.utils import deterministic_cell_ids, source_date_epoch
+from ..writers.manifest import BuildManifest
+from ..writers.profile import BuildProfiler
+from ..writers.image_cache import ImageCache
+from ..writers.images import ImagePipeline
+from ..writers.translation_cache import TranslationCache
+
+
+class NotebookBuilderMixin():
+    """
+    Build steps shared by the builders that write notebooks (``jupyter`` and ``jupyterpdf``):
+    the build manifest, the caches, the profiler and the split of the write phase into
+    ``translate_doc`` (forked writers) and ``merge_doc`` (main process).
+
+    Sphinx runs the write phase; with ``sphinx-build -j N`` the forked writers save the
+    results of ``translate_doc`` to a spool directory, and they are merged once all the
+    writers are done.
+
+    Builders implement ``translate_notebooks``, which returns the notebooks of a document
+    by variant name, and ``write_notebooks``, which writes and executes them.
+    """
+
+    def init_notebook_build(self):
+        from ..writers.write_nb import NotebookFileWriter
+
+        # fingerprints of the written notebooks, used to skip documents whose inputs did not change
+        self.manifest = None
+        self.unchanged_docs = 0
+        self.updated_docnames = set()
+        self.write_method = None
+        ## documents whose code cells are executed in batches (`:execute: batch`)
+        self.batch_docs = set()
+        self._main_pid = os.getpid()
+        if self.config["tojupyter_build_manifest"]:
+            self.manifest = BuildManifest(self)
+        self._write_notebook_class = NotebookFileWriter(self)
+        self.profiler = BuildProfiler(self.config["tojupyter_profile"])
+        ## base64 encodings of the images embedded in the notebooks, reused across documents and builds
+        self.image_cache = None
+        if self.config["tojupyter_image_cache"]:
+            self.image_cache = ImageCache(self.doctreedir, self.config["tojupyter_image_cache_memory"] * 1024 * 1024,
+                                          self.config["tojupyter_image_cache_size"] * 1024 * 1024)
+        self.image_pipeline = ImagePipeline(self.config, self.doctreedir, self.image_cache)
+        ## notebooks translated by earlier builds, shared by the builders of the build directory
+        self.translation_cache = None
+        self.cached_translations = 0
+        if self.config["tojupyter_translation_cache"]:
+            self.translation_cache = TranslationCache(self.doctreedir, self.config["tojupyter_translation_cache_size"] * 1024 * 1024)
+        self.dispatch_stats = None
+        if self.config["tojupyter_debug_translator"]:
+            from ..writers.translate_code import DispatchStats
+            self.dispatch_stats = DispatchStats()
+
+        # reproducible output: content derived cell ids and a fixed build date
+        self.build_date = None
+        if self.config["tojupyter_deterministic"]:
+            self.build_date = source_date_epoch(self.srcdir)
+            if self.build_date is None:
+                self.logger.warning("tojupyter_deterministic is set but neither SOURCE_DATE_EPOCH nor a git commit time is available; notebook dates will vary between builds")
+
+    def targets_exist(self, docname):
+        """Check that the notebook produced for `docname` is present in the build directory"""
+        return os.path.exists(os.path.join(self.outdir, os_path(docname) + self.out_suffix))
+
+    def get_outdated_docs(self):
+        for docname in self.env.found_docs:
+            if docname not in self.env.all_docs:
+                yield docname
+                continue
+            if self.manifest is not None:
+                if not self.targets_exist(docname) or self.manifest.is_outdated(docname):
+                    yield docname
+                continue
+            targetname = os.path.join(self.outdir, os_path(docname) + self.out_suffix)
+            try:
+                targetmtime = os.path.getmtime(targetname)
+            except OSError:
+                targetmtime = 0
+            try:
+                srcmtime = os.path.getmtime(self.env.doc2path(docname))
+                if srcmtime > targetmtime:
+                    yield docname
+            except EnvironmentError:
+                pass
+
+    def get_target_uri(self, docname, typ=None):
+        return docname
+
+    def prepare_writing(self, docnames):
+        from ..writers.context import TranslationContext
+        self.translation_context = TranslationContext(self.config)
+        self.writer = self._writer_class(self)
+
+    def write(self, build_docnames, updated_docnames, method="update"):
+        ## documents re-read by sphinx are always translated again: their doctree may depend
+        ## on inputs the manifest does not know about, and `sphinx-build -a` rebuilds everything
+        self.updated_docnames = set(updated_docnames)
+        self.write_method = method
+        self._spooldir = tempfile.mkdtemp(prefix="tojupyter-")
+        try:
+            super().write(build_docnames, updated_docnames, method)
+            self.merge_spooled()
+        finally:
+            shutil.rmtree(self._spooldir, ignore_errors=True)
+
+    def write_doc(self, docname, doctree):
+        result = self.translate_doc(docname, doctree)
+        if os.getpid() == self._main_pid:
+            self.merge_doc(result)
+            return
+        ## forked writer: the client, manifest and counters are only used by the main process
+        filename = os.path.join(self._spooldir, quote(docname, safe="") + ".pickle")
+        with open(filename, "wb") as f:
+            pickle.dump((result, self.profiler.take_events()), f, pickle.HIGHEST_PROTOCOL)
+
+    def merge_spooled(self):
+        """Merge the documents translated by the forked writers, in the order of their names"""
+        for name in sorted(os.listdir(self._spooldir)):
+            with open(os.path.join(self._spooldir, name), "rb") as f:
+                result, events = pickle.load(f)
+            self.profiler.add_events(events)
+            self.merge_doc(result)
+
+    def translate_doc(self, docname, doctree):
+        """
+        Translate `docname` into its notebooks without changing any builder state, so that
+        it can run in the forked writers of ``sphinx-build -j N``.
+
+        Returns the result handed to `merge_doc` in the main process.
+        """
+        result = {
+            "docname": docname,
+            "unchanged": False,
+            "notebooks": {},
+        }
+        if self.manifest is not None:
+            with self.profiler.stage(docname, "fingerprint"):
+                result["dependencies"] = self.manifest.find_dependencies(doctree)
+                result["fingerprint"] = self.manifest.fingerprint(docname, result["dependencies"])
+            if self.write_method != "all" and docname not in self.updated_docnames \
+                    and self.targets_exist(docname) and not self.manifest.is_outdated(docname, result["fingerprint"]):
+                ## written although its inputs are unchanged, e.g. when named on the command line
+                result["unchanged"] = True
+                return result
+
+        # the translators do not modify the doctree, so no copy is needed
+        with self.profiler.stage(docname, "translate"):
+            notebooks = self.translate_notebooks(doctree, docname)
+            for name, nb in notebooks.items():
+                result["notebooks"][name] = self.update_Metadata(docname, nb)
+        result["dispatch_stats"] = self.writer.dispatch_stats
+        result["cached"] = self.writer.cached
+        return result
+
+    def merge_doc(self, result):
+        """
+        Write the notebooks translated by `translate_doc`, schedule their execution
+        and record them in the build manifest. Always runs in the main process.
+        """
+        if result["unchanged"]:
+            self.unchanged_docs += 1
+            return
+        if self.dispatch_stats is not None:
+            self.dispatch_stats.update(result["dispatch_stats"])
+        if result["cached"]:
+            self.cached_translations += 1
+        ## the translators mark the notebooks of documents executed in batches; the
+        ## marker is only read by the builder, so it is not published
+        for nb in result["notebooks"].values():
+            if nb.metadata.pop("tojupyter_execute", None) == "batch":
+                self.batch_docs.add(result["docname"])
+        self.write_notebooks(result)
+
+    def _writable(self, nb, executed):
+        """
+        Notebook to hand to the file writer. Executed notebooks get their outputs filled in
+        by the execution threads, so the background writers are given a copy of their
+        unexecuted state instead.
+        """
+        if executed and self._write_notebook_class.background:
+            return copy.deepcopy(nb)
+        return nb
+
+    def write_site_notebook(self, nb, result):
+        """Write the site notebook of `result`, recorded in the manifest once it is on disk"""
+        docname = result["docname"]
+        outfilename = os.path.join(self.outdir, os_path(docname) + self.out_suffix)
+        on_success = None
+        if self.manifest is not None:
+            on_success = lambda: self.manifest.record(docname, result["fingerprint"], result["dependencies"])
+        self._write_notebook_class.write(nb, outfilename, on_success, docname)
+
+    def update_Metadata(self, docname, nb):
+        """Update Metadata for Jupyter Notebook"""
+        # Set Compile Datetime
+        nb.metadata.date = self.build_date if self.build_date is not None else time.time()
+        if self.config["tojupyter_deterministic"]:
+            deterministic_cell_ids(nb, docname)
+        return nb
+
+    def finish_notebook_build(self):
+        """Save the manifest, caches and reports of the build"""
+        self._write_notebook_class.summary()
+        if self.manifest is not None:
+            self.manifest.save()
+            if self.unchanged_docs:
+                self.logger.info(bold("%d notebooks are up to date and were not rebuilt"), self.unchanged_docs)
+        if self.image_cache is not None:
+            self.image_cache.prune()
+        self.image_pipeline.prune()
+        if self.translation_cache is not None:
+            self.translation_cache.prune()
+            if self.cached_translations:
+                self.logger.info(bold("%d notebooks were taken from the translation cache"), self.cached_translations)
+        self.profiler.save(self.reportdir)
+        if self.dispatch_stats is not None:
+            self.dispatch_stats.report(self.logger)
@@ -1,23 +1,15 @@
-import codecs
 import os.path
-import docutils.io
-import docutils
+import docutils.nodes
 
-import nbformat
 from sphinx.util.osutil import ensuredir, os_path
-from ..writers.jupyter import JupyterWriter
 from sphinx.builders import Builder
 from sphinx.util.console import bold, darkgreen, brown
 from sphinx.util.fileutil import copy_asset
-from ..writers.execute_nb import ExecuteNotebookWriter
-from ..writers.make_site import MakeSiteWriter
-from ..writers.convert import convertToHtmlWriter
-from dask.distributed import Client, progress
 from sphinx.util import logging
-import time
 from ..writers.utils import copy_dependencies
+from .common import NotebookBuilderMixin
 
-class JupyterBuilder(Builder):
+class JupyterBuilder(NotebookBuilderMixin, Builder):
     """
     Builds Jupyter Notebook
     """
@@ -26,8 +18,8 @@ class JupyterBuilder(Builder):
     out_suffix = ".ipynb"
     allow_parallel = True
 
-    _writer_class = JupyterWriter
-    _make_site_class = MakeSiteWriter
+    _writer_class = None
+    _make_site_class = None
     dask_log = dict()
     futuresInfo = dict()
     futures = []
@@ -36,6 +28,14 @@ class JupyterBuilder(Builder):
     logger = logging.getLogger(__name__)
 
     def init(self):
+        ## the writers pull in nbformat, and execution pulls in dask and nbconvert; they are
+        ## imported here so that listing the extension does not slow down other builders
+        from ..writers.jupyter import JupyterWriter
+        from ..writers.execute_nb import ExecuteNotebookWriter
+        from ..writers.make_site import MakeSiteWriter
+        if self._writer_class is None:
+            self._writer_class = JupyterWriter
+
         ### initializing required classes
         self._execute_notebook_class = ExecuteNotebookWriter(self)
         self._make_site_class = MakeSiteWriter(self)
@@ -69,6 +69,7 @@ class JupyterBuilder(Builder):
         # processes = False. This is sometimes preferable if you want to avoid inter-worker communication and your computations release the GIL. This is common when primarily using NumPy or Dask Array.
 
         if (self.config["tojupyter_execute_notebooks"]):
+            from dask.distributed import Client
             self.client = Client(processes=False, threads_per_worker = self.threads_per_worker, n_workers = self.n_workers)
             self.execution_vars = {
                 'target': 'website',
@@ -82,6 +83,7 @@ class JupyterBuilder(Builder):
 
         if (self.config["tojupyter_download_nb_execute"]):
             if self.client is None:
+                from dask.distributed import Client
                 self.client = Client(processes=False, threads_per_worker = self.threads_per_worker, n_workers = self.n_workers)
             self.download_execution_vars = {
                 'target': 'downloads',
@@ -93,29 +95,55 @@ class JupyterBuilder(Builder):
                 'destination': self.downloadsExecutedir
             }
 
-    def get_outdated_docs(self):
-        for docname in self.env.found_docs:
-            if docname not in self.env.all_docs:
-                yield docname
+        self.notebook_variants = self.get_notebook_variants()
+
+        self.init_notebook_build()
+
+    def targets_exist(self, docname):
+        """Check that every notebook produced for `docname` is present in the build directory"""
+        targets = [os.path.join(variant["outdir"], os_path(docname) + self.out_suffix) for variant in self.notebook_variants.values()]
+        return all(os.path.exists(target) for target in targets)
+
+    def get_notebook_variants(self):
+        """
+        Notebooks written for each document, translated from a single traversal of its doctree:
+        the site notebook, the download notebook when tojupyter_download_nb is set, and the
+        entries of tojupyter_notebook_variants, written to subfolders of the build directory
+        """
+        site = {
+            "urlpath": self.config["tojupyter_urlpath"],
+            "image_urlpath": self.config["tojupyter_image_urlpath"],
+            "drop_solutions": self.config["tojupyter_drop_solutions"],
+            "drop_tests": self.config["tojupyter_drop_tests"],
+            "image_target": "website",
+            "outdir": str(self.outdir),
+        }
+        variants = {"site": site}
+        if "tojupyter_download_nb" in self.config and self.config["tojupyter_download_nb"]:
+            variants["download"] = dict(site,
+                urlpath=self.config["tojupyter_download_nb_urlpath"],
+                image_urlpath=self.config["tojupyter_download_nb_image_urlpath"],
+                image_target="download",
+                outdir=self.downloadsdir)
+        for name, options in self.config["tojupyter_notebook_variants"].items():
+            if name in variants:
+                self.logger.warning("tojupyter_notebook_variants: '{}' is a reserved variant name".format(name))
                 continue
-            targetname = os.path.join(self.outdir, docname)
-            targetname += self.out_suffix
-            try:
-                targetmtime = os.path.getmtime(targetname)
-            except OSError:
-                targetmtime = 0
-            try:
-                srcmtime = os.path.getmtime(self.env.doc2path(docname))
-                if srcmtime > targetmtime:
-                    yield docname
-            except EnvironmentError:
-                pass
-
-    def get_target_uri(self, docname, typ=None):
-        return docname
+            unknown = set(options) - {"urlpath", "image_urlpath", "drop_solutions", "drop_tests"}
+            if unknown:
+                self.logger.warning("tojupyter_notebook_variants: unknown options {} for '{}'".format(sorted(unknown), name))
+            variant = dict(site, outdir=os.path.join(str(self.outdir), name))
+            variant.update((key, value) for key, value in options.items() if key not in unknown)
+            variants[name] = variant
+        return variants
 
     def prepare_writing(self, docnames):
-        self.writer = self._writer_class(self)
+        super().prepare_writing(docnames)
+
+        ## next/prev links of the notebooks, resolved once instead of walking the toctree per document
+        self.relations_index = dict()
+        if "tojupyter_make_site" in self.config and self.config['tojupyter_make_site']:
+            self.relations_index = self.build_relations_index(docnames)
 
         ## copies the dependencies to the notebook folder
         copy_dependencies(self)
@@ -127,38 +155,16 @@ class JupyterBuilder(Builder):
         if (self.config["tojupyter_download_nb_execute"]):
             copy_dependencies(self, self.downloadsExecutedir)
 
-    def write_doc(self, docname, doctree):
-        # work around multiple string % tuple issues in docutils;
-        # replace tuples in attribute values with lists
-        self.docname = docname
-        doctree = doctree.deepcopy()
-        destination = docutils.io.StringOutput(encoding="utf-8")
-        ### print an output for downloading notebooks as well with proper links if variable is set
-        if "tojupyter_urlpath" in self.config:
-            self.writer._set_ref_urlpath(self.config["tojupyter_urlpath"])
-        else:
-            self.writer._set_ref_urlpath(None)
-        if "tojupyter_image_urlpath" in self.config:
-            self.writer._set_tojupyter_image_urlpath((self.config["tojupyter_image_urlpath"]))
-        else:
-            self.writer._set_tojupyter_image_urlpath(None)
-        if "tojupyter_download_nb" in self.config and self.config["tojupyter_download_nb"]:
+    def translate_notebooks(self, doctree, docname):
+        ### site, download and other notebook variants from a single traversal
+        return self.writer.write_notebooks(doctree, docname, self.notebook_variants)
 
+    def write_notebooks(self, result):
+        docname = result["docname"]
+        if "download" in result["notebooks"]:
+            nb = result["notebooks"]["download"]
             outfilename = os.path.join(self.downloadsdir, os_path(docname) + self.out_suffix)
-            ensuredir(os.path.dirname(outfilename))
-            self.writer._set_ref_urlpath(self.config["tojupyter_download_nb_urlpath"])
-            self.writer._set_tojupyter_image_urlpath((self.config["tojupyter_download_nb_image_urlpath"]))
-            self.writer.write(doctree, destination)
-
-            # get a NotebookNode object from a string
-            nb = nbformat.reads(self.writer.output, as_version=4)
-            nb = self.update_Metadata(docname, nb)
-            try:
-                with codecs.open(outfilename, "w", "utf-8") as f:
-                    self.writer.output = nbformat.writes(nb, version=4)
-                    f.write(self.writer.output)
-            except (IOError, OSError) as err:
-                self.warn("error writing file %s: %s" % (outfilename, err))
+            self._write_notebook_class.write(self._writable(nb, self.config['tojupyter_download_nb_execute']), outfilename, docname=docname)
 
             ### executing downloaded notebooks
             if (self.config['tojupyter_download_nb_execute']):
@@ -168,12 +174,17 @@ class JupyterBuilder(Builder):
                 else:
                     self._execute_notebook_class.execute_notebook(self, nb, docname, self.download_execution_vars, self.download_execution_vars['futures'])
 
-        ### output notebooks for executing
-        self.writer.write(doctree, destination)
+        ### notebook variants are only written
+        for name, nb in result["notebooks"].items():
+            if name in ("site", "download"):
+                continue
+            outfilename = os.path.join(self.notebook_variants[name]["outdir"], os_path(docname) + self.out_suffix)
+            self._write_notebook_class.write(nb, outfilename, docname=docname)
 
-        # get a NotebookNode object from a string
-        nb = nbformat.reads(self.writer.output, as_version=4)
-        nb = self.update_Metadata(docname, nb)
+        nb = result["notebooks"]["site"]
+        if self.config["tojupyter_execute_notebooks"]:
+            nb = self._execute_notebook_class.prepare_notebook(self, nb, docname)
+        writable = self._writable(nb, self.config["tojupyter_execute_notebooks"])
 
         ### execute the notebook
         if (self.config["tojupyter_execute_notebooks"]):
@@ -186,78 +197,58 @@ class JupyterBuilder(Builder):
             #do not execute
             if (self.config['tojupyter_generate_html']):
                 language_info = nb.metadata.kernelspec.language
+                from ..writers.convert import convertToHtmlWriter
                 self._convert_class = convertToHtmlWriter(self)
-                self._convert_class.convert(nb, docname, language_info, self.outdir)
-
-        ### mkdir if the directory does not exist
-        outfilename = os.path.join(self.outdir, os_path(docname) + self.out_suffix)
-        ensuredir(os.path.dirname(outfilename))
-
-        try:
-            with codecs.open(outfilename, "w", "utf-8") as f:
-                self.writer.output = nbformat.writes(nb, version=4)
-                f.write(self.writer.output)
-        except (IOError, OSError) as err:
-            self.logger.warning("error writing file %s: %s" % (outfilename, err))
-
-    def update_Metadata(self, docname, nb):
-        """Update Metadata for Jupyter Notebook"""
-        if "tojupyter_make_site" in self.config and self.config['tojupyter_make_site']:
-            # Set Next and Previous
-            relations = self.env.collect_relations()
+                with self.profiler.stage(docname, "html convert"):
+                    self._convert_class.convert(nb, docname, language_info, self.outdir)
+
+        self.write_site_notebook(writable, result)
+
+    def build_relations_index(self, docnames):
+        """
+        Resolve the next and previous documents of `docnames` into the
+        ``{'link': ..., 'title': ...}`` entries stored in the notebook metadata
+        """
+        relations = self.env.collect_relations()
+        index = dict()
+        for docname in docnames:
             related = relations.get(docname)
-            titles = self.env.titles
-            if related and related[2]:
-                try:
-                    link = self.get_relative_uri(docname, related[2])
-                    # link is document uri (i.e. docname) as specified in index
-                    if link in self.config.tojupyter_nextprev_ignore:
-                        pass
-                    else:
-                        title_relation = titles[related[2]]
-                        # Filter out non-text elements like index entries
-                        if len(title_relation.children) > 1:
-                            text_nodes = [item for item in title_relation if isinstance(item, docutils.nodes.Text)]
-                            title = "".join([item.astext() for item in text_nodes])
-                        else:
-                            title = title_relation.children[0].astext()
-                        # Set next_doc metadata
-                        next_doc = {
-                            'link': link,
-                            'title': title
-                        }
-                        nb.metadata.next_doc = next_doc
-                except KeyError:
-                    self.logger.warning(
-                        "[NB Metadata] No next_doc relation is found for: {}"
-                        .format(docname))
-            if related and related[1]:
+            if not related:
+                continue
+            entries = dict()
+            for key, position in (("next_doc", 2), ("prev_doc", 1)):
+                if not related[position]:
+                    continue
                 try:
-                    link = self.get_relative_uri(docname, related[1])
+                    link = self.get_relative_uri(docname, related[position])
                     # link is document uri (i.e. docname) as specified in index
                     if link in self.config.tojupyter_nextprev_ignore:
-                        pass
-                    else:
-                        title_relation = titles[related[1]]
-                        # Filter out non-text elements like index entries
-                        if len(title_relation.children) > 1:
-                            text_nodes = [item for item in title_relation if isinstance(item, docutils.nodes.Text)]
-                            title = "".join([item.astext() for item in text_nodes])
-                        else:
-                            title = title_relation.children[0].astext()
-                        # Set prev_doc metadata
-                        prev_doc = {
-                            'link': link,
-                            'title': title
-                        }
-                        nb.metadata.prev_doc = prev_doc
+                        continue
+                    entries[key] = {
+                        'link': link,
+                        'title': self.title_text(self.env.titles[related[position]])
+                    }
                 except KeyError:
                     self.logger.warning(
-                        "[NB Metadata] No prev_doc relation is found for: {}"
-                        .format(docname))
-        # Set Compile Datetime
-        nb.metadata.date = time.time()
-        return nb
+                        "[NB Metadata] No {} relation is found for: {}"
+                        .format(key, docname))
+            index[docname] = entries
+        return index
+
+    @staticmethod
+    def title_text(title_relation):
+        # Filter out non-text elements like index entries
+        if len(title_relation.children) > 1:
+            text_nodes = [item for item in title_relation if isinstance(item, docutils.nodes.Text)]
+            return "".join([item.astext() for item in text_nodes])
+        return title_relation.children[0].astext()
+
+    def update_Metadata(self, docname, nb):
+        if "tojupyter_make_site" in self.config and self.config['tojupyter_make_site']:
+            # Set Next and Previous
+            for key, relation in self.relations_index.get(docname, {}).items():
+                nb.metadata[key] = dict(relation)
+        return super().update_Metadata(docname, nb)
 
     def copy_static_files(self):
         # copy all static files
@@ -283,6 +274,8 @@ class JupyterBuilder(Builder):
 
 
     def finish(self):
+        ### wait for the background writers before anything reads the build directory
+        self._write_notebook_class.drain()
         self.finish_tasks.add_task(self.copy_static_files)
 
         if self.config["tojupyter_execute_notebooks"]:
@@ -294,6 +287,8 @@ class JupyterBuilder(Builder):
         if "tojupyter_make_site" in self.config and self.config['tojupyter_make_site']:
             self._make_site_class.build_website(self)
 
+        self.finish_notebook_build()
+
         exit(self.execution_status_code)
 
     def save_executed(self, params, target):
@@ -1,24 +1,16 @@
-import codecs
 import os.path
-import docutils.io
 
-import nbformat
 import json
-from sphinx.util.osutil import ensuredir, os_path
-from ..writers.jupyter import JupyterWriter
+from sphinx.util.osutil import ensuredir
 from sphinx.builders import Builder
 from sphinx.util.console import bold, darkgreen, brown
 from sphinx.util.fileutil import copy_asset
-from dask.distributed import Client, progress
-from ..writers.execute_nb import ExecuteNotebookWriter
-from ..writers.make_pdf import MakePDFWriter
+from .common import NotebookBuilderMixin
 from sphinx.util import logging
 import pdb
 import shutil
-import shutil
-import time
 
-class JupyterPDFBuilder(Builder):
+class JupyterPDFBuilder(NotebookBuilderMixin, Builder):
     """
     Builds pdf notebooks
     """
@@ -27,7 +19,7 @@ class JupyterPDFBuilder(Builder):
     out_suffix = ".ipynb"
     allow_parallel = True
 
-    _writer_class = JupyterWriter
+    _writer_class = None
     dask_log = dict()
     futuresInfo = dict()
     futures = []
@@ -48,6 +40,13 @@ class JupyterPDFBuilder(Builder):
                 "You have switched on the book conversion option but not specified an index/contents file for book pdf"
             )
             exit(1)
+        ## imported here so that listing the extension does not slow down other builders
+        from ..writers.jupyter import JupyterWriter
+        from ..writers.execute_nb import ExecuteNotebookWriter
+        from ..writers.make_pdf import MakePDFWriter
+        if self._writer_class is None:
+            self._writer_class = JupyterWriter
+
         ### initializing required classes
         self._execute_notebook_class = ExecuteNotebookWriter(self)
         self._pdf_class = MakePDFWriter(self)
@@ -88,6 +87,7 @@ class JupyterPDFBuilder(Builder):
         # processes = False. This is sometimes preferable if you want to avoid inter-worker communication and your computations release the GIL. This is common when primarily using NumPy or Dask Array.
 
         #### forced execution of notebook
+        from dask.distributed import Client
         self.client = Client(processes=False, threads_per_worker = self.threads_per_worker, n_workers = self.n_workers)
         self.execution_vars = {
             'target': 'website',
@@ -99,44 +99,18 @@ class JupyterPDFBuilder(Builder):
             'destination': self.executedir
         }
 
-    def get_outdated_docs(self):
-        for docname in self.env.found_docs:
-            if docname not in self.env.all_docs:
-                yield docname
-                continue
-            targetname = self.env.doc2path(docname, self.outdir,
-                                           self.out_suffix)
-            try:
-                targetmtime = os.path.getmtime(targetname)
-            except OSError:
-                targetmtime = 0
-            try:
-                srcmtime = os.path.getmtime(self.env.doc2path(docname))
-                if srcmtime > targetmtime:
-                    yield docname
-            except EnvironmentError:
-                pass
-
-    def get_target_uri(self, docname, typ=None):
-        return docname
-
-    def prepare_writing(self, docnames):
-        self.writer = self._writer_class(self)
-
-    def write_doc(self, docname, doctree):
-        # work around multiple string % tuple issues in docutils;
-        # replace tuples in attribute values with lists
-        doctree = doctree.deepcopy()
-        destination = docutils.io.StringOutput(encoding="utf-8")
+        self.init_notebook_build()
 
+    def translate_notebooks(self, doctree, docname):
         ### output notebooks for executing for single pdfs, the urlpath should be set to website url
-        self.writer._set_ref_urlpath(self.config["tojupyter_pdf_urlpath"])
-        self.writer._set_tojupyter_image_urlpath(None)
-        self.writer.write(doctree, destination)
+        nb = self.writer.write_notebook(doctree, docname, urlpath=self.config["tojupyter_pdf_urlpath"],
+                                        image_target="pdf")
+        return {"site": nb}
 
-        # get a NotebookNode object from a string
-        nb = nbformat.reads(self.writer.output, as_version=4)
-        nb = self.update_Metadata(nb)
+    def write_notebooks(self, result):
+        docname = result["docname"]
+        nb = self._execute_notebook_class.prepare_notebook(self, result["notebooks"]["site"], docname)
+        writable = self._writable(nb, True)
 
         ### execute the notebook - keep it forcefully on
         strDocname = str(docname)
@@ -145,20 +119,7 @@ class JupyterPDFBuilder(Builder):
         else:        
             self._execute_notebook_class.execute_notebook(self, nb, docname, self.execution_vars, self.execution_vars['futures'])
 
-        ### mkdir if the directory does not exist
-        outfilename = os.path.join(self.outdir, os_path(docname) + self.out_suffix)
-        ensuredir(os.path.dirname(outfilename))
-
-        try:
-            with codecs.open(outfilename, "w", "utf-8") as f:
-                self.writer.output = nbformat.writes(nb, version=4)
-                f.write(self.writer.output)
-        except (IOError, OSError) as err:
-            self.logger.warning("error writing file %s: %s" % (outfilename, err))
-
-    def update_Metadata(self, nb):
-        nb.metadata.date = time.time()
-        return nb
+        self.write_site_notebook(writable, result)
 
     def copy_static_files(self):
         # copy all static files
@@ -203,6 +164,8 @@ class JupyterPDFBuilder(Builder):
         nb.metadata['latex_metadata']['bib_include'] = bool
 
     def finish(self):
+        ### wait for the background writers before anything reads the build directory
+        self._write_notebook_class.drain()
         self.finish_tasks.add_task(self.copy_static_files)
 
         #if (self.config["tojupyter_execute_notebooks"]):
@@ -218,3 +181,5 @@ class JupyterPDFBuilder(Builder):
         if "tojupyter_target_pdf" in self.config and self.config["tojupyter_target_pdf"] and self.config["tojupyter_pdf_book"]:
             self._pdf_class.process_tex_for_book(self)
 
+        self.finish_notebook_build()
+
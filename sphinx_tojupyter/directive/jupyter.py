@@ -15,7 +15,8 @@ class Jupyter(Directive):
     final_argument_whitespace = True
     option_spec = {'cell-break': directives.flag,
                    'slide': directives.unchanged,
-                   'slide-type': directives.unchanged}
+                   'slide-type': directives.unchanged,
+                   'execute': lambda arg: directives.choice(arg, ('batch', 'cells'))}
     has_content = True
     add_index = False
 
@@ -32,6 +33,8 @@ class Jupyter(Directive):
         if 'slide-type' in self.options:
             #node.parent.append(nodes.literal(self.content.data))
             node['slide-type'] = self.options['slide-type']
+        if 'execute' in self.options:
+            node['execute'] = self.options['execute']
 
         # we return the result
         return [ node ]
@@ -0,0 +1,120 @@
+import re
+from nbclient.exceptions import CellExecutionError
+from nbconvert.preprocessors import ExecutePreprocessor
+from nbformat.v4 import new_code_cell
+
+## mime type of the display data that marks where the outputs of each cell of a batch start
+BATCH_MARKER = "application/vnd.tojupyter.batch+json"
+
+## run in the kernel with the sources of the cells of the batch as `sources`: each cell is
+## run as a cell of its own, so it gets its execution count, its displayed result and its
+## error, and a marker is displayed before it. The batch stops at the first failing cell.
+BATCH_SOURCE = """\
+from IPython import get_ipython
+from IPython.display import publish_display_data
+shell = get_ipython()
+for index, source in enumerate(sources):
+    publish_display_data({{{marker!r}: {{"cell": index, "execution_count": shell.execution_count}}}})
+    if not shell.run_cell(source, store_history=True).success:
+        publish_display_data({{{marker!r}: {{"failed": index}}}})
+        break
+"""
+
+## cells whose outputs refer to the outputs before them, or that need the event loop of the kernel
+UNBATCHABLE = re.compile(r"clear_output|display_id|update_display|\bawait\b")
+
+
+class BatchedExecutePreprocessor(ExecutePreprocessor):
+    """
+    Executes the consecutive code cells of a notebook as a single request to the kernel.
+
+    Documents opt in with ``.. jupyter::`` and ``:execute: batch``. Each run of code
+    cells is sent as one ``execute_request`` that runs the cells one after the other in
+    the kernel, so a lecture made of many small code blocks does not wait for a round
+    trip and the output of each cell. The outputs are split back to the cells at the
+    markers displayed before each of them. When a cell of a batch fails, its error is
+    kept and the rest of the batch is executed cell by cell.
+
+    Batching requires an IPython kernel; cells that clear or update outputs, or use
+    top-level ``await``, are executed on their own.
+    """
+
+    def preprocess(self, nb, resources=None, km=None):
+        ## index of the cell after the last one already executed by a batch, and
+        ## of the cell after the last one to execute on its own after a failed batch
+        self._batched_until = 0
+        self._fallback_until = 0
+        return super().preprocess(nb, resources, km)
+
+    def preprocess_cell(self, cell, resources, index):
+        if index < self._batched_until:
+            return cell, self.resources
+        end = index
+        if index >= self._fallback_until:
+            end = self.batch_end(index)
+        if end - index < 2:
+            return super().preprocess_cell(cell, resources, index)
+        self._check_assign_resources(resources)
+        self.execute_batch(index, end)
+        if index < self._batched_until:
+            return self.nb.cells[index], self.resources
+        ## the batch could not run in the kernel
+        return super().preprocess_cell(cell, resources, index)
+
+    def batch_end(self, index):
+        """The index after the run of batchable code cells starting at `index`"""
+        cells = self.nb.cells
+        end = index
+        while end < len(cells) and self.batchable(cells[end]):
+            end += 1
+        return end
+
+    def batchable(self, cell):
+        return (cell.cell_type == "code"
+                and cell.source.strip()
+                and self.skip_cells_with_tag not in cell.metadata.get("tags", [])
+                and not UNBATCHABLE.search(cell.source))
+
+    def execute_batch(self, start, end):
+        cells = self.nb.cells[start:end]
+        sources = [cell.source for cell in cells]
+        batch = new_code_cell("exec({!r}, {{'sources': {!r}}})".format(BATCH_SOURCE.format(marker=BATCH_MARKER), sources))
+        try:
+            self.execute_cell(batch, start, store_history=False)
+        finally:
+            self.nb.cells[start] = cells[0]
+
+        current = None
+        failed = None
+        started = 0
+        for output in batch.outputs:
+            marker = output.get("data", {}).get(BATCH_MARKER) if output.output_type == "display_data" else None
+            if marker is None:
+                if current is not None:
+                    current.outputs.append(output)
+            elif "failed" in marker:
+                failed = marker["failed"]
+            else:
+                current = cells[marker["cell"]]
+                started = marker["cell"] + 1
+                current.outputs = []
+                current.execution_count = marker["execution_count"]
+
+        if failed is None and started == len(cells):
+            self._batched_until = end
+            return
+        if failed is None:
+            ## the batch itself was interrupted: the last cell it started is not rerun
+            failed = started - 1
+        self._batched_until = start + failed + 1
+        self._fallback_until = end
+        if failed < 0:
+            return
+        cell = cells[failed]
+        cell_allows_errors = (not self.force_raise_errors) and (
+            self.allow_errors or "raises-exception" in cell.metadata.get("tags", []))
+        if not cell_allows_errors:
+            for output in cell.outputs:
+                if output.output_type == "error":
+                    raise CellExecutionError.from_cell_and_msg(cell, output)
+
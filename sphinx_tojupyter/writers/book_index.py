@@ -0,0 +1,104 @@
+from urllib.parse import urlsplit
+
+from docutils import nodes
+from sphinx import addnodes
+
+
+class BookChapter():
+    """A document of the book, included with ``\\input`` from the tex file of `uri`"""
+
+    def __init__(self, title, uri):
+        self.title = title
+        self.uri = uri
+
+    def to_latex(self):
+        return "\\chapter{{{}}}\\input{{{}}}".format(self.title, self.uri + ".tex")
+
+
+class BookPart():
+    """A part of the book and its chapters; the chapters before the first part have no title"""
+
+    def __init__(self, title=None):
+        self.title = title
+        self.chapters = []
+
+    def to_latex(self):
+        lines = []
+        if self.title is not None:
+            lines.append("\\cleardoublepage\\part{{{}}}".format(self.title))
+        lines.extend(chapter.to_latex() for chapter in self.chapters)
+        return lines
+
+
+class BookIndex():
+    """
+    Table of contents of a pdf book (``tojupyter_pdf_book_index``), read from the
+    toctrees of the index document.
+
+    The entries are read in order: the caption of a toctree starts a part, and so does
+    a document listed with the documents of its own toctree (``:maxdepth:`` of 2 or
+    more), whose chapters are those documents. The other documents are chapters of the
+    last part started. Section entries and the references document are left out.
+    """
+
+    def __init__(self):
+        self.parts = [BookPart()]
+
+    @classmethod
+    def from_doctree(cls, doctree):
+        """The table of contents made of the (resolved) toctrees of `doctree`"""
+        index = cls()
+        for toctree in doctree.findall(addnodes.compact_paragraph):
+            if toctree.get("toctree"):
+                index.add_toctree(toctree)
+        return index
+
+    def add_toctree(self, toctree):
+        for child in toctree.children:
+            if isinstance(child, (nodes.title, nodes.caption)):
+                self.parts.append(BookPart(child.astext()))
+            elif isinstance(child, nodes.bullet_list):
+                for title, uri, entries in toctree_entries(child):
+                    chapters = [BookChapter(title, uri) for title, uri, _ in entries]
+                    if chapters:
+                        self.parts.append(BookPart(title))
+                        self.parts[-1].chapters.extend(chapters)
+                    else:
+                        self.parts[-1].chapters.append(BookChapter(title, uri))
+
+    def to_latex(self):
+        """The ``\\part`` and ``\\chapter``/``\\input`` commands of the book, one per line"""
+        lines = []
+        for part in self.parts:
+            if part.title is not None and not part.chapters:
+                continue
+            lines.extend(part.to_latex())
+        return "\n".join(lines)
+
+
+def toctree_entries(bullet_list):
+    """
+    The ``(title, uri, entries)`` of the documents of a toctree `bullet_list`, where
+    `entries` are the documents nested in it. Section entries (``doc#section``),
+    ``self``, external links and the references document are left out
+    """
+    for item in bullet_list.children:
+        reference = None
+        entries = []
+        for child in item.children:
+            if isinstance(child, addnodes.compact_paragraph):
+                reference = next(child.findall(nodes.reference), None)
+            elif isinstance(child, nodes.bullet_list):
+                entries = list(toctree_entries(child))
+        if reference is None or not is_document(reference):
+            continue
+        uri = reference["refuri"]
+        if "references" in uri:
+            continue
+        yield reference.astext(), uri, entries
+
+
+def is_document(reference):
+    """Whether the toctree `reference` links to a document of the project, rather than a section or a url"""
+    uri = reference.get("refuri", "")
+    return bool(reference.get("internal")) and uri != "" and "#" not in uri and not urlsplit(uri).scheme
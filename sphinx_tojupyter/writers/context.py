@@ -0,0 +1,114 @@
+from sphinx.util import logging
+from .enumerables import EnumerableDirectives
+from .utils import LanguageTranslator
+
+logger = logging.getLogger(__name__)
+
+## how glued images are embedded in the notebooks
+IMAGE_EMBED_MODES = ("data-uri", "attachments")
+
+
+class TranslationContext():
+    """
+    Settings shared by the translators of all the documents of a build.
+
+    The builders create it once in ``prepare_writing``, before the parallel writers are
+    forked, so the language map in ``languages.xml`` is parsed, the configuration is read
+    and the LaTeX macro cell is rendered once per build instead of once per document.
+    The context is frozen: translators must copy what they need to change.
+    """
+
+    def __init__(self, config):
+        self.languages = LanguageTranslator(config["templates_path"])
+        self.default_lang = config["tojupyter_default_lang"]
+        self.kernels = config["tojupyter_kernels"]
+        ## kernelspec of each language with a valid tojupyter_kernels entry
+        self.kernelspecs = dict()
+        for lang, kernel in (self.kernels or {}).items():
+            try:
+                self.kernelspecs[lang] = kernel["kernelspec"]
+            except (KeyError, TypeError):
+                pass
+        self.lang_synonyms = frozenset(config["tojupyter_lang_synonyms"] or ())
+
+        ## image paths under tojupyter_static_file_path, as (static path, prefix replaced by the image urlpath)
+        self.static_rules = tuple((path, path + "/") for path in config["tojupyter_static_file_path"])
+        ## base url of the copied glue images; glued images are embedded when it is None
+        self.glue_urlpath = None
+        for name in ("tojupyter_glue_urlpath", "tojupyter_glue_images_urlpath"):
+            if config[name]:
+                self.glue_urlpath = config[name].rstrip('/')
+                break
+        self.image_embed = config["tojupyter_image_embed"]
+        if self.image_embed not in IMAGE_EMBED_MODES:
+            logger.warning("tojupyter_image_embed: unknown mode '{}', expected one of {}".format(
+                self.image_embed, ", ".join(IMAGE_EMBED_MODES)))
+            self.image_embed = "data-uri"
+
+        self.drop_html_raw = config["tojuyter_drop_html_raw"]
+        self.drop_solutions = config["tojupyter_drop_solutions"]
+        self.drop_tests = config["tojupyter_drop_tests"]
+        self.target_html = config["tojupyter_target_html"]
+        self.images_markdown = config["tojupyter_images_markdown"]
+        self.target_pdf = config["tojupyter_target_pdf"]
+        self.pdf_showcontentdepth = config["tojupyter_pdf_showcontentdepth"]
+        self.pdf_book = config["tojupyter_pdf_book"]
+        self.book_index = config["tojupyter_pdf_book_index"]
+        self.debug_translator = config["tojupyter_debug_translator"]
+        self.coalesce_markdown = config["tojupyter_coalesce_markdown"]
+        self.coalesce_markdown_limit = config["tojupyter_coalesce_markdown_limit"]
+        ## numbered directives rendered with a header (sphinx-proof and tojupyter_enumerable_directives)
+        self.enumerables = EnumerableDirectives(config)
+
+        self.macro_source = latex_macro_source(config)
+        self._frozen = True
+
+    def __setattr__(self, name, value):
+        if getattr(self, "_frozen", False):
+            raise AttributeError("the translation context is shared by all documents and cannot be modified")
+        object.__setattr__(self, name, value)
+
+    def macro_cell(self):
+        """A new markdown cell defining the LaTeX macros of the project, or None if there are none"""
+        if not self.macro_source:
+            return None
+        from nbformat.v4 import new_markdown_cell
+        return new_markdown_cell(self.macro_source)
+
+
+def latex_macro_source(config):
+    """
+    The source of the markdown cell that defines the LaTeX macros of the project.
+
+    ``mathjax3_config["tex"]["macros"]`` (the standard Sphinx / Jupyter Book setting) is used
+    when it is set, otherwise ``tojupyter_latex_macros`` (raw LaTeX).
+    """
+    mathjax3_config = getattr(config, 'mathjax3_config', None)
+    if mathjax3_config and isinstance(mathjax3_config, dict):
+        # Extract macros from mathjax3_config.tex.macros
+        tex_config = mathjax3_config.get('tex', {})
+        macros_dict = tex_config.get('macros', {})
+
+        if macros_dict:
+            # Convert dict format to LaTeX \newcommand format
+            macro_lines = []
+            for name, definition in macros_dict.items():
+                # Handle both simple strings and array format [definition, n_args]
+                if isinstance(definition, list):
+                    defn = definition[0]
+                    n_args = definition[1] if len(definition) > 1 else 0
+                    if n_args > 0:
+                        macro_lines.append(f"\\newcommand{{\\{name}}}[{n_args}]{{{defn}}}")
+                    else:
+                        macro_lines.append(f"\\newcommand{{\\{name}}}{{{defn}}}")
+                else:
+                    macro_lines.append(f"\\newcommand{{\\{name}}}{{{definition}}}")
+
+            if macro_lines:
+                return "$$\n" + "\n".join(macro_lines) + "\n$$"
+
+    # Fallback to tojupyter_latex_macros (raw LaTeX format)
+    latex_macros = getattr(config, 'tojupyter_latex_macros', None)
+    if latex_macros:
+        return "$$\n" + latex_macros + "\n$$"
+    return None
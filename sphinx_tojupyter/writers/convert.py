@@ -1,5 +1,4 @@
 import nbformat
-from nbconvert import HTMLExporter
 import os
 from io import open
 from sphinx.util.osutil import ensuredir
@@ -15,6 +14,7 @@ class convertToHtmlWriter():
 
         for path in [self.htmldir]:
             ensuredir(path)
+        from nbconvert import HTMLExporter
         self.html_exporter = HTMLExporter()
         
         templateFolder = builderSelf.config['tojupyter_template_path']
@@ -0,0 +1,120 @@
+from docutils import nodes
+from sphinx.util import logging
+
+logger = logging.getLogger(__name__)
+
+## display names of the numbered sphinx-proof directives, by directive type; the nodes of
+## a directive are `<type>_node` and are numbered (numfig) under the directive type
+PROOF_DIRECTIVES = {
+    "theorem": "Theorem",
+    "axiom": "Axiom",
+    "lemma": "Lemma",
+    "definition": "Definition",
+    "remark": "Remark",
+    "conjecture": "Conjecture",
+    "corollary": "Corollary",
+    "algorithm": "Algorithm",
+    "criterion": "Criterion",
+    "example": "Example",
+    "property": "Property",
+    "observation": "Observation",
+    "proposition": "Proposition",
+    "assumption": "Assumption",
+    "notation": "Notation",
+}
+
+
+class EnumerableDirectives():
+    """
+    Registry of the numbered directives rendered as a markdown cell that starts with a
+    bold header, such as ``**Theorem 1.2** (title)``.
+
+    The sphinx-proof directives are registered by default, and ``tojupyter_enumerable_directives``
+    adds directives (or renames them) with the same structure: ``<type>_node`` nodes with a
+    ``label``, an optional ``title`` child and numbers under ``<type>`` in ``numfig``.
+    """
+
+    def __init__(self, config):
+        self.names = dict(PROOF_DIRECTIVES)
+        self.names.update(config["tojupyter_enumerable_directives"] or {})
+        ## directive type of each registered node class name
+        self.node_types = {directive + "_node": directive for directive in self.names}
+        ## identifies the registry in the dispatch tables of the translators
+        self.key = tuple(sorted(self.names.items()))
+
+    def display_name(self, directive):
+        if directive in self.names:
+            return self.names[directive]
+        return directive.title() if directive else "Note"
+
+
+class EnumerableIndex():
+    """
+    Headers of the numbered directives of a document, built in one pass over its doctree.
+
+    ``headers`` maps the id of each registered directive node (and of sphinx-proof
+    ``unenumerable_node``) to its markdown header, and ``titles`` holds the ids of the
+    title nodes rendered in the headers. ``suffixes`` maps the id of the title of each
+    sphinx-exercise exercise to its number (``Exercise 1``), rendered at the end of the
+    title.
+    """
+
+    def __init__(self, document, fignumbers, directives, numfig_format):
+        self.headers = dict()
+        self.titles = set()
+        self.suffixes = dict()
+        node_types = directives.node_types
+        for node in iter_elements(document):
+            name = node.__class__.__name__
+            if name in node_types:
+                directive = node_types[name]
+                number = None
+                if "nonumber" not in node.attributes and node.get("label"):
+                    number = fignumbers.get(directive, {}).get(node["label"])
+                self.add_header(node, directives.display_name(directive), number)
+            elif name == "unenumerable_node":
+                directive = node.get("realtype") or node.get("type", "")
+                self.add_header(node, directives.display_name(directive), None)
+            elif name == "exercise_enumerable_node":
+                self.add_exercise(node, fignumbers, numfig_format)
+
+    def add_header(self, node, display_name, number):
+        header = "**{}".format(display_name)
+        if number:
+            header += " " + ".".join(map(str, number))
+        header += "**"
+        title = None
+        for child in node.children:
+            if isinstance(child, nodes.title) or child.tagname == 'title':
+                self.titles.add(id(child))
+                if title is None:
+                    title = child.astext().strip()
+        ## sphinx-proof wraps titles in parentheses
+        if title and title.startswith('(') and title.endswith(')'):
+            title = title[1:-1].strip()
+        if title:
+            header += " ({})".format(title)
+        self.headers[id(node)] = header + "\n\n"
+
+    def add_exercise(self, node, fignumbers, numfig_format):
+        number = fignumbers.get("exercise", {}).get(node.get("label", ""))
+        try:
+            suffix = numfig_format["exercise"] % ".".join(map(str, number))
+        except (KeyError, TypeError, ValueError):
+            logger.warning("[sphinx-tojupyter] Unable to parse enumerable exercise node with numfig format",
+                           location=node)
+            return
+        if node.children:
+            self.suffixes[id(node.children[0])] = suffix
+
+
+def iter_elements(document):
+    """
+    The elements of `document` in document order. Unlike ``findall``, whose nested
+    generators make each step cost the depth of the node, it walks the tree with a stack
+    """
+    stack = [document]
+    while stack:
+        node = stack.pop()
+        yield node
+        stack.extend(child for child in reversed(node.children) if isinstance(child, nodes.Element))
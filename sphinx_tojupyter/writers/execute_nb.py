@@ -1,14 +1,11 @@
-import nbformat
 from sphinx.util.osutil import ensuredir
 import os.path
 import shutil
+import threading
 import time
 import json
-from nbconvert.preprocessors import ExecutePreprocessor
 from ..writers.convert import convertToHtmlWriter
 from sphinx.util import logging
-import dask
-from dask.distributed import as_completed
 from packaging import version
 from io import open
 import sys
@@ -41,12 +38,22 @@ class ExecuteNotebookWriter():
         elif (language.lower().find('julia') != -1):
             language = 'julia'
 
+        nb = self.prepare_notebook(builderSelf, nb, full_path)
+
+        # - Parse Directories and execute them - #
+        with builderSelf.profiler.stage(full_path, "execution submit"):
+            self.execution_cases(builderSelf, params['destination'], True, subdirectory, language, futures, nb, filename, full_path)
+
+    def prepare_notebook(self, builderSelf, nb, docname):
+        """
+        Add the metadata set on notebooks before execution. Calling it again on the same
+        notebook has no further effect.
+        """
         ## adding latex metadata
         if builderSelf.config["tojupyter_target_pdf"]:
+            subdirectory, _, filename = docname.rpartition('/')
             nb = self.add_latex_metadata(builderSelf, nb, subdirectory, filename)
-
-        # - Parse Directories and execute them - #
-        self.execution_cases(builderSelf, params['destination'], True, subdirectory, language, futures, nb, filename, full_path)
+        return nb
 
     def add_latex_metadata(self, builder, nb, subdirectory, filename=""):
 
@@ -89,48 +96,70 @@ class ExecuteNotebookWriter():
         ## ensure that executed notebook directory
         ensuredir(builderSelf.executed_notebook_dir)
         ## specifying kernels
+        from nbconvert.preprocessors import ExecutePreprocessor
+        preprocessor_class = ExecutePreprocessor
+        ## documents with `:execute: batch` run their consecutive code cells as one request
+        if full_path in builderSelf.batch_docs:
+            if language == 'python':
+                from .batch_execute import BatchedExecutePreprocessor
+                preprocessor_class = BatchedExecutePreprocessor
+            else:
+                self.logger.warning("{}: batched execution requires an IPython kernel, executing the cells one by one".format(full_path))
         if language == 'python':
             if (sys.version_info > (3, 0)):
                 # Python 3 code in this block
-                ep = ExecutePreprocessor(timeout=-1, allow_errors=allow_errors, kernel_name='python3')
+                ep = preprocessor_class(timeout=-1, allow_errors=allow_errors, kernel_name='python3')
             else:
                 # Python 2 code in this block
-                ep = ExecutePreprocessor(timeout=-1, allow_errors=allow_errors, kernel_name='python2')
+                ep = preprocessor_class(timeout=-1, allow_errors=allow_errors, kernel_name='python2')
         elif language == 'julia':
-            ep = ExecutePreprocessor(timeout=-1, allow_errors=allow_errors)
+            ep = preprocessor_class(timeout=-1, allow_errors=allow_errors)
 
         ### calling this function before starting work to ensure it starts recording
         if (self.startFlag == 0):
             self.startFlag = 1
             builderSelf.client.get_task_stream()
 
-        future = builderSelf.client.submit(ep.preprocess, nb, {"metadata": {"path": builderSelf.executed_notebook_dir, "filename": filename, "filename_with_path": full_path}})
+        future = builderSelf.client.submit(timed_preprocess, ep, nb, {"metadata": {"path": builderSelf.executed_notebook_dir, "filename": filename, "filename_with_path": full_path}})
 
         ### dictionary to store info for errors in future
-        future_dict = { "filename": full_path, "filename_with_path": full_path, "language_info": nb['metadata']['kernelspec']}
+        future_dict = { "filename": full_path, "filename_with_path": full_path, "language_info": nb['metadata']['kernelspec'], "submitted": time.perf_counter()}
         builderSelf.futuresInfo[future.key] = future_dict
 
         futures.append(future)
 
 
-    def task_execution_time(self, builderSelf):
-        ## calculates execution time of each task in client using get task stream
-        task_Info_latest = builderSelf.client.get_task_stream()[-1]
-        time_tuple = task_Info_latest['startstops'][0]
-
-        if version.parse(dask.__version__) <  version.parse("2.10.0"):
-            computing_time = time_tuple[2] - time_tuple[1]
-        else:
-            computing_time = time_tuple['stop'] - time_tuple['start']
-        return computing_time
+    def task_execution_time(self, builderSelf, future):
+        ## calculates execution time of the task of `future` using the client task stream,
+        ## for the failed executions that did not return their own timing
+        import dask
+        for task_info in reversed(builderSelf.client.get_task_stream()):
+            if task_info['key'] != future.key:
+                continue
+            time_tuple = task_info['startstops'][0]
+            if version.parse(dask.__version__) <  version.parse("2.10.0"):
+                return time_tuple[2] - time_tuple[1]
+            return time_tuple['stop'] - time_tuple['start']
+        return 0.0
 
     def check_execution_completion(self, builderSelf, future, nb, error_results, count, total_count, futures_name, params):
         error_result = []
         builderSelf.dask_log['futures'].append(str(future))
         status = 'pass'
 
-        # computing time for each task 
-        computing_time = self.task_execution_time(builderSelf)
+        # computing time for each task, measured by the task itself
+        timing = None
+        if future.status != 'error':
+            timing = nb[1].pop('tojupyter_timing', None)
+        if timing is not None:
+            computing_time = timing['stop'] - timing['start']
+            docname = nb[1]['metadata']['filename_with_path']
+            submitted = builderSelf.futuresInfo.get(future.key, {}).get('submitted')
+            if submitted is not None:
+                builderSelf.profiler.record(docname, "execution queue", submitted, timing['start'])
+            builderSelf.profiler.record(docname, "execute", timing['start'], timing['stop'], timing['cpu'], timing['thread'])
+        else:
+            computing_time = self.task_execution_time(builderSelf, future)
 
         # store the exceptions in an error result array
         if future.status == 'error':
@@ -184,12 +213,18 @@ class ExecuteNotebookWriter():
                     if cell['metadata']['hide-output']:
                         cell['outputs'] = []
             #Write Executed Notebook as File
-            with open(executed_notebook_path, "wt", encoding="UTF-8") as f:
-                nbformat.write(executed_nb, f)
+            with builderSelf.profiler.stage(filename_with_path, "serialize"):
+                text, invalid = builderSelf._write_notebook_class.serializer.dumps(executed_nb)
+            if invalid is not None:
+                self.logger.warning("notebook %s is invalid: %s" % (executed_notebook_path, invalid))
+            with builderSelf.profiler.stage(filename_with_path, "write"):
+                with open(executed_notebook_path, "wt", encoding="UTF-8") as f:
+                    f.write(text + "\n")
             
             ## generate html if needed
             if (builderSelf.config['tojupyter_generate_html'] and params['target'] == 'website'):
-                builderSelf._convert_class.convert(executed_nb, filename, language_info, params['destination'], passed_metadata['path'])
+                with builderSelf.profiler.stage(filename_with_path, "html convert"):
+                    builderSelf._convert_class.convert(executed_nb, filename, language_info, params['destination'], passed_metadata['path'])
             
             ## generate pdfs if set to true
             if (builderSelf.config['tojupyter_target_pdf']):
@@ -220,6 +255,7 @@ class ExecuteNotebookWriter():
             builderSelf._convert_class = convertToHtmlWriter(builderSelf)
 
         # this for loop gathers results in the background
+        from dask.distributed import as_completed
         total_count = len(params['futures'])
         count = 0
         update_count_delayed = 1
@@ -314,3 +350,21 @@ class ExecuteNotebookWriter():
                 json.dump(builderSelf.dask_log, json_file)
         except IOError:
             self.logger.warning("Unable to save dask reports JSON file. Does the {} directory exist?".format(builderSelf.reportdir))
+
+
+def timed_preprocess(ep, nb, resources):
+    """
+    Run `ep` on `nb` in an execution thread and store the wall and CPU time it took in
+    ``resources["tojupyter_timing"]``.
+    """
+    start = time.perf_counter()
+    cpu = time.thread_time()
+    nb, resources = ep.preprocess(nb, resources)
+    current = threading.current_thread()
+    resources['tojupyter_timing'] = {
+        'start': start,
+        'stop': time.perf_counter(),
+        'cpu': time.thread_time() - cpu,
+        'thread': (current.ident, current.name),
+    }
+    return nb, resources
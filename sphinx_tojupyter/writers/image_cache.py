@@ -0,0 +1,263 @@
+import base64
+import collections
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import threading
+from sphinx.util import logging
+
+CACHE_DIRNAME = ".tojupyter-cache"
+
+## files larger than this are memory mapped instead of read into memory
+MMAP_THRESHOLD = 1024 * 1024
+
+
+class ImageCache():
+    """
+    Content-addressed cache of base64-encoded images (``tojupyter_image_cache``).
+
+    Glued images embedded as data URIs are often referenced by many pages. Encoded
+    images are kept in an in-memory LRU bounded by ``tojupyter_image_cache_memory``
+    (in MiB) and in a store under ``.tojupyter-cache/images`` in the doctree directory,
+    next to the translation cache, so they are encoded once and reused across
+    references, documents and builds.
+
+    Files are identified by their path, size and modification time, which map to the
+    SHA-256 hash of their content; the encoded data is stored under that hash, so copies
+    of the same image share one entry. The entries of the store are written to a
+    temporary file and renamed, so forked parallel writers can share it. Its size is
+    bounded by ``tojupyter_image_cache_size`` (in MiB); the least recently used entries
+    are removed at the end of the build.
+    """
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, doctreedir, max_bytes, max_store_bytes):
+        self.directory = cache_directory(doctreedir, "images")
+        self.max_bytes = max(0, int(max_bytes))
+        self.max_store_bytes = max(0, int(max_store_bytes))
+        ## path -> (size, mtime, digest)
+        self.index = dict()
+        ## digest -> encoded data, least recently used first
+        self.entries = collections.OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def encode(self, path, stat=None):
+        """
+        Return the SHA-256 hex digest and the base64 encoding (str) of the file at `path`,
+        from the cache when possible
+        """
+        if stat is None:
+            stat = os.stat(path)
+        path = os.path.abspath(path)
+        key = (stat.st_size, stat.st_mtime_ns)
+
+        digest = self._digest(path, key)
+        if digest is not None:
+            encoded = self._lookup(digest)
+            if encoded is not None:
+                self.hits += 1
+                return digest, encoded
+
+        self.misses += 1
+        digest, encoded = encode_file(path, stat.st_size)
+        with self._lock:
+            self.index[path] = key + (digest,)
+        self._remember(digest, encoded)
+        self._store(path, key, digest, encoded)
+        return digest, encoded
+
+    def digest(self, path, stat=None):
+        """Return the SHA-256 hex digest of the file at `path`, without reading it when it is known"""
+        if stat is None:
+            stat = os.stat(path)
+        path = os.path.abspath(path)
+        key = (stat.st_size, stat.st_mtime_ns)
+        digest = self._digest(path, key)
+        if digest is None:
+            digest = hash_file(path, stat.st_size)
+            with self._lock:
+                self.index[path] = key + (digest,)
+            self._store_index(path, key, digest)
+        return digest
+
+    def _digest(self, path, key):
+        with self._lock:
+            entry = self.index.get(path)
+        if entry is not None and entry[:2] == key:
+            return entry[2]
+        index_file = self._index_file(path)
+        try:
+            with open(index_file, encoding="UTF-8") as f:
+                entry = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        if entry.get("path") != path or (entry.get("size"), entry.get("mtime")) != key:
+            return None
+        touch(index_file)
+        with self._lock:
+            self.index[path] = key + (entry["digest"],)
+        return entry["digest"]
+
+    def _lookup(self, digest):
+        with self._lock:
+            encoded = self.entries.get(digest)
+            if encoded is not None:
+                self.entries.move_to_end(digest)
+                return encoded
+        data_file = self._data_file(digest)
+        try:
+            with open(data_file, encoding="ascii") as f:
+                encoded = f.read()
+        except (IOError, OSError, ValueError):
+            return None
+        touch(data_file)
+        self._remember(digest, encoded)
+        return encoded
+
+    def _remember(self, digest, encoded):
+        if len(encoded) > self.max_bytes:
+            return
+        with self._lock:
+            if digest in self.entries:
+                return
+            self.entries[digest] = encoded
+            self.size += len(encoded)
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def _store(self, path, key, digest, encoded):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            data_file = self._data_file(digest)
+            if not os.path.exists(data_file):
+                write_atomic(data_file, encoded)
+        except (IOError, OSError) as err:
+            self.logger.warning("Unable to store image {} in the image cache: {}".format(path, err))
+            return
+        self._store_index(path, key, digest)
+
+    def _store_index(self, path, key, digest):
+        index = {"path": path, "size": key[0], "mtime": key[1], "digest": digest}
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            write_atomic(self._index_file(path), json.dumps(index))
+        except (IOError, OSError) as err:
+            self.logger.warning("Unable to store image {} in the image cache: {}".format(path, err))
+
+    def prune(self):
+        """Remove the least recently used entries until the store fits in its size limit"""
+        prune_directory(self.directory, self.max_store_bytes)
+
+    def _data_file(self, digest):
+        return os.path.join(self.directory, digest + ".b64")
+
+    def _index_file(self, path):
+        return os.path.join(self.directory, hashlib.sha1(path.encode("utf-8")).hexdigest() + ".json")
+
+
+def cache_directory(doctreedir, name):
+    """
+    The folder `name` of the cache in the doctree directory of the build, which is part of
+    the build tree wherever the output directory is, and is shared by the builders that
+    share their doctrees (``sphinx-build -M``, ``make``)
+    """
+    return os.path.join(os.path.abspath(str(doctreedir)), CACHE_DIRNAME, name)
+
+
+def touch(filename):
+    """Mark a cache entry as used: its modification time is the time it was last used"""
+    try:
+        os.utime(filename)
+    except OSError:
+        pass
+
+
+def prune_directory(directory, max_bytes):
+    """Remove the least recently used files of `directory` until their total size is at most `max_bytes`"""
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return
+    entries = []
+    total = 0
+    for name in names:
+        ## files being written by another process
+        if name.endswith(".tmp"):
+            continue
+        try:
+            stat = os.stat(os.path.join(directory, name))
+        except OSError:
+            continue
+        entries.append((stat.st_mtime_ns, stat.st_size, name))
+        total += stat.st_size
+    entries.sort()
+    for _, size, name in entries:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(os.path.join(directory, name))
+        except OSError:
+            continue
+        total -= size
+
+
+def encode_file(path, size=None):
+    """
+    Return the SHA-256 hex digest and the base64 encoding of the file at `path`.
+    Large files are memory mapped, so their bytes are not copied into memory as well.
+    """
+    if size is None:
+        size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        if size < MMAP_THRESHOLD:
+            data = f.read()
+            return hashlib.sha256(data).hexdigest(), base64.b64encode(data).decode("ascii")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return hashlib.sha256(mapped).hexdigest(), base64.b64encode(mapped).decode("ascii")
+
+
+def hash_file(path, size=None):
+    """Return the SHA-256 hex digest of the file at `path`, memory mapping large files"""
+    if size is None:
+        size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        if size < MMAP_THRESHOLD:
+            return hashlib.sha256(f.read()).hexdigest()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return hashlib.sha256(mapped).hexdigest()
+
+
+def link_or_copy(source, dest):
+    """
+    Create `dest` as a hardlink to `source`, or as a copy when they are on different
+    filesystems. `dest` is renamed into place, so it never appears half written.
+    """
+    tmpname = "{}.{}.tmp".format(dest, os.getpid())
+    try:
+        try:
+            os.link(source, tmpname)
+        except OSError:
+            shutil.copyfile(source, tmpname)
+        os.replace(tmpname, dest)
+    except BaseException:
+        if os.path.exists(tmpname):
+            os.remove(tmpname)
+        raise
+
+
+def write_atomic(filename, text):
+    tmpname = "{}.{}.tmp".format(filename, os.getpid())
+    try:
+        with open(tmpname, "w", encoding="ascii") as f:
+            f.write(text)
+        os.replace(tmpname, filename)
+    except BaseException:
+        if os.path.exists(tmpname):
+            os.remove(tmpname)
+        raise
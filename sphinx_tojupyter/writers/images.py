@@ -0,0 +1,132 @@
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+from sphinx.util import logging
+from .image_cache import cache_directory, hash_file, prune_directory, touch
+
+## notebooks the image settings apply to: the site notebooks and the notebook variants of
+## the jupyter builder, its download notebooks and the notebooks of the jupyterpdf builder
+IMAGE_TARGETS = ("website", "download", "pdf")
+DEFAULT_SETTINGS = {"max_width": None, "quality": 85, "webp": False}
+## the formats the pipeline recompresses; other images are left untouched
+OPTIMIZED_TYPES = {"image/png": "PNG", "image/jpeg": "JPEG"}
+
+
+class ImagePipeline():
+    """
+    Optional optimization of the glued images embedded in or copied next to the notebooks
+    (``tojupyter_image_optimization``). Requires Pillow.
+
+    The settings of each target can downscale images to a maximum width, recompress PNG
+    and JPEG images and convert them to WebP. Results are stored under
+    ``.tojupyter-cache/optimized`` in the doctree directory, named after
+    the hash of the source image and of the settings, so an image is processed once for
+    each set of settings. The store is bounded by ``tojupyter_image_cache_size`` (in MiB);
+    the least recently used results are removed at the end of the build.
+    """
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, config, doctreedir, image_cache=None):
+        self.directory = cache_directory(doctreedir, "optimized")
+        self.max_bytes = max(0, int(config["tojupyter_image_cache_size"])) * 1024 * 1024
+        self.image_cache = image_cache
+        self.targets = dict()
+        for target, settings in (config["tojupyter_image_optimization"] or {}).items():
+            if target not in IMAGE_TARGETS:
+                self.logger.warning("tojupyter_image_optimization: unknown target '{}', expected one of {}".format(
+                    target, ", ".join(IMAGE_TARGETS)))
+                continue
+            unknown = set(settings or {}) - set(DEFAULT_SETTINGS)
+            if unknown:
+                self.logger.warning("tojupyter_image_optimization: unknown settings {} for '{}'".format(sorted(unknown), target))
+            self.targets[target] = dict(DEFAULT_SETTINGS)
+            self.targets[target].update((key, value) for key, value in (settings or {}).items() if key not in unknown)
+        if self.targets:
+            try:
+                import PIL  # noqa: F401
+            except ImportError:
+                self.logger.warning("tojupyter_image_optimization requires Pillow (pip install pillow); images are not optimized")
+                self.targets = dict()
+
+    def settings_key(self, target):
+        """A hashable key that is the same for targets whose images are processed alike"""
+        settings = self.targets.get(target)
+        if settings is None:
+            return None
+        return tuple(sorted(settings.items()))
+
+    def process(self, path, target, stat=None):
+        """
+        Return the path and ``os.stat`` result of the image at `path` processed with the
+        settings of `target`, or `path` itself when the image is not processed.
+        """
+        if stat is None:
+            stat = os.stat(path)
+        settings = self.targets.get(target)
+        mime_type = mimetypes.guess_type(path)[0]
+        if settings is None or mime_type not in OPTIMIZED_TYPES:
+            return path, stat
+
+        if self.image_cache is not None:
+            digest = self.image_cache.digest(path, stat)
+        else:
+            digest = hash_file(path, stat.st_size)
+        settings_digest = hashlib.sha256(json.dumps(settings, sort_keys=True).encode("utf-8")).hexdigest()
+        name = os.path.join(self.directory, "{}-{}".format(digest[:32], settings_digest[:12]))
+        ## a result that is not smaller than the source is replaced by a copy of the source,
+        ## stored in the source format
+        source = name + os.path.splitext(path)[1].lower()
+        dest = name + ".webp" if settings["webp"] else source
+        for candidate in (dest, source):
+            try:
+                stat = os.stat(candidate)
+            except OSError:
+                continue
+            touch(candidate)
+            return candidate, stat
+
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmpname = "{}.{}.tmp".format(dest, os.getpid())
+            try:
+                if not self._optimize(path, tmpname, OPTIMIZED_TYPES[mime_type], settings):
+                    ## keep the source, so it is not processed again
+                    shutil.copyfile(path, tmpname)
+                    dest = source
+                os.replace(tmpname, dest)
+            finally:
+                if os.path.exists(tmpname):
+                    os.remove(tmpname)
+            return dest, os.stat(dest)
+        except Exception as err:
+            self.logger.warning("Unable to optimize image {}: {}".format(path, err))
+            return path, stat
+
+    def _optimize(self, path, dest, image_format, settings):
+        """Write the optimized image to `dest`; return False when it is not worth keeping"""
+        from PIL import Image
+        with Image.open(path) as image:
+            image.load()
+            changed = False
+            max_width = settings["max_width"]
+            if max_width and image.width > max_width:
+                if image.mode == "P":
+                    image = image.convert("RGBA")
+                height = max(1, round(image.height * max_width / image.width))
+                image = image.resize((int(max_width), height), Image.LANCZOS)
+                changed = True
+            if settings["webp"]:
+                if image.mode not in ("RGB", "RGBA"):
+                    image = image.convert("RGBA")
+                image.save(dest, "WEBP", quality=settings["quality"], method=6)
+            elif image_format == "JPEG":
+                image.save(dest, "JPEG", quality=settings["quality"], optimize=True, progressive=True)
+            else:
+                image.save(dest, "PNG", optimize=True)
+        return changed or os.path.getsize(dest) < os.path.getsize(path)
+
+    def prune(self):
+        """Remove the least recently used results until the store fits in its size limit"""
+        prune_directory(self.directory, self.max_bytes)
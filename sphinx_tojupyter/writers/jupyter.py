@@ -3,6 +3,9 @@ import nbformat
 
 from .translate_code import JupyterCodeTranslator
 from .translate_all import JupyterTranslator
+from .context import TranslationContext
+from .manifest import BuildManifest
+from .variants import resolve_variant, translation_settings
 
 
 class JupyterWriter(docutils.writers.Writer):
@@ -11,29 +14,122 @@ class JupyterWriter(docutils.writers.Writer):
 
         self.output = None
         self.builder = builder
+        # dispatch statistics of the last translation (tojupyter_debug_translator)
+        self.dispatch_stats = None
         self.translator_class = self._identify_translator(builder)
+        # settings shared by the translators of all documents, built once per build
+        self.context = getattr(builder, "translation_context", None) or TranslationContext(builder.config)
+        # whether the notebooks of the last document came from the translation cache
+        self.cached = False
+        self.translation_cache = getattr(builder, "translation_cache", None)
+        if self.translation_cache is not None:
+            self.config_hash = BuildManifest.hash_config(builder.config, builder.confdir)
 
     def translate(self):
+        self.output = nbformat.writes(self._translate_notebook())
+
+    def write_notebook(self, document, docname=None, urlpath=None, image_urlpath=None, image_target=None):
+        """
+        Translate `document` and return the notebook as a NotebookNode.
+
+        Unlike `write`, the notebook is not serialized, so builders can update
+        it in memory and serialize it once when it is written to disk.
+
+        `urlpath` and `image_urlpath` are prepended to links and image paths, so that
+        they can be different for different targets (site and download notebooks).
+        They are handed to the translator rather than stored on the builder, which keeps
+        the parallel writers of ``sphinx-build -j N`` independent. `image_target` selects
+        the tojupyter_image_optimization settings applied to glued images.
+        """
+        self.document = document
+        return self._translate_notebook(docname=docname, urlpath=urlpath, image_urlpath=image_urlpath,
+                                        image_target=image_target)
+
+    def write_notebooks(self, document, docname, variants):
+        """
+        Translate `document` once and return a NotebookNode for each of `variants`.
+
+        `variants` maps names to dicts of ``urlpath``, ``image_urlpath``, ``drop_solutions``,
+        ``drop_tests`` and ``image_target``. Variants only differ in links, image paths and
+        dropped cells, which are resolved by a post-pass over the translated notebook (see
+        `variants`). Variants whose glued images are optimized differently (see `images`)
+        are translated separately.
+        """
+        self.document = document
+        image_pipeline = getattr(self.builder, "image_pipeline", None)
+        groups = dict()
+        for name, variant in variants.items():
+            key = image_pipeline.settings_key(variant.get("image_target")) if image_pipeline is not None else None
+            groups.setdefault(key, dict())[name] = variant
+
+        notebooks = dict()
+        dispatch_stats = None
+        cached = True
+        for group in groups.values():
+            settings = translation_settings(
+                group,
+                self.builder.config["tojupyter_drop_solutions"],
+                self.builder.config["tojupyter_drop_tests"])
+            names = list(group)
+            nb = self._translate_notebook(docname=docname, image_target=group[names[0]].get("image_target"), **settings)
+            cached = cached and self.cached
+            if dispatch_stats is None:
+                dispatch_stats = self.dispatch_stats
+            elif self.dispatch_stats is not None:
+                dispatch_stats.update(self.dispatch_stats)
+            for name in names:
+                ## the last variant can take over the translated notebook instead of a copy
+                notebooks[name] = resolve_variant(nb, group[name], inplace=(name == names[-1]))
+        self.dispatch_stats = dispatch_stats
+        self.cached = cached
+        return {name: notebooks[name] for name in variants}
+
+    def _translate_notebook(self, **settings):
         self.document.settings.newlines = \
             self.document.settings.indents = \
             self.builder.env.config.xml_pretty
 
-        visitor = self.translator_class(self.builder, self.document)
+        translator_class = self.translator_class
 
-        self.document.walkabout(visitor)
-        self.output = nbformat.writes(visitor.output)
+        ## notebooks translated by an earlier build or builder (tojupyter_translation_cache)
+        key = None
+        self.cached = False
+        if self.translation_cache is not None and settings.get("docname") and not self.context.debug_translator:
+            key = self._cache_key(translator_class, settings)
+            nb = self.translation_cache.get(key)
+            if nb is not None:
+                self.cached = True
+                self.dispatch_stats = None
+                return nbformat.from_dict(nb)
 
-    def _set_ref_urlpath(self, urlpath=None):
-        """
-        Set a urlpath to be used to prepend links in the notebook, so that it can be different for different targets.
-        """
-        self.builder.urlpath = urlpath
+        visitor = translator_class(self.builder, self.document, context=self.context, **settings)
+
+        self.document.walkabout(visitor)
+        self.dispatch_stats = visitor.dispatch_stats
+        if key is not None and visitor.cacheable:
+            self.translation_cache.put(key, visitor.output, visitor.file_dependencies)
+        # metadata such as the kernelspec is assigned as plain dicts (shared with conf.py),
+        # so convert the whole tree to give builders a NotebookNode they can safely modify
+        return nbformat.from_dict(visitor.output)
 
-    def _set_tojupyter_image_urlpath(self, urlpath=None):
+    def _cache_key(self, translator_class, settings):
         """
-        Set a urlpath to be used to prepend image paths in the notebook, so that it can be different for different targets.
+        The translation cache key of the document: besides the doctree, the translation
+        depends on the translator, its settings, the configuration and the numbers Sphinx
+        assigned to the sections and figures of the document
         """
-        self.builder.tojupyter_image_urlpath = urlpath
+        from .. import VERSION
+        env = self.builder.env
+        docname = settings["docname"]
+        return self.translation_cache.key(
+            self.document,
+            VERSION,
+            "{}.{}".format(translator_class.__module__, translator_class.__qualname__),
+            settings,
+            self.config_hash,
+            self.builder.config["numfig_format"],
+            env.toc_secnumbers.get(docname),
+            env.toc_fignumbers.get(docname))
 
     def _identify_translator(self, builder):
         """
@@ -3,8 +3,6 @@ PDF Converter from IPYNB to TEX to PDF
 """
 
 import nbformat
-from nbconvert import PDFExporter
-from nbconvert import LatexExporter
 import os
 import sys
 import shutil
@@ -13,7 +11,6 @@ from io import open
 import subprocess
 from sphinx.util.osutil import ensuredir
 from sphinx.util import logging
-from nbconvert.preprocessors import LatexPreprocessor
 from .utils import python27_glob, get_list_of_files
 
 class MakePDFWriter():
@@ -29,6 +26,7 @@ class MakePDFWriter():
         for path in [self.pdfdir, self.texdir]:
             ensuredir(path)
 
+        from nbconvert import LatexExporter, PDFExporter
         self.pdf_exporter = PDFExporter()
         self.tex_exporter = LatexExporter()
         self.index_book = builder.config['tojupyter_pdf_book_index']
@@ -103,12 +101,14 @@ class MakePDFWriter():
         if not True in excluded_files:    
             ## --output-dir - forms a directory in the same path as fl_ipynb - need a way to specify properly?
             ### converting to pdf using xelatex subprocess
-            if sys.version_info[0] < 3:
-                subprocess.call(["jupyter", "nbconvert","--to","latex","--template",fl_tex_template,"from", fl_ipynb])
-            else:
-                subprocess.run(["jupyter", "nbconvert","--to","latex","--template",fl_tex_template,"from", fl_ipynb])
+            with builder.profiler.stage(filename, "latex"):
+                if sys.version_info[0] < 3:
+                    subprocess.call(["jupyter", "nbconvert","--to","latex","--template",fl_tex_template,"from", fl_ipynb])
+                else:
+                    subprocess.run(["jupyter", "nbconvert","--to","latex","--template",fl_tex_template,"from", fl_ipynb])
 
             ### check if subdirectory
+            docname = filename
             subdirectory = ""
             index = filename.rfind('/')
             if index > 0:
@@ -119,11 +119,12 @@ class MakePDFWriter():
             os.chdir(self.texdir + "/" + subdirectory)
 
             try:
-                self.subprocess_xelatex(fl_tex, filename)
-                if 'bib_include' in latex_metadata:
-                    self.subprocess_bibtex(filename)
-                self.subprocess_xelatex(fl_tex, filename)
-                self.subprocess_xelatex(fl_tex, filename)
+                with builder.profiler.stage(docname, "xelatex"):
+                    self.subprocess_xelatex(fl_tex, filename)
+                    if 'bib_include' in latex_metadata:
+                        self.subprocess_bibtex(filename)
+                    self.subprocess_xelatex(fl_tex, filename)
+                    self.subprocess_xelatex(fl_tex, filename)
             except OSError as e:
                 print(e)
             except AssertionError as e:
@@ -269,11 +270,13 @@ class MakePDFWriter():
                     output.close()
                     
         os.chdir(self.texbookdir)
-        self.nbconvert_index(builder)
+        with builder.profiler.stage(self.index_book, "latex"):
+            self.nbconvert_index(builder)
         fl_tex = self.texbookdir + "/" + self.index_book + ".tex"
         filename = self.index_book
 
         ## checking if an explicit output filename is specified in the config file
         if "tojupyter_pdf_book_name" in builder.config and builder.config["tojupyter_pdf_book_name"]:
             filename = builder.config["tojupyter_pdf_book_name"]
-        self.create_pdf_from_latex(fl_tex, filename)
\ No newline at end of file
+        with builder.profiler.stage(self.index_book, "xelatex"):
+            self.create_pdf_from_latex(fl_tex, filename)
\ No newline at end of file
@@ -0,0 +1,223 @@
+import hashlib
+import json
+import os
+import re
+import sphinx
+from sphinx.util import logging
+from ..directive.jupyter import jupyter_node
+
+MANIFEST_FILENAME = ".tojupyter-manifest.json"
+MANIFEST_VERSION = 3
+
+## options that change how the build runs but not the notebooks it produces
+RUNTIME_CONFIG = {
+    "tojupyter_build_manifest",
+    "tojupyter_compare_before_write",
+    "tojupyter_write_threads",
+    "tojupyter_profile",
+    "tojupyter_debug_translator",
+    "tojupyter_image_cache",
+    "tojupyter_image_cache_memory",
+    "tojupyter_image_cache_size",
+    "tojupyter_translation_cache",
+    "tojupyter_translation_cache_size",
+}
+
+## rebuild values of the options that change the doctrees (``env``) or the notebooks
+FINGERPRINT_REBUILD = ("env", "jupyter", True)
+
+
+class BuildManifest():
+    """
+    Persistent record of what each notebook in the build directory was built from.
+
+    For every written document the manifest stores a fingerprint, which is a hash of
+
+    * the source file,
+    * the files it includes (``literalinclude``, ``include`` ...),
+    * the files declared with the ``jupyter-dependency`` directive,
+    * the documents sharing a ``tojupyter_dependency_lists`` entry with it,
+    * the section and figure numbers and toctree titles assigned by Sphinx,
+    * the configuration values that Sphinx re-reads the documents for (``rst_prolog``,
+      ``language``, ``myst_*`` ...) and the ``tojupyter_*`` ones,
+    * the files of the template folders (``templates_path`` and
+      ``tojupyter_template_path``: ``languages.xml``, the LaTeX and HTML templates), and
+    * the versions of Sphinx and sphinx-tojupyter.
+
+    A document only needs rebuilding when its fingerprint changes, which makes the
+    decision independent of file modification times (git checkouts, CI cache restores).
+    Documents re-read by Sphinx are always rebuilt, and so is every document with
+    ``sphinx-build -a``.
+    """
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, builder):
+        self.builder = builder
+        self.filename = os.path.join(str(builder.outdir), MANIFEST_FILENAME)
+        self.config_hash = self.hash_config(builder.config, builder.confdir)
+        self.docs = dict()
+        self.outputs = dict()
+        self._file_hashes = dict()
+        self.load()
+
+    def load(self):
+        if not os.path.isfile(self.filename):
+            return
+        try:
+            with open(self.filename, encoding="UTF-8") as f:
+                data = json.load(f)
+        except (IOError, OSError, ValueError) as err:
+            self.logger.warning("Unable to read build manifest {}: {}".format(self.filename, err))
+            return
+        if data.get("version") == MANIFEST_VERSION:
+            self.docs = data.get("docs", {})
+            self.outputs = data.get("outputs", {})
+
+    def save(self):
+        ## forget documents that were removed from the project
+        docs = {docname: entry for docname, entry in self.docs.items() if docname in self.builder.env.found_docs}
+        outputs = {path: digest for path, digest in self.outputs.items()
+                   if os.path.exists(os.path.join(str(self.builder.outdir), path))}
+        os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+        tmpname = self.filename + ".tmp"
+        try:
+            with open(tmpname, "w", encoding="UTF-8") as f:
+                json.dump({"version": MANIFEST_VERSION, "docs": docs, "outputs": outputs}, f, indent=1, sort_keys=True)
+            os.replace(tmpname, self.filename)
+        except (IOError, OSError) as err:
+            self.logger.warning("Unable to save build manifest {}: {}".format(self.filename, err))
+
+    @staticmethod
+    def hash_config(config, confdir):
+        from .. import VERSION
+        values = {"sphinx": sphinx.__version__, "sphinx-tojupyter": VERSION}
+        ## the notebooks and the pdf depend on the content of the templates, not on their names
+        values["template files"] = {
+            os.path.relpath(filename, confdir): hash_path(filename)
+            for filename in template_files(config, confdir)
+        }
+        for item in config:
+            if item.name in RUNTIME_CONFIG:
+                continue
+            if item.name.startswith(("tojupyter_", "tojuyter_")) or item.name in ("mathjax3_config", "templates_path") \
+                    or item.rebuild in FINGERPRINT_REBUILD:
+                values[item.name] = stable_value(item.value)
+        return hash_text(json.dumps(values, sort_keys=True, default=repr))
+
+    @staticmethod
+    def find_dependencies(doctree):
+        """Return the files declared with ``jupyter-dependency`` in `doctree`"""
+        return sorted(node["uri"] for node in doctree.findall(jupyter_node) if "uri" in node.attributes)
+
+    def hash_file(self, filename):
+        if filename not in self._file_hashes:
+            self._file_hashes[filename] = hash_path(filename)
+        return self._file_hashes[filename]
+
+    def fingerprint(self, docname, dependencies=None):
+        """
+        Compute the fingerprint of `docname`.
+
+        `dependencies` are the ``jupyter-dependency`` files of the document; when they are
+        not given, the ones recorded by the previous build are used.
+        """
+        env = self.builder.env
+        srcdir = str(self.builder.srcdir)
+        if dependencies is None:
+            dependencies = self.docs.get(docname, {}).get("dependencies", [])
+
+        parts = [self.config_hash, self.hash_file(str(env.doc2path(docname)))]
+        for dep in sorted(str(dep) for dep in env.dependencies.get(docname, ())):
+            parts.append((dep, self.hash_file(os.path.join(srcdir, dep))))
+        for dep in dependencies:
+            parts.append((dep, self.hash_file(os.path.join(srcdir, dep))))
+        for member in self._dependency_group(docname):
+            if member in env.found_docs:
+                parts.append((member, self.hash_file(str(env.doc2path(member)))))
+
+        parts.append(env.toc_secnumbers.get(docname))
+        parts.append(env.toc_fignumbers.get(docname))
+        for child in env.toctree_includes.get(docname, []):
+            title = env.titles.get(child)
+            parts.append((child, title.astext() if title is not None else None))
+        return hash_text(json.dumps(parts, sort_keys=True, default=repr))
+
+    def _dependency_group(self, docname):
+        """
+        Documents that are executed together with `docname` through ``tojupyter_dependency_lists``.
+        Changing any of them rebuilds the whole group, otherwise a rebuilt notebook could wait
+        forever for the execution of a dependency that was skipped.
+        """
+        group = set()
+        for key, deps in self.builder.config["tojupyter_dependency_lists"].items():
+            if docname == key or docname in deps:
+                group.add(key)
+                group.update(deps)
+        group.discard(docname)
+        return sorted(group)
+
+    def is_outdated(self, docname, fingerprint=None):
+        if fingerprint is None:
+            fingerprint = self.fingerprint(docname)
+        entry = self.docs.get(docname)
+        return entry is None or entry.get("fingerprint") != fingerprint
+
+    def record(self, docname, fingerprint, dependencies):
+        self.docs[docname] = {
+            "fingerprint": fingerprint,
+            "dependencies": dependencies,
+        }
+
+    def _output_key(self, filename):
+        return os.path.relpath(filename, str(self.builder.outdir)).replace(os.sep, "/")
+
+    def output_hash(self, filename):
+        """Return the hash of the content last written to `filename`, if known"""
+        return self.outputs.get(self._output_key(filename))
+
+    def record_output(self, filename, digest):
+        self.outputs[self._output_key(filename)] = digest
+
+
+def stable_value(value):
+    """
+    `value` made of JSON types with the same representation in every process: sets are
+    sorted and objects are named without their memory address
+    """
+    if isinstance(value, dict):
+        return {str(key): stable_value(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [stable_value(item) for item in value]
+    if isinstance(value, (set, frozenset)):
+        return sorted((stable_value(item) for item in value), key=repr)
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if callable(value) and hasattr(value, "__qualname__"):
+        return "{}.{}".format(getattr(value, "__module__", ""), value.__qualname__)
+    return re.sub(r" at 0x[0-9a-fA-F]+", "", repr(value))
+
+
+def template_files(config, confdir):
+    """The files of the template folders of `config`, relative to `confdir`"""
+    confdir = str(confdir or os.curdir)
+    folders = list(config["templates_path"] or []) + [config["tojupyter_template_path"]]
+    files = []
+    for folder in folders:
+        if not folder:
+            continue
+        for root, dirs, names in os.walk(os.path.join(confdir, folder)):
+            dirs.sort()
+            files.extend(os.path.join(root, name) for name in sorted(names))
+    return files
+
+
+def hash_path(filename):
+    try:
+        with open(filename, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except (IOError, OSError):
+        return None
+
+
+def hash_text(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
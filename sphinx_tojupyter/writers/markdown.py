@@ -0,0 +1,150 @@
+import bisect
+import heapq
+
+
+class MarkdownBuffer():
+    """
+    The markdown of the cell being translated, as a list of text entries.
+
+    It behaves like the list of strings the translator used to build, but list items
+    do not rewrite their text when they end. `indent` only records that the newlines
+    of the entries appended since a `mark` are to be followed by an indent, and the
+    indents are applied once, when the cell is flushed with `text`. Rewriting all the
+    text of a list item at each nesting level made deeply nested lists quadratic.
+
+    Reading an entry back (indexing, `pop`, iteration) returns it with the indents
+    recorded so far, and an entry that is assigned to is not indented again by them.
+    """
+
+    def __init__(self):
+        self.lines = []
+        ## entries are identified by increasing ids, so removing an entry never shifts
+        ## the entries an indent applies to
+        self.ids = []
+        ## number of indents recorded before the entry was assigned, which it already contains
+        self.baked = []
+        self.next_id = 0
+        ## recorded indents as (start id, end id, indent), in the order the list items ended;
+        ## an indent covers the entries with ids from start to end, and the end ids never
+        ## decrease, which `_indent_prefix` relies on
+        self.indents = []
+        self.ends = []
+
+    # list interface
+    # --------------
+    def append(self, text):
+        self.lines.append(text)
+        self.ids.append(self.next_id)
+        self.baked.append(len(self.indents))
+        self.next_id += 1
+
+    def pop(self, index=-1):
+        text = self[index]
+        del self[index]
+        return text
+
+    def remove(self, text):
+        for index, line in enumerate(self._indented()):
+            if line == text:
+                del self[index]
+                return
+        raise ValueError("{!r} is not in the markdown buffer".format(text))
+
+    def clear(self):
+        del self[:]
+        del self.indents[:]
+        del self.ends[:]
+
+    def __len__(self):
+        return len(self.lines)
+
+    def __iter__(self):
+        return self._indented()
+
+    def __contains__(self, text):
+        return any(line == text for line in self._indented())
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self.lines)))]
+        if index < 0:
+            index += len(self.lines)
+        prefix = self._indent_prefix(index)
+        if not prefix:
+            return self.lines[index]
+        return self.lines[index].replace("\n", "\n" + prefix)
+
+    def __setitem__(self, index, text):
+        self.lines[index] = text
+        self.baked[index] = len(self.indents)
+
+    def __delitem__(self, index):
+        del self.lines[index]
+        del self.ids[index]
+        del self.baked[index]
+
+    # indentation
+    # -----------
+    def mark(self):
+        """Position from which a later `indent` applies: the entries appended after this call"""
+        return len(self.lines)
+
+    def indent(self, mark, indent):
+        """
+        Indent the lines following the newlines of the entries from position `mark` to
+        the end of the buffer, as rewriting them in place would.
+        """
+        if indent and mark < len(self.lines):
+            self.indents.append((self.ids[mark], self.next_id, indent))
+            self.ends.append(self.next_id)
+
+    def strip_last(self, suffix):
+        """Remove `suffix` from the end of the last entry, if it ends with it"""
+        if self.lines and self[-1].endswith(suffix):
+            self[-1] = self[-1][:-len(suffix)]
+
+    def _indent_prefix(self, index):
+        ## the indents covering an entry were recorded after it was appended, so they are
+        ## found at the end of `indents`; the ones recorded later are applied outside
+        entry_id = self.ids[index]
+        first = max(bisect.bisect_right(self.ends, entry_id), self.baked[index])
+        return "".join(indent for start, end, indent in reversed(self.indents[first:])
+                       if start <= entry_id < end)
+
+    def text(self):
+        """The markdown of the buffer with the indents applied"""
+        if not self.indents:
+            return "".join(self.lines)
+        return "".join(self._indented())
+
+    def _indented(self):
+        """
+        The entries with the indents applied, in order. The indents that cover the current
+        entry are kept sorted by the order they were recorded in while sweeping the entries,
+        and the prefix is only rebuilt when an indent starts or ends
+        """
+        if not self.indents:
+            yield from self.lines
+            return
+        starts = sorted(range(len(self.indents)), key=lambda seq: self.indents[seq][0])
+        ends = []
+        position = 0
+        active = []
+        prefix = prefix_baked = None
+        for line, entry_id, baked in zip(self.lines, self.ids, self.baked):
+            changed = baked != prefix_baked
+            while ends and ends[0][0] <= entry_id:
+                active.remove(heapq.heappop(ends)[1])
+                changed = True
+            while position < len(starts) and self.indents[starts[position]][0] <= entry_id:
+                seq = starts[position]
+                if self.indents[seq][1] > entry_id:
+                    bisect.insort(active, seq)
+                    heapq.heappush(ends, (self.indents[seq][1], seq))
+                    changed = True
+                position += 1
+            if changed:
+                ## the indents recorded before the entry was assigned are part of its text
+                prefix = "".join(self.indents[seq][2] for seq in reversed(active[bisect.bisect_left(active, baked):]))
+                prefix_baked = baked
+            yield line.replace("\n", "\n" + prefix) if prefix else line
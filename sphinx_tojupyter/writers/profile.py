@@ -0,0 +1,156 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from sphinx.util import logging
+from sphinx.util.osutil import ensuredir
+
+PROFILE_FILENAME = "build-profile.json"
+TRACE_FILENAME = "build-profile.trace.json"
+
+## stages that measure time spent waiting in a queue rather than working on a thread
+QUEUE_STAGES = ("write queue", "execution queue")
+
+
+class BuildProfiler():
+    """
+    Records the wall and CPU time spent on each document in each stage of the build
+    (``tojupyter_profile``).
+
+    At the end of the build `save` writes a summary to ``reports/build-profile.json``
+    and the individual spans to ``reports/build-profile.trace.json`` in the Chrome
+    ``trace_event`` format, which can be opened in ``chrome://tracing`` or Perfetto.
+    Every process and thread of the build (main process, forked writers, background
+    notebook writers, execution threads) gets its own track.
+
+    When profiling is disabled every method returns immediately.
+    """
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, enabled=False):
+        self.enabled = bool(enabled)
+        self.origin = time.perf_counter()
+        self.pid = os.getpid()
+        self.events = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, docname, name):
+        """Time the enclosed block as stage `name` of `docname`"""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        cpu = time.thread_time()
+        try:
+            yield
+        finally:
+            self.record(docname, name, start, time.perf_counter(), time.thread_time() - cpu)
+
+    def record(self, docname, name, start, end, cpu=None, thread=None):
+        """
+        Record a span measured elsewhere. `start` and `end` are ``time.perf_counter``
+        values and `thread` the (ident, name) of the thread that did the work, which
+        defaults to the current one.
+        """
+        if not self.enabled:
+            return
+        if thread is None:
+            current = threading.current_thread()
+            thread = (current.ident, current.name)
+        event = {
+            "docname": docname,
+            "stage": name,
+            "start": start - self.origin,
+            "wall": end - start,
+            "cpu": cpu,
+            "pid": os.getpid(),
+            "tid": thread[0],
+            "thread": thread[1],
+        }
+        with self._lock:
+            self.events.append(event)
+
+    def take_events(self):
+        """
+        Return the events recorded by the current process and clear the list, to send them
+        from a forked writer to the main process. Events inherited through the fork are dropped.
+        """
+        pid = os.getpid()
+        with self._lock:
+            events, self.events = self.events, []
+        return [event for event in events if event["pid"] == pid]
+
+    def add_events(self, events):
+        if events:
+            with self._lock:
+                self.events.extend(events)
+
+    def summary(self):
+        stages = dict()
+        documents = dict()
+        for event in self.events:
+            for totals in (stages.setdefault(event["stage"], {}),
+                           documents.setdefault(event["docname"], {}).setdefault(event["stage"], {})):
+                totals["count"] = totals.get("count", 0) + 1
+                totals["wall"] = totals.get("wall", 0.0) + event["wall"]
+                if event["cpu"] is not None:
+                    totals["cpu"] = totals.get("cpu", 0.0) + event["cpu"]
+        return {
+            "wall": time.perf_counter() - self.origin,
+            "stages": stages,
+            "documents": documents,
+        }
+
+    def trace_events(self):
+        """The recorded spans as Chrome ``trace_event`` entries (times in microseconds)"""
+        trace = []
+        threads = dict()
+        processes = set()
+        for index, event in enumerate(sorted(self.events, key=lambda event: event["start"])):
+            args = {"docname": event["docname"]}
+            if event["cpu"] is not None:
+                args["cpu_ms"] = round(event["cpu"] * 1e3, 3)
+            start = round(event["start"] * 1e6, 1)
+            if event["stage"] in QUEUE_STAGES:
+                ## waits overlap each other, so they are drawn as async spans
+                common = {"name": event["stage"], "cat": "queue", "id": index, "pid": event["pid"], "tid": 0}
+                trace.append(dict(common, ph="b", ts=start, args=args))
+                trace.append(dict(common, ph="e", ts=round(start + event["wall"] * 1e6, 1)))
+                continue
+            trace.append({
+                "name": "{} {}".format(event["stage"], event["docname"]),
+                "cat": event["stage"],
+                "ph": "X",
+                "ts": start,
+                "dur": round(event["wall"] * 1e6, 1),
+                "pid": event["pid"],
+                "tid": event["tid"],
+                "args": args,
+            })
+            threads[(event["pid"], event["tid"])] = event["thread"]
+            processes.add(event["pid"])
+        for pid in sorted(processes):
+            name = "sphinx-build" if pid == self.pid else "writer process {}".format(pid)
+            trace.append({"name": "process_name", "ph": "M", "pid": pid, "tid": 0, "args": {"name": name}})
+        for (pid, tid), name in sorted(threads.items()):
+            trace.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}})
+        return trace
+
+    def save(self, reportdir):
+        """Write the profile summary and the trace into `reportdir`"""
+        if not self.enabled:
+            return
+        ensuredir(reportdir)
+        profile = os.path.join(reportdir, PROFILE_FILENAME)
+        trace = os.path.join(reportdir, TRACE_FILENAME)
+        try:
+            with open(profile, "w", encoding="UTF-8") as f:
+                json.dump(self.summary(), f, indent=1, sort_keys=True)
+            with open(trace, "w", encoding="UTF-8") as f:
+                json.dump({"traceEvents": self.trace_events(), "displayTimeUnit": "ms"}, f)
+        except (IOError, OSError) as err:
+            self.logger.warning("Unable to save build profile {}: {}".format(profile, err))
+            return
+        self.logger.info("build profile written to %s", profile)
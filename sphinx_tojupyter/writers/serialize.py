@@ -0,0 +1,136 @@
+import json
+from sphinx.util import logging
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+## mime types split into lines like the text/* ones (see nbformat.v4.rwbase)
+NON_TEXT_SPLIT_MIMES = {"image/svg+xml", "application/javascript"}
+TRANSIENT_METADATA = ("orig_nbformat", "orig_nbformat_minor", "signature")
+VALIDATION_POLICIES = ("strict", "fast", "off")
+
+
+class NotebookSerializer():
+    """
+    Serializes notebooks to the nbformat v4 JSON format.
+
+    The output of the default settings is identical to ``nbformat.writes`` but the
+    notebook is not deep-copied first. ``tojupyter_nb_serialization`` selects
+
+    * ``validation``: ``strict`` runs the full ``nbformat.validate``, ``fast`` runs a
+      single schema check with the compiled ``fastjsonschema`` validator (when installed)
+      and ``off`` skips validation of the notebooks made by the translator.
+    * ``compact``: write JSON without indentation, using ``orjson`` when it is installed.
+    """
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, config):
+        settings = {"validation": "strict", "compact": False}
+        settings.update(config["tojupyter_nb_serialization"] or {})
+        self.validation = settings["validation"]
+        if self.validation not in VALIDATION_POLICIES:
+            self.logger.warning("tojupyter_nb_serialization: unknown validation policy '{}', "
+                                "expected one of {}".format(self.validation, ", ".join(VALIDATION_POLICIES)))
+            self.validation = "strict"
+        self.compact = bool(settings["compact"])
+        self._validator = None
+
+    def dumps(self, nb):
+        """
+        Return the JSON text of `nb` and the validation error found in it, if any.
+        Invalid notebooks are still serialized, like ``nbformat.writes`` does.
+        """
+        error = self.validate(nb)
+        view = file_view(nb)
+        if not self.compact:
+            text = json.dumps(view, sort_keys=True, indent=1, separators=(",", ": "),
+                              ensure_ascii=False, default=encode_bytes)
+        elif orjson is not None:
+            text = orjson.dumps(view, default=encode_bytes, option=orjson.OPT_SORT_KEYS).decode("utf-8")
+        else:
+            text = json.dumps(view, sort_keys=True, separators=(",", ":"),
+                              ensure_ascii=False, default=encode_bytes)
+        return text, error
+
+    def validate(self, nb):
+        """Validate `nb` according to the policy and return the error found, if any"""
+        import nbformat
+        if self.validation == "off":
+            return None
+        validator = self.fast_validator() if self.validation == "fast" else None
+        try:
+            if validator is not None:
+                validator.validate(nb)
+            else:
+                nbformat.validate(nb)
+        except nbformat.ValidationError as err:
+            return err
+        return None
+
+    def fast_validator(self):
+        if self._validator is None:
+            try:
+                import fastjsonschema  # noqa: F401
+                from nbformat.validator import get_validator
+            except ImportError:
+                self._validator = False
+            else:
+                self._validator = get_validator(version=4, name="fastjsonschema") or False
+        return self._validator or None
+
+
+def file_view(nb):
+    """
+    The structure nbformat writes to disk for `nb`: multiline strings are split into
+    lines and transient metadata is left out. Unlike ``nbformat.v4.rwbase.split_lines``
+    it leaves `nb` untouched and only copies the containers that change.
+    """
+    view = dict(nb)
+    metadata = nb.get("metadata", {})
+    if any(key in metadata for key in TRANSIENT_METADATA):
+        view["metadata"] = {key: value for key, value in metadata.items() if key not in TRANSIENT_METADATA}
+    view["cells"] = [_cell_view(cell) for cell in nb.get("cells", [])]
+    return view
+
+
+def _cell_view(cell):
+    view = dict(cell)
+    if isinstance(cell.get("source"), str):
+        view["source"] = cell["source"].splitlines(True)
+    if "trusted" in cell.get("metadata", {}):
+        view["metadata"] = {key: value for key, value in cell["metadata"].items() if key != "trusted"}
+    if "attachments" in cell:
+        view["attachments"] = {name: _bundle_view(bundle) for name, bundle in cell["attachments"].items()}
+    if cell.get("cell_type") == "code":
+        view["outputs"] = [_output_view(output) for output in cell.get("outputs", [])]
+    return view
+
+
+def _output_view(output):
+    output_type = output.get("output_type")
+    if output_type in ("execute_result", "display_data") and "data" in output:
+        view = dict(output)
+        view["data"] = _bundle_view(output["data"])
+        return view
+    if output_type == "stream" and isinstance(output.get("text"), str):
+        view = dict(output)
+        view["text"] = output["text"].splitlines(True)
+        return view
+    return output
+
+
+def _bundle_view(bundle):
+    return {
+        key: value.splitlines(True)
+        if isinstance(value, str) and (key.startswith("text/") or key in NON_TEXT_SPLIT_MIMES) else value
+        for key, value in bundle.items()
+    }
+
+
+def encode_bytes(obj):
+    """Write (base64 encoded) bytes as text like nbformat's ``BytesEncoder``"""
+    if isinstance(obj, bytes):
+        return obj.decode("ascii")
+    raise TypeError("Object of type {} is not JSON serializable".format(type(obj).__name__))
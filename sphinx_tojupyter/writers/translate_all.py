@@ -2,12 +2,16 @@ from __future__ import unicode_literals
 import re
 import nbformat.v4
 from docutils import nodes, writers
+from .image_cache import encode_file, hash_file, link_or_copy
+from .book_index import BookIndex
+from .enumerables import EnumerableIndex
+from .markdown import MarkdownBuffer
 from .translate_code import JupyterCodeTranslator
 from .utils import JupyterOutputCellGenerators
+from .variants import IMAGE_URLPATH_TOKEN, image_urlpath_token
 from shutil import copyfile
 import copy
 import os
-import base64
 import mimetypes
 from sphinx.util import logging
 
@@ -20,8 +24,8 @@ class JupyterTranslator(JupyterCodeTranslator, object):
 
     SPLIT_URI_ID_REGEX = re.compile(r"([^\#]*)\#?(.*)")
 
-    def __init__(self, builder, document):
-        super(JupyterTranslator, self).__init__(builder, document)
+    def __init__(self, builder, document, **settings):
+        super(JupyterTranslator, self).__init__(builder, document, **settings)
 
         # Settings
         self.sep_lines = "  \n"
@@ -30,7 +34,6 @@ class JupyterTranslator(JupyterCodeTranslator, object):
         self.indent = self.indent_char * 4
         self.default_ext = ".ipynb"
         self.html_ext = ".html"
-        self.urlpath = builder.urlpath
         # Variables used in visit/depart
         self.in_code_block = False  # if False, it means in markdown_cell
         self.in_block_quote = False
@@ -49,7 +52,7 @@ class JupyterTranslator(JupyterCodeTranslator, object):
         self.in_math_block = False
 
         self.code_lines = []
-        self.markdown_lines = []
+        self.markdown_lines = MarkdownBuffer()
 
         self.indents = []
         self.section_level = 0
@@ -68,6 +71,11 @@ class JupyterTranslator(JupyterCodeTranslator, object):
 
         self.images = []
         self.files = []
+        # images embedded with tojupyter_image_embed = "attachments", by attachment name,
+        # until they are attached to the markdown cell referencing them
+        self.attachments = dict()
+        # markdown cell that the next markdown may be appended to (tojupyter_coalesce_markdown)
+        self.coalesce_cell = None
         self.table_builder = None
 
         # Slideshow option
@@ -76,12 +84,37 @@ class JupyterTranslator(JupyterCodeTranslator, object):
 
         ## pdf book options
         self.in_book_index = False
-        self.book_index_previous_links = []
-        self.markdown_lines_trimmed = []
+
+        ## the doctree is never modified: nodes to skip and text to append to a node
+        ## are tracked here (by node id) instead
+        self.skip_nodes = set()
+        self.text_suffixes = dict()
+
+    def dispatch_key(self):
+        return self.context.enumerables.key
+
+    def _resolve_handler(self, table, prefix, node_class, fallback):
+        ## the nodes of the registered numbered directives share their handlers
+        if node_class.__name__ in self.context.enumerables.node_types:
+            method = getattr(type(self), prefix + "enumerable")
+            table[node_class] = method
+            return method
+        return super(JupyterTranslator, self)._resolve_handler(table, prefix, node_class, fallback)
+
+    def dispatch_visit(self, node):
+        if id(node) in self.skip_nodes:
+            raise nodes.SkipNode
+        return super(JupyterTranslator, self).dispatch_visit(node)
+
+    def dispatch_departure(self, node):
+        if id(node) in self.text_suffixes:
+            self.visit_Text(nodes.Text(self.text_suffixes[id(node)]))
+        return super(JupyterTranslator, self).dispatch_departure(node)
 
     def _image_to_base64(self, image_path):
         """
-        Convert an image file to a base64-encoded data URI.
+        Convert an image file to a base64-encoded data URI, or to a reference to a
+        cell attachment when tojupyter_image_embed is "attachments".
         
         Parameters
         ----------
@@ -91,28 +124,28 @@ class JupyterTranslator(JupyterCodeTranslator, object):
         Returns
         -------
         str
-            Base64-encoded data URI (e.g., 'data:image/png;base64,...') or None if file not found
+            Base64-encoded data URI (e.g., 'data:image/png;base64,...'), attachment
+            reference (e.g., 'attachment:<hash>.png') or None if file not found
         """
-        # Try to find the image file
-        # First try relative to the build directory
-        full_path = os.path.join(self.builder.outdir, image_path)
-        if not os.path.exists(full_path):
-            # Try relative to source directory
-            full_path = os.path.join(self.builder.srcdir, image_path)
-        if not os.path.exists(full_path):
-            # Try as absolute path
-            full_path = image_path
-        
-        if not os.path.exists(full_path):
+        full_path, stat = self._find_image(image_path)
+        if full_path is None:
+            ## the notebook depends on a missing file, which may exist in a later build
+            self.cacheable = False
             return None
+        self.file_dependencies[full_path] = (stat.st_size, stat.st_mtime_ns)
         
         try:
-            # Read the image file as binary
-            with open(full_path, 'rb') as f:
-                image_data = f.read()
-            
-            # Encode as base64
-            encoded = base64.b64encode(image_data).decode('ascii')
+            # Downscale and recompress for this target (tojupyter_image_optimization)
+            image_pipeline = getattr(self.builder, "image_pipeline", None)
+            if image_pipeline is not None:
+                full_path, stat = image_pipeline.process(full_path, self.image_target, stat)
+
+            # Encode as base64, reusing earlier encodings of the same file
+            image_cache = getattr(self.builder, "image_cache", None)
+            if image_cache is not None:
+                digest, encoded = image_cache.encode(full_path, stat)
+            else:
+                digest, encoded = encode_file(full_path, stat.st_size)
             
             # Determine MIME type
             mime_type, _ = mimetypes.guess_type(full_path)
@@ -120,6 +153,12 @@ class JupyterTranslator(JupyterCodeTranslator, object):
                 # Default to PNG if we can't determine
                 mime_type = 'image/png'
             
+            if self.context.image_embed == "attachments":
+                # Store the image once per cell, named after its content
+                name = digest[:16] + (mimetypes.guess_extension(mime_type) or "")
+                self.attachments[name] = {mime_type: encoded}
+                return f"attachment:{name}"
+
             # Create data URI
             data_uri = f"data:{mime_type};base64,{encoded}"
             return data_uri
@@ -130,48 +169,77 @@ class JupyterTranslator(JupyterCodeTranslator, object):
 
     def _copy_glued_image(self, image_path, filename):
         """
-        Copy a glued image to the _build/jupyter/glue/ directory for URL-based references.
+        Publish a glued image in the _build/jupyter/glue/ directory for URL-based references.
+
+        The copy is named after `filename` and a hash of the image content, so images with
+        the same basename do not overwrite each other, and it is only created when it is
+        missing. It is a hardlink when the build directory is on the same filesystem.
         
         Parameters
         ----------
         image_path : str
             Original path to the image file
         filename : str
-            Filename to use in the destination directory
+            Filename the name of the copy is derived from
         
         Returns
         -------
-        bool
-            True if copy was successful, False otherwise
+        str
+            Filename of the copy in the glue directory, or None if the copy failed
         """
-        # Try to find the source image file
-        full_path = os.path.join(self.builder.outdir, image_path)
-        if not os.path.exists(full_path):
-            full_path = os.path.join(self.builder.srcdir, image_path)
-        if not os.path.exists(full_path):
-            full_path = image_path
-        
-        if not os.path.exists(full_path):
-            print(f"Warning: Could not find glued image to copy: {image_path}")
-            return False
+        ## the copy must be made by every build, so the translation is not cached
+        self.cacheable = False
+        full_path, stat = self._find_image(image_path)
+        if full_path is None:
+            logger.warning(f"Could not find glued image to copy: {image_path}")
+            return None
         
         try:
-            # Create the glue directory
+            # Downscale and recompress for this target (tojupyter_image_optimization)
+            image_pipeline = getattr(self.builder, "image_pipeline", None)
+            if image_pipeline is not None:
+                processed_path, stat = image_pipeline.process(full_path, self.image_target, stat)
+                if processed_path != full_path:
+                    extension = os.path.splitext(processed_path)[1]
+                    filename = os.path.splitext(filename)[0] + extension
+                    full_path = processed_path
+
+            # Name the copy after the image content
+            image_cache = getattr(self.builder, "image_cache", None)
+            if image_cache is not None:
+                digest = image_cache.digest(full_path, stat)
+            else:
+                digest = hash_file(full_path, stat.st_size)
+            stem, extension = os.path.splitext(filename)
+            filename = f"{stem}-{digest[:16]}{extension}"
+
+            # Publish the file unless an earlier reference or build already did
             glue_dir = os.path.join(self.builder.outdir, 'glue')
-            os.makedirs(glue_dir, exist_ok=True)
-            
-            # Copy the file
             dest_path = os.path.join(glue_dir, filename)
-            copyfile(full_path, dest_path)
-            
-            # Log for user
-            rel_dest = os.path.relpath(dest_path, self.builder.outdir)
-            print(f"Copied glued image: {rel_dest}")
+            if not os.path.exists(dest_path):
+                os.makedirs(glue_dir, exist_ok=True)
+                link_or_copy(full_path, dest_path)
+                logger.info(f"Copied glued image: {os.path.relpath(dest_path, self.builder.outdir)}")
             
-            return True
+            return filename
         except Exception as e:
-            print(f"Warning: Failed to copy glued image {image_path}: {e}")
-            return False
+            logger.warning(f"Failed to copy glued image {image_path}: {e}")
+            return None
+
+    def _find_image(self, image_path):
+        """
+        Find a glued image relative to the build directory, relative to the source
+        directory or as an absolute path. Returns its path and ``os.stat`` result,
+        or (None, None) if it does not exist.
+        """
+        for candidate in (os.path.join(self.builder.outdir, image_path),
+                          os.path.join(self.builder.srcdir, image_path),
+                          image_path):
+            try:
+                return candidate, os.stat(candidate)
+            except (OSError, ValueError):
+                continue
+        return None, None
 
     # specific visit and depart methods
     # ---------------------------------
@@ -183,7 +251,20 @@ class JupyterTranslator(JupyterCodeTranslator, object):
 
         ## if the source file parsed is book index file and target is pdf
         if self.book_index is not None and self.book_index in self.source_file_name and self.tojupyter_pdf_book:
+            ## the notebook of the book index holds its table of contents, in latex,
+            ## instead of the content of the document
             self.in_book_index = True
+            self.skip_nodes.update(id(child) for child in node.children)
+            title = node.next_node(nodes.title)
+            if title is not None:
+                JupyterCodeTranslator.visit_title(self, title)
+            self.markdown_lines.append(BookIndex.from_doctree(node).to_latex())
+
+        ## headers and numbers of the sphinx-proof and sphinx-exercise directives
+        self.enumerables = EnumerableIndex(node, self.builder.env.toc_fignumbers.get(self.docname, {}),
+                                           self.context.enumerables, self.builder.config.numfig_format)
+        self.skip_nodes.update(self.enumerables.titles)
+        self.text_suffixes.update(self.enumerables.suffixes)
 
     def depart_document(self, node):
         """at end
@@ -198,6 +279,7 @@ class JupyterTranslator(JupyterCodeTranslator, object):
         self.add_markdown_cell()
         #Parse .. jupyter-dependency::
         if len(self.files) > 0:
+            self.cacheable = False
             for fl in self.files:
                 src_fl = os.path.join(self.builder.srcdir, fl)
                 out_fl = os.path.join(self.builder.outdir, os.path.basename(fl))   #copy file to same location as notebook (remove dir structure)
@@ -238,10 +320,6 @@ class JupyterTranslator(JupyterCodeTranslator, object):
 
         text = node.astext()
 
-        ## removing references from index file book
-        if self.in_book_index and 'references' in text.lower():
-            return
-
         #Escape Special markdown chars except in code block
         if self.in_code_block == False:
             text = text.replace("$", r"\$")
@@ -294,9 +372,6 @@ class JupyterTranslator(JupyterCodeTranslator, object):
         implementation as is done in http://docutils.sourceforge.net/docs/ref/rst/directives.html#image
 
         """
-        ### preventing image from the index file at the moment
-        if self.in_book_index:
-            return
         uri = node.attributes["uri"]
         self.images.append(uri)             #TODO: list of image files
         
@@ -306,18 +381,11 @@ class JupyterTranslator(JupyterCodeTranslator, object):
         
         if is_glued_image:
             # Check if user wants to use a URL path for glued images
-            if hasattr(self.builder.config, 'tojupyter_glue_urlpath') and self.builder.config.tojupyter_glue_urlpath:
+            if self.context.glue_urlpath is not None:
                 # Copy image to glue directory and reference with base URL + /glue/filename
                 filename = os.path.basename(uri)
-                self._copy_glued_image(original_uri, filename)
-                base_url = self.builder.config.tojupyter_glue_urlpath.rstrip('/')
-                uri = f"{base_url}/glue/{filename}"
-            elif hasattr(self.builder.config, 'tojupyter_glue_images_urlpath') and self.builder.config.tojupyter_glue_images_urlpath:
-                # Alternative config name for clarity
-                filename = os.path.basename(uri)
-                self._copy_glued_image(original_uri, filename)
-                base_url = self.builder.config.tojupyter_glue_images_urlpath.rstrip('/')
-                uri = f"{base_url}/glue/{filename}"
+                filename = self._copy_glued_image(original_uri, filename) or filename
+                uri = f"{self.context.glue_urlpath}/glue/{filename}"
             else:
                 # Default: embed as base64 for standalone notebooks
                 data_uri = self._image_to_base64(uri)
@@ -325,9 +393,13 @@ class JupyterTranslator(JupyterCodeTranslator, object):
                     uri = data_uri
         
         if self.tojupyter_image_urlpath and uri == original_uri:
-            for file_path in self.tojupyter_static_file_path:
+            for file_path, prefix in self.context.static_rules:
                 if file_path in uri:
-                    uri = uri.replace(file_path +"/", self.tojupyter_image_urlpath)
+                    image_urlpath = self.tojupyter_image_urlpath
+                    if image_urlpath == IMAGE_URLPATH_TOKEN:
+                        ## resolved per notebook variant, which may keep the static path
+                        image_urlpath = image_urlpath_token(prefix)
+                    uri = uri.replace(prefix, image_urlpath)
                     break  #don't need to check other matches
         attrs = node.attributes
         if self.tojupyter_images_markdown:
@@ -421,7 +493,7 @@ class JupyterTranslator(JupyterCodeTranslator, object):
 
     def depart_displaymath(self, node):
         if self.in_list:
-            self.markdown_lines[-1] = self.markdown_lines[-1][:-1]  #remove excess \n
+            self.markdown_lines.strip_last("\n")  #remove excess \n
 
     def visit_math_block(self, node):
         """directive math"""
@@ -452,7 +524,7 @@ class JupyterTranslator(JupyterCodeTranslator, object):
 
     def depart_math_block(self, node):
         if self.in_list:
-            self.markdown_lines[-1] = self.markdown_lines[-1][:-1]  #remove excess \n
+            self.markdown_lines.strip_last("\n")  #remove excess \n
 
         self.in_math_block = False
 
@@ -609,7 +681,7 @@ class JupyterTranslator(JupyterCodeTranslator, object):
 
             ### to remove the main title from ipynb as they are already added by metadata
             if self.tojupyter_target_pdf and self.section_level == 1 and not self.in_topic:
-                self.markdown_lines = []
+                self.markdown_lines.clear()
                 return
             self.markdown_lines.append(self.sep_paras)
 
@@ -663,10 +735,6 @@ class JupyterTranslator(JupyterCodeTranslator, object):
     # reference
     def visit_reference(self, node):
         """anchor link"""
-        ## removing zreferences from the index file
-        if self.in_book_index and node.attributes['refuri'] == 'zreferences':
-            return
-
         self.in_reference = True
         if self.tojupyter_target_pdf:
             if "refuri" in node and "http" in node["refuri"]:
@@ -689,10 +757,6 @@ class JupyterTranslator(JupyterCodeTranslator, object):
     def depart_reference(self, node):
         subdirectory = False
 
-        ## removing zreferences from the index file
-        if self.in_book_index and node.attributes['refuri'] == 'zreferences':
-            return
-
         if self.in_topic:
             # Jupyter Notebook uses the target text as its id
             uri_text = "".join(
@@ -782,31 +846,8 @@ class JupyterTranslator(JupyterCodeTranslator, object):
             if self.tojupyter_target_pdf and 'reference-' in refuri:
                 self.markdown_lines.append(refuri.replace("reference-","") + "}")
             elif "refuri" in node.attributes and self.tojupyter_target_pdf and "internal" in node.attributes and node.attributes["internal"] == True and "references" not in node["refuri"]:
-                ##### Below code, constructs an index file for the book
-                if self.in_book_index:
-                    if self.markdown_lines_trimmed != [] and (all(x in self.markdown_lines for x in self.markdown_lines_trimmed)): 
-                        ### when the list is not empty and when the list contains chapters or heading from the topic already
-                        self.markdown_lines_trimmed = self.markdown_lines[len(self.book_index_previous_links) + 2:] ### +2 to preserve '/n's
-                        if '- ' in self.markdown_lines[len(self.book_index_previous_links) + 1:]:
-                            text = "\\chapter{{{}}}\\input{{{}}}".format(node.astext(), node["refuri"] + ".tex")
-                        else:
-                            text = "\\cleardoublepage\\part{{{}}}".format(node.astext())
-                        self.markdown_lines = self.markdown_lines[:len(self.markdown_lines) - len(self.markdown_lines_trimmed)]
-                        self.markdown_lines.append(text)
-                        self.markdown_lines_trimmed = []
-                        self.markdown_lines_trimmed.append(text)
-                    else:
-                        ### when the list is empty the first entry is the topic
-                        text = "\\cleardoublepage\\part{{{}}}".format(node.astext())
-                        self.markdown_lines = []
-                        self.markdown_lines.append(text)
-                        self.markdown_lines_trimmed = copy.deepcopy(self.markdown_lines)
-                    self.book_index_previous_links = copy.deepcopy(self.markdown_lines)
-
-                    ## check to remove any '- ' left behind during the above operation
-                    if "- " in self.markdown_lines:
-                        self.markdown_lines.remove("- ")
-
+                ## the link was added above
+                pass
             elif "refuri" in node.attributes and self.tojupyter_target_pdf and "http" in node["refuri"]:
                 ### handling extrernal links
                 self.markdown_lines.append("]({})".format(refuri))
@@ -854,7 +895,7 @@ class JupyterTranslator(JupyterCodeTranslator, object):
         ## trying to return if it is in the topmost depth and it is more than 1
         if self.tojupyter_target_pdf and (self.content_depth == self.tojupyter_pdf_showcontentdepth) and self.content_depth > 1:
             self.content_depth_to_skip = self.content_depth
-            self.initial_lines = []
+            self.initial_lines = MarkdownBuffer()
             return
 
         self.list_level += 1
@@ -911,7 +952,7 @@ class JupyterTranslator(JupyterCodeTranslator, object):
         self.in_list = True
         head = "{} ".format(self.bullets[-1])
         self.markdown_lines.append(head)
-        self.list_item_starts.append(len(self.markdown_lines))
+        self.list_item_starts.append(self.markdown_lines.mark())
 
     def depart_list_item(self, node):
         ## check if there is a list level
@@ -927,9 +968,8 @@ class JupyterTranslator(JupyterCodeTranslator, object):
             br_removed_flag = True
             self.markdown_lines[-1] = self.markdown_lines[-1][:-1]
 
-        for i in range(list_item_start, len(self.markdown_lines)):
-            self.markdown_lines[i] = self.markdown_lines[i].replace(
-                "\n", "\n{}".format(indent))
+        # the indent is applied when the cell is flushed, see MarkdownBuffer
+        self.markdown_lines.indent(list_item_start, indent)
 
         # add breakline
         if br_removed_flag:
@@ -1049,7 +1089,7 @@ class JupyterTranslator(JupyterCodeTranslator, object):
         if self.tojupyter_target_pdf:
             for attr in node.attributes:
                 if attr == 'format' and node.attributes[attr] == 'html':
-                    self.markdown_lines = []
+                    self.markdown_lines.clear()
                     return
         self.markdown_lines.append("\n\n")
         
@@ -1062,8 +1102,12 @@ class JupyterTranslator(JupyterCodeTranslator, object):
         try:
             if 'cell-break' in node.attributes:
                 self.add_markdown_cell()
+                ## the next markdown starts a new cell, even when cells are coalesced
+                self.coalesce_cell = None
             if 'slide' in node.attributes:
                 self.metadata_slide = node['slide'] # this activates the slideshow metadata for the notebook
+            if 'execute' in node.attributes:
+                self.execute_batch = node['execute'] == 'batch'
             if 'slide-type' in node.attributes:
                 if "fragment" in node['slide-type']:
                     self.add_markdown_cell(slide_type=node['slide-type'])   #start a new cell
@@ -1149,234 +1193,21 @@ class JupyterTranslator(JupyterCodeTranslator, object):
         if self.in_toctree:
             self.markdown_lines.append("\n")
 
-    # ==================
-    # sphinx-proof Nodes
-    # ==================
-    
-    def _get_proof_node_number(self, node, node_type):
-        """
-        Helper to get the number for a sphinx-proof enumerable node.
-        Returns formatted number string or empty string if unnumbered.
-        """
-        try:
-            # Check if node is unnumbered
-            if 'nonumber' in node.attributes or node.get('nonumber', False):
-                return ""
-            
-            label = node.get('label', '')
-            if not label:
-                return ""
-            
-            docname = self.builder.docname
-            fig_num = self.builder.env.toc_fignumbers.get(docname, {})
-            
-            if node_type in fig_num and label in fig_num[node_type]:
-                number = fig_num[node_type][label]
-                return ".".join(map(str, number))
-        except Exception:
-            pass
-        
-        return ""
-
-    def _format_proof_title(self, node, directive_name, display_name=None):
-        """
-        Helper to format the title/header for sphinx-proof directives.
-        
-        Args:
-            node: The docutils node
-            directive_name: The directive type (e.g., 'theorem', 'axiom')
-            display_name: Optional custom display name (defaults to title-cased directive_name)
-        """
-        if display_name is None:
-            display_name = directive_name.title()
-        
-        # Get number if available
-        number = self._get_proof_node_number(node, directive_name)
-        
-        # Get title from node's title child if present
-        title_text = ""
-        if node.children:
-            for child in node.children:
-                if isinstance(child, nodes.title):
-                    title_text = child.astext()
-                    break
-                elif child.tagname == 'title':
-                    title_text = child.astext()
-                    break
-        
-        # sphinx-proof may wrap titles in parentheses already - strip them
-        if title_text:
-            title_text = title_text.strip()
-            if title_text.startswith('(') and title_text.endswith(')'):
-                title_text = title_text[1:-1].strip()
-        
-        # Build the header
-        header = f"**{display_name}"
-        if number:
-            header += f" {number}"
-        header += "**"
-        
-        if title_text:
-            header += f" ({title_text})"
-        
-        return header + "\n\n"
-
-    def visit_theorem_node(self, node):
-        """Handle sphinx-proof theorem directive."""
-        self.add_markdown_cell()
-        header = self._format_proof_title(node, 'theorem', 'Theorem')
-        self.markdown_lines.append(header)
-        # Remove title node from children to avoid duplicate processing
-        self._remove_title_node(node)
-
-    def depart_theorem_node(self, node):
-        self.add_markdown_cell()
-    
-    def _remove_title_node(self, node):
-        """Helper to remove title node from children to prevent duplicate rendering."""
-        if node.children:
-            node.children = [child for child in node.children 
-                           if not (isinstance(child, nodes.title) or child.tagname == 'title')]
-
-    def visit_axiom_node(self, node):
-        """Handle sphinx-proof axiom directive."""
-        self.add_markdown_cell()
-        header = self._format_proof_title(node, 'axiom', 'Axiom')
-        self.markdown_lines.append(header)
-        self._remove_title_node(node)
-
-    def depart_axiom_node(self, node):
-        self.add_markdown_cell()
-
-    def visit_lemma_node(self, node):
-        """Handle sphinx-proof lemma directive."""
-        self.add_markdown_cell()
-        header = self._format_proof_title(node, 'lemma', 'Lemma')
-        self.markdown_lines.append(header)
-        self._remove_title_node(node)
-
-    def depart_lemma_node(self, node):
-        self.add_markdown_cell()
-
-    def visit_definition_node(self, node):
-        """Handle sphinx-proof definition directive."""
-        self.add_markdown_cell()
-        header = self._format_proof_title(node, 'definition', 'Definition')
-        self.markdown_lines.append(header)
-        self._remove_title_node(node)
-
-    def depart_definition_node(self, node):
-        self.add_markdown_cell()
-
-    def visit_remark_node(self, node):
-        """Handle sphinx-proof remark directive."""
-        self.add_markdown_cell()
-        header = self._format_proof_title(node, 'remark', 'Remark')
-        self.markdown_lines.append(header)
-        self._remove_title_node(node)
-
-    def depart_remark_node(self, node):
-        self.add_markdown_cell()
-
-    def visit_conjecture_node(self, node):
-        """Handle sphinx-proof conjecture directive."""
-        self.add_markdown_cell()
-        header = self._format_proof_title(node, 'conjecture', 'Conjecture')
-        self.markdown_lines.append(header)
-        self._remove_title_node(node)
-
-    def depart_conjecture_node(self, node):
-        self.add_markdown_cell()
-
-    def visit_corollary_node(self, node):
-        """Handle sphinx-proof corollary directive."""
-        self.add_markdown_cell()
-        header = self._format_proof_title(node, 'corollary', 'Corollary')
-        self.markdown_lines.append(header)
-        self._remove_title_node(node)
-
-    def depart_corollary_node(self, node):
-        self.add_markdown_cell()
-
-    def visit_algorithm_node(self, node):
-        """Handle sphinx-proof algorithm directive."""
-        self.add_markdown_cell()
-        header = self._format_proof_title(node, 'algorithm', 'Algorithm')
-        self.markdown_lines.append(header)
-        self._remove_title_node(node)
-
-    def depart_algorithm_node(self, node):
-        self.add_markdown_cell()
-
-    def visit_criterion_node(self, node):
-        """Handle sphinx-proof criterion directive."""
-        self.add_markdown_cell()
-        header = self._format_proof_title(node, 'criterion', 'Criterion')
-        self.markdown_lines.append(header)
-        self._remove_title_node(node)
-
-    def depart_criterion_node(self, node):
-        self.add_markdown_cell()
-
-    def visit_example_node(self, node):
-        """Handle sphinx-proof example directive."""
-        self.add_markdown_cell()
-        header = self._format_proof_title(node, 'example', 'Example')
-        self.markdown_lines.append(header)
-        self._remove_title_node(node)
-
-    def depart_example_node(self, node):
-        self.add_markdown_cell()
-
-    def visit_property_node(self, node):
-        """Handle sphinx-proof property directive."""
-        self.add_markdown_cell()
-        header = self._format_proof_title(node, 'property', 'Property')
-        self.markdown_lines.append(header)
-        self._remove_title_node(node)
-
-    def depart_property_node(self, node):
-        self.add_markdown_cell()
-
-    def visit_observation_node(self, node):
-        """Handle sphinx-proof observation directive."""
-        self.add_markdown_cell()
-        header = self._format_proof_title(node, 'observation', 'Observation')
-        self.markdown_lines.append(header)
-        self._remove_title_node(node)
+    # ======================================
+    # sphinx-proof and sphinx-exercise Nodes
+    # ======================================
 
-    def depart_observation_node(self, node):
+    def visit_enumerable(self, node):
+        """Handle the numbered directives of the registry, see EnumerableDirectives"""
         self.add_markdown_cell()
+        self.markdown_lines.append(self.enumerables.headers[id(node)])
 
-    def visit_proposition_node(self, node):
-        """Handle sphinx-proof proposition directive."""
+    def depart_enumerable(self, node):
         self.add_markdown_cell()
-        header = self._format_proof_title(node, 'proposition', 'Proposition')
-        self.markdown_lines.append(header)
-        self._remove_title_node(node)
 
-    def depart_proposition_node(self, node):
-        self.add_markdown_cell()
-
-    def visit_assumption_node(self, node):
-        """Handle sphinx-proof assumption directive."""
-        self.add_markdown_cell()
-        header = self._format_proof_title(node, 'assumption', 'Assumption')
-        self.markdown_lines.append(header)
-        self._remove_title_node(node)
-
-    def depart_assumption_node(self, node):
-        self.add_markdown_cell()
-
-    def visit_notation_node(self, node):
-        """Handle sphinx-proof notation directive."""
-        self.add_markdown_cell()
-        header = self._format_proof_title(node, 'notation', 'Notation')
-        self.markdown_lines.append(header)
-        self._remove_title_node(node)
-
-    def depart_notation_node(self, node):
-        self.add_markdown_cell()
+    ## sphinx-proof directives with :nonumber:
+    visit_unenumerable_node = visit_enumerable
+    depart_unenumerable_node = depart_enumerable
 
     def visit_proof_node(self, node):
         """Handle sphinx-proof proof directive (unenumerable)."""
@@ -1387,62 +1218,6 @@ class JupyterTranslator(JupyterCodeTranslator, object):
     def depart_proof_node(self, node):
         self.add_markdown_cell()
 
-    def visit_unenumerable_node(self, node):
-        """
-        Handle sphinx-proof unenumerable nodes (directives with :nonumber: option).
-        These still have a type but no numbering.
-        """
-        self.add_markdown_cell()
-        node_type = node.get('type', '')
-        
-        # Get title if present
-        title_text = ""
-        if node.children:
-            for child in node.children:
-                if isinstance(child, nodes.title):
-                    title_text = child.astext()
-                    break
-                elif child.tagname == 'title':
-                    title_text = child.astext()
-                    break
-        
-        # Format header
-        display_name = node_type.title() if node_type else "Note"
-        header = f"**{display_name}**"
-        
-        if title_text:
-            header += f" ({title_text})"
-        
-        self.markdown_lines.append(header + "\n\n")
-        self._remove_title_node(node)
-
-    def depart_unenumerable_node(self, node):
-        self.add_markdown_cell()
-
-    # 
-    # Support for sphinx-exercise (enumberable nodes)
-    # This work in sphinx-exercise is done in a post_transform
-    # and relies on html translator to populate the numref
-    # targets
-    #
-
-    def visit_exercise_enumerable_node(self, node):
-        """
-        TODO: This should be moved to spinx-exercise visit_ and depart_ methods
-        """
-        title = node.children[0].get("title", "")
-        label = node.get("label", "")
-        docname = self.builder.docname
-        fig_num = self.builder.env.toc_fignumbers.get(docname, {})
-        try:
-            number = fig_num["exercise"][label]
-            number = ".".join(map(str, number))
-            title_text = self.builder.config.numfig_format["exercise"] % number
-        except:
-            logger.warn("[sphinx-tojupyter] Unable to parse enumerable exercise node with numfig format")
-        title = node.children[0]
-        title += nodes.Text(title_text)
-
     # ================
     # general methods
     # ================
@@ -1453,19 +1228,52 @@ class JupyterTranslator(JupyterCodeTranslator, object):
         * append `markdown_lines` to notebook
         * reset `markdown_lines`
         """
-        line_text = "".join(self.markdown_lines)
+        line_text = self.markdown_lines.text()
         formatted_line_text = self.strip_blank_lines_in_end_of_block(line_text)
         slide_info = {'slide_type': self.slide}
 
         if len(formatted_line_text.strip()) > 0:
+            if self.coalesce_markdown(formatted_line_text, title):
+                return
             new_md_cell = nbformat.v4.new_markdown_cell(formatted_line_text)
             if self.metadata_slide:  # modify the slide metadata on each cell
                 new_md_cell.metadata["slideshow"] = slide_info
                 self.slide = slide_type
             if title:
                 new_md_cell.metadata["hide-input"] = True
+            if self.attachments:
+                attachments = {name: bundle for name, bundle in self.attachments.items()
+                               if "attachment:" + name in formatted_line_text}
+                if attachments:
+                    new_md_cell["attachments"] = attachments
+                self.attachments = dict()
             self.output["cells"].append(new_md_cell)
-            self.markdown_lines = []
+            self.markdown_lines.clear()
+            self.coalesce_cell = new_md_cell
+
+    def coalesce_markdown(self, text, title=False):
+        """
+        Append `text` to the previous markdown cell instead of starting a new one
+        (tojupyter_coalesce_markdown). Returns False when a new cell is needed: the
+        previous cell is not a markdown cell, a cell-break or slides require the
+        boundary, or the merged cell would exceed tojupyter_coalesce_markdown_limit.
+        """
+        previous = self.coalesce_cell
+        if not self.context.coalesce_markdown or previous is None or title or self.metadata_slide:
+            return False
+        if not self.output["cells"] or self.output["cells"][-1] is not previous:
+            return False
+        if len(previous.source) + len(text) + 2 > self.context.coalesce_markdown_limit:
+            return False
+        previous.source += "\n\n" + text
+        if self.attachments:
+            attachments = {name: bundle for name, bundle in self.attachments.items()
+                           if "attachment:" + name in text}
+            if attachments:
+                previous.setdefault("attachments", {}).update(attachments)
+            self.attachments = dict()
+        self.markdown_lines.clear()
+        return True
 
 
     @classmethod
@@ -1,23 +1,101 @@
 import docutils.nodes
+import collections
 import re
+import time
 import nbformat.v4
 import os.path
 import datetime
-from .utils import LanguageTranslator, JupyterOutputCellGenerators, get_source_file_name
+from .context import TranslationContext
+from .utils import JupyterOutputCellGenerators, get_source_file_name
+from .variants import VARIANT_TAGS
+
+## handlers docutils assigns to GenericNodeVisitor for node types without their own method
+DEFAULT_HANDLERS = ("_call_default_visit", "_call_default_departure", "default_visit", "default_departure",
+                    "unknown_visit", "unknown_departure")
+
+
+class DispatchStats():
+    """
+    Node visit counts and handler timings collected by the translators when
+    ``tojupyter_debug_translator`` is set, merged over the documents of a build.
+    """
+
+    def __init__(self):
+        self.visits = collections.Counter()
+        self.defaults = collections.Counter()
+        self.handlers = dict()
+
+    def call(self, translator, method, node, visit):
+        start = time.perf_counter()
+        try:
+            return method(translator, node)
+        finally:
+            elapsed = time.perf_counter() - start
+            name = method.__name__
+            if visit:
+                self.visits[node.__class__.__name__] += 1
+            if name in DEFAULT_HANDLERS:
+                if visit:
+                    self.defaults[node.__class__.__name__] += 1
+                name = "{} ({})".format(name, node.__class__.__name__)
+            handler = self.handlers.setdefault(name, [0, 0.0, 0.0])
+            handler[0] += 1
+            handler[1] += elapsed
+            handler[2] = max(handler[2], elapsed)
+
+    def update(self, other):
+        self.visits.update(other.visits)
+        self.defaults.update(other.defaults)
+        for name, (calls, total, slowest) in other.handlers.items():
+            handler = self.handlers.setdefault(name, [0, 0.0, 0.0])
+            handler[0] += calls
+            handler[1] += total
+            handler[2] = max(handler[2], slowest)
+
+    def report(self, logger, limit=10):
+        if not self.visits:
+            return
+        logger.info("translator: %d node visits over %d node types", sum(self.visits.values()), len(self.visits))
+        logger.info("translator: most visited node types: %s", ", ".join(
+            "{} ({})".format(name, count) for name, count in self.visits.most_common(limit)))
+        if self.defaults:
+            logger.info("translator: node types handled by the default handlers: %s", ", ".join(
+                "{} ({})".format(name, count) for name, count in sorted(self.defaults.items())))
+        slowest = sorted(self.handlers.items(), key=lambda item: item[1][1], reverse=True)[:limit]
+        logger.info("translator: slowest handlers: %s", ", ".join(
+            "{} {:.1f}ms in {} calls (max {:.2f}ms)".format(name, total * 1e3, calls, worst * 1e3)
+            for name, (calls, total, worst) in slowest))
+
 
 class JupyterCodeTranslator(docutils.nodes.GenericNodeVisitor):
 
     URI_SPACE_REPLACE_FROM = re.compile(r"\s")
     URI_SPACE_REPLACE_TO = "-"
 
-    def __init__(self, builder, document):
+    def __init__(self, builder, document, docname=None, urlpath=None, image_urlpath=None, tag_variants=False,
+                 image_target=None, context=None):
         docutils.nodes.NodeVisitor.__init__(self, document)
 
+        # Settings shared by all documents, see TranslationContext
+        if context is None:
+            context = TranslationContext(builder.config)
+        self.context = context
+
+        # Per-document settings, passed explicitly so that parallel writers share no state
+        if docname is None:
+            docname = builder.env.path2doc(document["source"])
+        self.docname = docname
+        self.urlpath = urlpath
+        # tag solutions and tests instead of dropping them, see writers.variants
+        self.tag_variants = tag_variants
+        # settings of tojupyter_image_optimization applied to the glued images
+        self.image_target = image_target
+
         self.lang = None
         self.nodelang = None
         self.visit_first_title = True
 
-        self.langTranslator = LanguageTranslator(builder.config["templates_path"])
+        self.langTranslator = context.languages
 
         # Reporter
         self.warn = self.document.reporter.warning
@@ -29,37 +107,89 @@ class JupyterCodeTranslator(docutils.nodes.GenericNodeVisitor):
         self.source_file_name = get_source_file_name(
             self.settings._source,
             self.settings.env.srcdir)
-        self.default_lang = builder.config["tojupyter_default_lang"]
+        self.default_lang = context.default_lang
 
         # Create output notebook
         self.output = nbformat.v4.new_notebook()
 
         # Variables defined in conf.py
-        self.tojuyter_drop_html_raw = builder.config["tojuyter_drop_html_raw"]
-        self.tojupyter_static_file_path = builder.config["tojupyter_static_file_path"]
-        self.tojupyter_kernels = builder.config["tojupyter_kernels"]
-        self.tojupyter_drop_solutions = builder.config["tojupyter_drop_solutions"]
-        self.tojupyter_drop_tests = builder.config["tojupyter_drop_tests"]
-        self.tojupyter_lang_synonyms = builder.config["tojupyter_lang_synonyms"]
-        self.tojupyter_target_html = builder.config["tojupyter_target_html"]
-        self.tojupyter_image_urlpath = builder.tojupyter_image_urlpath
-        self.tojupyter_images_markdown = builder.config["tojupyter_images_markdown"]
-        self.tojupyter_target_pdf = builder.config["tojupyter_target_pdf"]
-        self.tojupyter_pdf_showcontentdepth = builder.config["tojupyter_pdf_showcontentdepth"]
-        self.tojupyter_pdf_book = builder.config["tojupyter_pdf_book"]
-        self.book_index = builder.config["tojupyter_pdf_book_index"]
+        self.tojuyter_drop_html_raw = context.drop_html_raw
+        self.tojupyter_kernels = context.kernels
+        self.tojupyter_drop_solutions = context.drop_solutions
+        self.tojupyter_drop_tests = context.drop_tests
+        self.tojupyter_lang_synonyms = context.lang_synonyms
+        self.tojupyter_target_html = context.target_html
+        self.tojupyter_image_urlpath = image_urlpath
+        self.tojupyter_images_markdown = context.images_markdown
+        self.tojupyter_target_pdf = context.target_pdf
+        self.tojupyter_pdf_showcontentdepth = context.pdf_showcontentdepth
+        self.tojupyter_pdf_book = context.pdf_book
+        self.book_index = context.book_index
         if hasattr(builder, 'add_bib_to_latex'):
             self.add_bib_to_latex = builder.add_bib_to_latex
 
         # set the value of the cell metadata["slideshow"] to slide as the default option
         self.slide = "slide" 
         self.metadata_slide = False  #value by default for all the notebooks, we change it for those we want
+        self.execute_batch = False  # run consecutive code cells as one request, set by `.. jupyter::` `:execute: batch`
 
         # Variables used in visit/depart
         self.in_code_block = False  # if False, it means in markdown_cell
         self.output_cell_type = None
         self.code_lines = []
 
+        # files other than the source the notebook is made from, as {path: (size, mtime_ns)},
+        # and whether the translation can be reused from the translation cache
+        self.file_dependencies = dict()
+        self.cacheable = True
+
+        # counts and times the node handlers, see DispatchStats
+        self.dispatch_stats = DispatchStats() if context.debug_translator else None
+        self.visit_table, self.depart_table = self.dispatch_tables(self.dispatch_key())
+
+    # dispatch
+    # --------
+    # docutils looks the handler up by name on every visit; the handlers are resolved once
+    # per translator and node class instead, in tables shared by all documents
+    @classmethod
+    def dispatch_tables(cls, key=None):
+        """
+        The (visit, departure) dispatch tables of the translator class, mapping node classes to handlers,
+        for the configured handlers identified by `key` (see dispatch_key)
+        """
+        if "_dispatch_tables" not in cls.__dict__:
+            cls._dispatch_tables = dict()
+        if key not in cls._dispatch_tables:
+            cls._dispatch_tables[key] = (dict(), dict())
+        return cls._dispatch_tables[key]
+
+    def dispatch_key(self):
+        """Identifies the handlers selected by the configuration, when they depend on it"""
+        return None
+
+    def _resolve_handler(self, table, prefix, node_class, fallback):
+        method = getattr(type(self), prefix + node_class.__name__, None)
+        if method is None:
+            method = fallback
+        table[node_class] = method
+        return method
+
+    def dispatch_visit(self, node):
+        method = self.visit_table.get(node.__class__)
+        if method is None:
+            method = self._resolve_handler(self.visit_table, "visit_", node.__class__, type(self).unknown_visit)
+        if self.dispatch_stats is not None:
+            return self.dispatch_stats.call(self, method, node, True)
+        return method(self, node)
+
+    def dispatch_departure(self, node):
+        method = self.depart_table.get(node.__class__)
+        if method is None:
+            method = self._resolve_handler(self.depart_table, "depart_", node.__class__, type(self).unknown_departure)
+        if self.dispatch_stats is not None:
+            return self.dispatch_stats.call(self, method, node, False)
+        return method(self, node)
+
     # generic visit and depart methods
     # --------------------------------
     simple_nodes = (
@@ -101,12 +231,14 @@ class JupyterCodeTranslator(docutils.nodes.GenericNodeVisitor):
         if self.metadata_slide:
             self.output.metadata.celltoolbar = "Slideshow"
 
+        ## read and removed by the builder before the notebook is written
+        if self.execute_batch:
+            self.output.metadata["tojupyter_execute"] = "batch"
 
         # Update metadata
         if self.tojupyter_kernels is not None:
             try:
-                self.output.metadata.kernelspec = \
-                    self.tojupyter_kernels[self.lang]["kernelspec"]
+                self.output.metadata.kernelspec = self.context.kernelspecs[self.lang]
                 self.output.metadata["filename"] = self.source_file_name.split("/")[-1]
                 self.output.metadata["title"] = self.title
             except:
@@ -114,47 +246,11 @@ class JupyterCodeTranslator(docutils.nodes.GenericNodeVisitor):
                     "Invalid jupyter kernels. "
                     "tojupyter_kernels: {}, lang: {}"
                     .format(self.tojupyter_kernels, self.lang))
-        
+
         # Add LaTeX macros as a markdown cell at the beginning
         # This is the standard way to define LaTeX macros in Jupyter notebooks
-        
-        # Priority 1: Use mathjax3_config (standard Sphinx/Jupyter Book config)
-        mathjax3_config = getattr(self.builder.config, 'mathjax3_config', None)
-        macro_content = None
-        
-        if mathjax3_config and isinstance(mathjax3_config, dict):
-            # Extract macros from mathjax3_config.tex.macros
-            tex_config = mathjax3_config.get('tex', {})
-            macros_dict = tex_config.get('macros', {})
-            
-            if macros_dict:
-                # Convert dict format to LaTeX \newcommand format
-                macro_lines = []
-                for name, definition in macros_dict.items():
-                    # Handle both simple strings and array format [definition, n_args]
-                    if isinstance(definition, list):
-                        defn = definition[0]
-                        n_args = definition[1] if len(definition) > 1 else 0
-                        if n_args > 0:
-                            macro_lines.append(f"\\newcommand{{\\{name}}}[{n_args}]{{{defn}}}")
-                        else:
-                            macro_lines.append(f"\\newcommand{{\\{name}}}{{{defn}}}")
-                    else:
-                        macro_lines.append(f"\\newcommand{{\\{name}}}{{{definition}}}")
-                
-                if macro_lines:
-                    macro_content = "$$\n" + "\n".join(macro_lines) + "\n$$"
-        
-        # Priority 2: Fallback to tojupyter_latex_macros (raw LaTeX format)
-        if not macro_content:
-            latex_macros = getattr(self.builder.config, 'tojupyter_latex_macros', None)
-            if latex_macros:
-                macro_content = "$$\n" + latex_macros + "\n$$"
-        
-        # Insert macro cell if we have content
-        if macro_content:
-            from nbformat.v4 import new_markdown_cell
-            macro_cell = new_markdown_cell(macro_content)
+        macro_cell = self.context.macro_cell()
+        if macro_cell is not None:
             self.output.cells.insert(0, macro_cell)
 
     def visit_highlightlang(self, node):
@@ -219,14 +315,18 @@ class JupyterCodeTranslator(docutils.nodes.GenericNodeVisitor):
                 self.output_cell_type = JupyterOutputCellGenerators.MARKDOWN
 
     def depart_literal_block(self, node):            
-        if self.solution and self.tojupyter_drop_solutions:    
+        if self.solution and self.tojupyter_drop_solutions and not self.tag_variants:
             pass # Skip solutions if we say to. 
-        elif self.test and self.tojupyter_drop_tests:
+        elif self.test and self.tojupyter_drop_tests and not self.tag_variants:
             pass # Skip tests if we say to.
         else: # Don't skip otherwise. 
             line_text = "".join(self.code_lines)
             formatted_line_text = self.strip_blank_lines_in_end_of_block(line_text)
             new_code_cell = self.output_cell_type.Generate(formatted_line_text, self)
+            # the variants decide whether solutions and tests are kept
+            variant_tags = [tag for tag, flag in (("solution", self.solution), ("test", self.test)) if flag]
+            if self.tag_variants and variant_tags:
+                new_code_cell[VARIANT_TAGS] = variant_tags
         
             # add slide metadata on each cell, value by default: slide
             if self.metadata_slide:   #value by default for all the notebooks, we change it for those we want
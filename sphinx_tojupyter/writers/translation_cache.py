@@ -0,0 +1,95 @@
+import hashlib
+import json
+import os
+from docutils import nodes
+from sphinx.util import logging
+from .image_cache import cache_directory, prune_directory, touch, write_atomic
+
+## bumped when the entries or the translation they store change in incompatible ways
+CACHE_VERSION = 3
+
+
+class TranslationCache():
+    """
+    Cache of translated notebooks (``tojupyter_translation_cache``).
+
+    Entries are keyed by a hash of the resolved doctree, the translator and its settings
+    (target, urlpaths, dropped cells), the ``tojupyter_*`` configuration and the section
+    and figure numbers of the document, so a document that Sphinx writes again without
+    changes is not translated again. A hit returns the stored notebook without walking
+    the doctree. Entries also record the images embedded in the notebook and are only
+    used while those files are unchanged. Translations that copy files to the output
+    directory are not cached.
+
+    The entries are stored under ``.tojupyter-cache/translations`` in the doctree
+    directory, so builders sharing their doctrees (``sphinx-build -M jupyter`` and
+    ``-M jupyterpdf``) share them, and are written to a temporary file and renamed,
+    so forked parallel writers can share them too. Their total size is bounded
+    by ``tojupyter_translation_cache_size`` (in MiB); the least recently used entries
+    are removed at the end of the build.
+    """
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, doctreedir, max_bytes):
+        self.directory = cache_directory(doctreedir, "translations")
+        self.max_bytes = max(0, int(max_bytes))
+
+    def key(self, doctree, *parts):
+        """The key of the translation of `doctree` with the settings in `parts` (JSON serializable)"""
+        text = json.dumps([CACHE_VERSION, doctree_fingerprint(doctree)] + list(parts), sort_keys=True, default=repr)
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Return the notebook (dict) stored under `key`, or None"""
+        filename = self._entry_file(key)
+        try:
+            with open(filename, encoding="UTF-8") as f:
+                entry = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        for path, (size, mtime) in entry["files"].items():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                return None
+            if (stat.st_size, stat.st_mtime_ns) != (size, mtime):
+                return None
+        touch(filename)
+        return entry["notebook"]
+
+    def put(self, key, notebook, files):
+        """
+        Store `notebook` under `key`. `files` maps the files the notebook was made from,
+        other than the source, to their ``(size, mtime_ns)``.
+        """
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            write_atomic(self._entry_file(key), json.dumps({"files": files, "notebook": notebook}))
+        except (IOError, OSError, TypeError, ValueError) as err:
+            self.logger.warning("Unable to store the translation in the translation cache: {}".format(err))
+
+    def prune(self):
+        """Remove the least recently used entries until the cache fits in its size limit"""
+        prune_directory(self.directory, self.max_bytes)
+
+    def _entry_file(self, key):
+        return os.path.join(self.directory, key + ".json")
+
+
+def doctree_fingerprint(doctree):
+    """
+    SHA-256 hash of the structure, attributes and text of `doctree`, which is the same
+    for the same resolved doctree in different builds
+    """
+    digest = hashlib.sha256()
+    update = digest.update
+    stack = [doctree]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, nodes.Text):
+            update(b"\0T" + node.encode("utf-8", "surrogatepass"))
+            continue
+        update("\0{}{}{!r}".format(node.__class__.__name__, len(node.children),
+                                   sorted(node.attributes.items())).encode("utf-8", "surrogatepass"))
+        stack.extend(reversed(node.children))
+    return digest.hexdigest()
@@ -1,7 +1,8 @@
 import os.path
 import os
 import sys
-import nbformat.v4
+import hashlib
+import subprocess
 from xml.etree.ElementTree import ElementTree
 from enum import Enum
 from sphinx.util.osutil import ensuredir
@@ -105,6 +106,7 @@ class JupyterOutputCellGenerators(Enum):
         """
         Generates the Jupyter cell object.
         """
+        import nbformat.v4
         if self is JupyterOutputCellGenerators.CODE:
             res = nbformat.v4.new_code_cell(formatted_text)
         elif self is JupyterOutputCellGenerators.CODE_OUTPUT:
@@ -196,4 +198,36 @@ def get_list_of_files(dirName):
             all_files = all_files + get_list_of_files(full_path)
         else:
             all_files.append(full_path)
-    return all_files
\ No newline at end of file
+    return all_files
+
+def deterministic_cell_ids(nb, docname):
+    """
+    Replace the random cell ids assigned by nbformat with ids derived from the
+    docname, the cell index and the cell source, so that rebuilding unchanged
+    sources produces byte-identical notebooks
+    """
+    for index, cell in enumerate(nb.cells):
+        key = "{}:{}:{}".format(docname, index, cell.source)
+        cell.id = hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+    return nb
+
+def source_date_epoch(srcdir):
+    """
+    Returns the timestamp to record as the build date of reproducible builds:
+    ``SOURCE_DATE_EPOCH`` if it is set, otherwise the commit time of the git
+    checkout containing `srcdir`, otherwise None
+    """
+    epoch = os.environ.get("SOURCE_DATE_EPOCH")
+    if epoch:
+        try:
+            return int(epoch)
+        except ValueError:
+            return None
+    try:
+        output = subprocess.run(
+            ["git", "log", "-1", "--format=%ct"], cwd=str(srcdir),
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True, universal_newlines=True
+        ).stdout.strip()
+        return int(output)
+    except (OSError, subprocess.CalledProcessError, ValueError):
+        return None
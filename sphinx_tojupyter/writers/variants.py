@@ -0,0 +1,73 @@
+import copy
+import re
+
+## Placeholders emitted by the translator when the notebook variants of a document differ
+## in their link or image urlpaths. They use private-use code points so they cannot clash
+## with document content, and are resolved for each variant by `resolve_variant`.
+URLPATH_TOKEN = "\ue000urlpath\ue001"
+IMAGE_URLPATH_TOKEN = "\ue000image-urlpath\ue001"
+IMAGE_URLPATH_TOKEN_REGEX = re.compile("\ue000image-urlpath\ue002(.*?)\ue001")
+
+## Key of the solution / test tags set on cells and outputs while translating in variant mode
+VARIANT_TAGS = "tojupyter_variant_tags"
+
+
+def image_urlpath_token(default):
+    """
+    Placeholder replacing the static path `default` of an image uri. It resolves to the
+    image urlpath of the variant, or back to `default` when the variant has none.
+    """
+    return "\ue000image-urlpath\ue002{}\ue001".format(default)
+
+
+def translation_settings(variants, drop_solutions, drop_tests):
+    """
+    Settings to translate a document once for all of its `variants`.
+
+    Settings shared by every variant are passed through unchanged and the ones that differ
+    are replaced by placeholders. Solutions and tests are tagged instead of dropped unless
+    every variant drops them like the configured `drop_solutions` and `drop_tests`.
+    """
+    settings = dict()
+    for key, token in (("urlpath", URLPATH_TOKEN), ("image_urlpath", IMAGE_URLPATH_TOKEN)):
+        values = set(variant.get(key) for variant in variants.values())
+        settings[key] = values.pop() if len(values) == 1 else token
+    settings["tag_variants"] = any(
+        variant.get("drop_solutions", drop_solutions) != drop_solutions
+        or variant.get("drop_tests", drop_tests) != drop_tests
+        for variant in variants.values()
+    )
+    return settings
+
+
+def resolve_variant(nb, variant, inplace=False):
+    """
+    Return a copy of the notebook `nb`, translated with `translation_settings`, with the
+    placeholders resolved and the solutions / tests dropped according to `variant`.
+    """
+    if not inplace:
+        nb = copy.deepcopy(nb)
+    urlpath = variant.get("urlpath") or ""
+    image_urlpath = variant.get("image_urlpath")
+
+    def resolve(text):
+        if "\ue000" not in text:
+            return text
+        text = text.replace(URLPATH_TOKEN, urlpath)
+        return IMAGE_URLPATH_TOKEN_REGEX.sub(lambda match: image_urlpath or match.group(1), text)
+
+    def keep(item):
+        tags = item.pop(VARIANT_TAGS, ())
+        return not (("solution" in tags and variant.get("drop_solutions"))
+                    or ("test" in tags and variant.get("drop_tests")))
+
+    cells = []
+    for cell in nb.cells:
+        if not keep(cell):
+            continue
+        cell.source = resolve(cell.source)
+        if cell.cell_type == "code":
+            cell.outputs = [output for output in cell.outputs if keep(output)]
+        cells.append(cell)
+    nb.cells = cells
+    return nb
@@ -0,0 +1,165 @@
+import hashlib
+import os
+import queue
+import threading
+import time
+from sphinx.util import logging
+from sphinx.util.osutil import ensuredir
+from .serialize import NotebookSerializer
+
+
+class NotebookFileWriter():
+    """
+    Writes notebooks into the build directory.
+
+    In compare-before-write mode (``tojupyter_compare_before_write``) the serialized
+    notebook is hashed and compared with the file already on disk, and files whose bytes
+    did not change are left alone so their modification time is preserved for rsync
+    deploys and the later HTML / PDF stages.
+
+    With ``tojupyter_write_threads`` set, serialization and writing happen on a pool of
+    background threads fed through a bounded queue, so translation does not wait on disk
+    latency. The queue is drained by `drain`, which the builders call in ``finish()``.
+    Files are always written to a temporary file first and renamed into place, so a
+    notebook on disk is never left half written.
+    """
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, builder):
+        self.builder = builder
+        self.compare = builder.config["tojupyter_compare_before_write"]
+        self.threads = max(0, int(builder.config["tojupyter_write_threads"] or 0))
+        self.serializer = NotebookSerializer(builder.config)
+        self.written = 0
+        self.unchanged = 0
+        self.errors = 0
+        self._queue = None
+        self._workers = []
+        self._done = []
+        self._lock = threading.Lock()
+
+    @property
+    def background(self):
+        """True when notebooks are written by the background writer pool"""
+        return self.threads > 0
+
+    def write(self, nb, filename, on_success=None, docname=None):
+        """
+        Serialize `nb` to `filename`. `docname` labels the work in the build profile.
+
+        `on_success` is called without arguments once the file is known to hold the
+        notebook, whether it was written or already up to date. Write errors are
+        reported as warnings for the file concerned.
+
+        In background mode the notebook is only queued; the caller must not modify `nb`
+        afterwards, and `on_success` is called from `drain` in the main thread.
+        """
+        if docname is None:
+            docname = filename
+        if not self.background:
+            self._complete(filename, *self._write(nb, filename, docname), on_success)
+            return
+        if self._queue is None:
+            self._start()
+        ## blocks when the writers fall behind, which bounds the memory held by queued notebooks
+        self._queue.put((nb, filename, on_success, docname, time.perf_counter()))
+
+    def drain(self):
+        """Wait for all queued notebooks to be written and report the results"""
+        if self._queue is None:
+            return
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join()
+        self._queue = None
+        self._workers = []
+        with self._lock:
+            done, self._done = self._done, []
+        for item in done:
+            self._complete(*item)
+
+    def _start(self):
+        self._queue = queue.Queue(maxsize=4 * self.threads)
+        for index in range(self.threads):
+            worker = threading.Thread(target=self._work, name="tojupyter-writer-{}".format(index), daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            nb, filename, on_success, docname, queued = item
+            self.builder.profiler.record(docname, "write queue", queued, time.perf_counter())
+            try:
+                result = self._write(nb, filename, docname)
+            except Exception as err:
+                ## keep the worker alive, otherwise the builder would block on a full queue
+                result = (False, None, err, None)
+            with self._lock:
+                self._done.append((filename,) + result + (on_success,))
+
+    def _write(self, nb, filename, docname):
+        """Write `nb` and return a (written, digest, error, validation error) tuple"""
+        with self.builder.profiler.stage(docname, "serialize"):
+            text, invalid = self.serializer.dumps(nb)
+        with self.builder.profiler.stage(docname, "write"):
+            return self._write_data(text, filename, invalid)
+
+    def _write_data(self, text, filename, invalid):
+        try:
+            data = text.encode("utf-8")
+            digest = hashlib.sha256(data).hexdigest()
+            if self.compare and self._is_unchanged(filename, data, digest):
+                return False, digest, None, invalid
+            ensuredir(os.path.dirname(filename))
+            tmpname = filename + ".tmp"
+            try:
+                with open(tmpname, "wb") as f:
+                    f.write(data)
+                os.replace(tmpname, filename)
+            except BaseException:
+                if os.path.exists(tmpname):
+                    os.remove(tmpname)
+                raise
+            return True, digest, None, invalid
+        except (IOError, OSError) as err:
+            return False, None, err, invalid
+
+    def _complete(self, filename, written, digest, error, invalid, on_success):
+        if invalid is not None:
+            self.logger.warning("notebook %s is invalid: %s" % (filename, invalid))
+        if error is not None:
+            self.errors += 1
+            self.logger.warning("error writing file %s: %s" % (filename, error))
+            return
+        if written:
+            self.written += 1
+        else:
+            self.unchanged += 1
+        if self.builder.manifest is not None:
+            self.builder.manifest.record_output(filename, digest)
+        if on_success is not None:
+            on_success()
+
+    def _is_unchanged(self, filename, data, digest):
+        try:
+            size = os.path.getsize(filename)
+        except OSError:
+            return False
+        if size != len(data):
+            return False
+        ## the manifest remembers what was written last time, which saves reading the file back
+        ## (background writers only read it: outputs are recorded by `drain` once they stopped)
+        manifest = self.builder.manifest
+        if manifest is not None and manifest.output_hash(filename) == digest:
+            return True
+        with open(filename, "rb") as f:
+            return f.read() == data
+
+    def summary(self):
+        """Log how many notebooks were written and how many were left untouched"""
+        if self.written or self.unchanged:
+            self.logger.info("notebooks written: %d, unchanged and skipped: %d", self.written, self.unchanged)
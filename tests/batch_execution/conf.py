@@ -0,0 +1,27 @@
+# Configuration file for the batched execution tests
+
+# -- Project information -----------------------------------------------------
+project = 'Batched Execution Test'
+copyright = '2025, QuantEcon'
+author = 'QuantEcon'
+
+# -- General configuration ---------------------------------------------------
+extensions = [
+    'sphinx_tojupyter'
+]
+
+# Jupyter configuration
+tojupyter_execute_notebooks = True
+tojupyter_default_lang = "python3"
+tojupyter_kernels = {
+    "python3": {
+        "kernelspec": {
+            "display_name": "Python 3",
+            "language": "python3",
+            "name": "python3"
+        },
+        "file_extension": ".py",
+    }
+}
+
+exclude_patterns = ['_build', 'Thumbs.db', '.DS_Store']
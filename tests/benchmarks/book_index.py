@@ -0,0 +1,116 @@
+"""
+PDF book index benchmark for sphinx-tojupyter
+
+Builds a pdf book (``tojupyter_pdf_book``) of ``--chapters`` chapters in
+``--parts`` parts, and the same book with twice as many chapters, with the
+jupyter builder, and reports the time spent translating the book index, taken
+from the build profile (``tojupyter_profile``).
+
+The index notebook is rendered from the table of contents of the toctrees in one
+pass, so translation time should grow linearly with the number of chapters. The
+benchmark fails when the index notebook does not list every part and chapter, or
+when doubling the chapters multiplies the translation time by more than
+``--max-ratio``.
+
+Usage:
+    python tests/benchmarks/book_index.py [--chapters 300] [--parts 10] [--runs 3] [--max-ratio 3]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+CONF = """
+extensions = ["sphinx_tojupyter"]
+exclude_patterns = ["_build"]
+tojupyter_target_pdf = True
+tojupyter_pdf_book = True
+tojupyter_pdf_book_index = "index"
+tojupyter_profile = True
+tojupyter_build_manifest = False
+"""
+
+
+def write_book(srcdir, chapters, parts):
+    """Write a book whose index has a toctree with a caption for each part"""
+    index = ["Book", "====", ""]
+    for part in range(parts):
+        index.extend([".. toctree::", "   :maxdepth: 2", "   :caption: Part {}".format(part), ""])
+        for chapter in range(part, chapters, parts):
+            name = "chapter{}".format(chapter)
+            index.append("   " + name)
+            title = "Chapter {}".format(chapter)
+            section = "Section {}".format(chapter)
+            with open(os.path.join(srcdir, name + ".rst"), "w") as f:
+                f.write("\n".join([title, "=" * len(title), "", "Text.", "", section, "-" * len(section), "", "More text.", ""]))
+        index.append("")
+    with open(os.path.join(srcdir, "index.rst"), "w") as f:
+        f.write("\n".join(index))
+
+
+def expected_index(chapters, parts):
+    lines = []
+    for part in range(parts):
+        lines.append("\\cleardoublepage\\part{{Part {}}}".format(part))
+        for chapter in range(part, chapters, parts):
+            lines.append("\\chapter{{Chapter {0}}}\\input{{chapter{0}.tex}}".format(chapter))
+    return "\n".join(lines)
+
+
+def translate_time(chapters, parts):
+    """
+    Build the book and return the seconds spent translating its index, and whether
+    the index notebook lists the parts and chapters of the book
+    """
+    with tempfile.TemporaryDirectory() as srcdir:
+        with open(os.path.join(srcdir, "conf.py"), "w") as f:
+            f.write(CONF)
+        write_book(srcdir, chapters, parts)
+        outdir = os.path.join(srcdir, "_build", "jupyter")
+        subprocess.run(
+            [sys.executable, "-m", "sphinx", "-q", "-E", "-b", "jupyter", srcdir, outdir],
+            check=True
+        )
+        with open(os.path.join(outdir, "reports", "build-profile.json")) as f:
+            profile = json.load(f)
+        with open(os.path.join(outdir, "index.ipynb")) as f:
+            notebook = json.load(f)
+    source = "".join("".join(cell["source"]) for cell in notebook["cells"] if cell["cell_type"] == "markdown")
+    return profile["documents"]["index"]["translate"]["wall"], expected_index(chapters, parts) in source
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chapters", type=int, default=300, help="number of chapters of the smaller book")
+    parser.add_argument("--parts", type=int, default=10, help="number of parts of the book")
+    parser.add_argument("--runs", type=int, default=3, help="number of builds to time for each book")
+    parser.add_argument("--max-ratio", type=float, default=3.0,
+                        help="fail when doubling the chapters multiplies the translation time by more than this")
+    args = parser.parse_args()
+
+    times = dict()
+    for chapters in (args.chapters, 2 * args.chapters):
+        runs = [translate_time(chapters, args.parts) for _ in range(args.runs)]
+        if not all(listed for _, listed in runs):
+            print("FAIL: the index notebook of the book of {} chapters does not list its parts and chapters"
+                  .format(chapters))
+            return 1
+        times[chapters] = statistics.median(elapsed for elapsed, _ in runs)
+        print("{} chapters: index translation median {:.1f} ms ({} runs)".format(
+            chapters, times[chapters] * 1000, args.runs))
+
+    ratio = times[2 * args.chapters] / times[args.chapters]
+    print("doubling the chapters multiplies the translation time by {:.2f}".format(ratio))
+    if ratio > args.max_ratio:
+        print("FAIL: translation time grows faster than linearly with the number of chapters")
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+"""
+Import-time benchmark for sphinx-tojupyter
+
+Listing the extension in ``conf.py`` imports it for every builder, so importing
+``sphinx_tojupyter`` must stay cheap. Notebook execution (dask), HTML / PDF
+conversion (nbconvert, nbclient) and the notebook writers (nbformat) are only
+imported when the jupyter builders run.
+
+The benchmark imports the extension in fresh interpreters, after Sphinx itself
+has been imported, and fails when a deferred dependency is loaded or when the
+median import time exceeds ``--max-ms``.
+
+Usage:
+    python tests/benchmarks/import_time.py [--runs 5] [--max-ms 500]
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+DEFERRED_MODULES = ["dask", "distributed", "nbconvert", "nbclient", "nbformat", "yaml"]
+
+PROBE = """
+import json, sys, time
+import sphinx.application
+start = time.perf_counter()
+import sphinx_tojupyter
+elapsed = time.perf_counter() - start
+loaded = [name for name in {modules!r} if name in sys.modules]
+print(json.dumps({{"elapsed": elapsed, "loaded": loaded}}))
+"""
+
+
+def probe():
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE.format(modules=DEFERRED_MODULES)],
+        stdout=subprocess.PIPE, check=True, universal_newlines=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="number of fresh interpreters to time")
+    parser.add_argument("--max-ms", type=float, default=500.0, help="fail when the median import time is above this")
+    args = parser.parse_args()
+
+    results = [probe() for _ in range(args.runs)]
+    times = [result["elapsed"] * 1000 for result in results]
+    loaded = sorted(set(name for result in results for name in result["loaded"]))
+    median = statistics.median(times)
+
+    print("import sphinx_tojupyter: median {:.1f} ms, min {:.1f} ms, max {:.1f} ms ({} runs)".format(
+        median, min(times), max(times), args.runs))
+
+    status = 0
+    if loaded:
+        print("FAIL: deferred modules imported at load time: {}".format(", ".join(loaded)))
+        status = 1
+    if median > args.max_ms:
+        print("FAIL: median import time is above {:.0f} ms".format(args.max_ms))
+        status = 1
+    if status == 0:
+        print("OK")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
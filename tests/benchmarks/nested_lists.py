@@ -0,0 +1,94 @@
+"""
+Nested list benchmark for sphinx-tojupyter
+
+Builds a document of bullet lists nested ``--depth`` levels deep, with
+``--paragraphs`` paragraphs in each item, and the same document twice as deep
+with the jupyter builder, and reports the time spent translating them, taken
+from the build profile (``tojupyter_profile``).
+
+List items indent their text when the markdown cell is flushed rather than when
+each item ends, so translation time should grow with the size of the document
+rather than with the size times the depth. Every line is indented by its depth,
+so the deeper document is about 3.6 times larger; its translation takes 1.5 to
+1.9 times longer on a typical machine, where rewriting the text of each item
+took 4.7 times longer. The benchmark fails when doubling the depth multiplies
+the translation time by more than ``--max-ratio``.
+
+Usage:
+    python tests/benchmarks/nested_lists.py [--depth 200] [--paragraphs 5] [--runs 3] [--max-ratio 3]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+CONF = """
+import sys
+## pickling the doctree of a deeply nested document recurses once per nesting level
+sys.setrecursionlimit(20000)
+extensions = ["sphinx_tojupyter"]
+exclude_patterns = ["_build"]
+tojupyter_profile = True
+tojupyter_build_manifest = False
+"""
+
+
+def nested_list(depth, paragraphs):
+    lines = ["Nested lists", "============", ""]
+    for level in range(depth):
+        indent = "  " * level
+        lines.append("{}- item at level {}".format(indent, level))
+        lines.append("")
+        for paragraph in range(paragraphs):
+            lines.append("{}  paragraph {} of the item at level {} with some text".format(indent, paragraph, level))
+            lines.append("{}  that continues on a second line and has ``code`` in it".format(indent))
+            lines.append("")
+    return "\n".join(lines) + "\n"
+
+
+def translate_time(depth, paragraphs):
+    """Build the nested list document and return the seconds spent translating it"""
+    with tempfile.TemporaryDirectory() as srcdir:
+        with open(os.path.join(srcdir, "conf.py"), "w") as f:
+            f.write(CONF)
+        with open(os.path.join(srcdir, "index.rst"), "w") as f:
+            f.write(nested_list(depth, paragraphs))
+        outdir = os.path.join(srcdir, "_build", "jupyter")
+        subprocess.run(
+            [sys.executable, "-m", "sphinx", "-q", "-E", "-b", "jupyter", srcdir, outdir],
+            check=True
+        )
+        with open(os.path.join(outdir, "reports", "build-profile.json")) as f:
+            profile = json.load(f)
+    return profile["documents"]["index"]["translate"]["wall"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--depth", type=int, default=200, help="nesting depth of the smaller document")
+    parser.add_argument("--paragraphs", type=int, default=5, help="number of paragraphs in each list item")
+    parser.add_argument("--runs", type=int, default=3, help="number of builds to time for each depth")
+    parser.add_argument("--max-ratio", type=float, default=3.0,
+                        help="fail when doubling the depth multiplies the translation time by more than this")
+    args = parser.parse_args()
+
+    times = dict()
+    for depth in (args.depth, 2 * args.depth):
+        times[depth] = statistics.median(translate_time(depth, args.paragraphs) for _ in range(args.runs))
+        print("depth {}: translation median {:.1f} ms ({} runs)".format(depth, times[depth] * 1000, args.runs))
+
+    ratio = times[2 * args.depth] / times[args.depth]
+    print("doubling the depth multiplies the translation time by {:.2f}".format(ratio))
+    if ratio > args.max_ratio:
+        print("FAIL: translation time grows faster than linearly with the nesting depth")
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,19 @@
+# Configuration file for the pdf book index tests
+
+# -- Project information -----------------------------------------------------
+project = 'Book Index Test'
+copyright = '2025, QuantEcon'
+author = 'QuantEcon'
+
+# -- General configuration ---------------------------------------------------
+extensions = [
+    'sphinx_tojupyter'
+]
+
+# Jupyter configuration
+tojupyter_target_pdf = True
+tojupyter_pdf_book = True
+tojupyter_pdf_book_index = "index"
+tojupyter_build_manifest = False
+
+exclude_patterns = ['_build', 'Thumbs.db', '.DS_Store', 'README.md']
@@ -0,0 +1,99 @@
+"""
+Batched execution test for sphinx-tojupyter
+
+Builds ``tests/batch_execution``, whose document runs its code cells in
+batches (``:execute: batch``), and builds it again with the option removed, so
+every cell is executed on its own. The executed notebooks must have the same
+outputs and execution counts, including the failing cell, the cells executed
+one by one after it and the cells that are never batched. The published
+notebooks must not carry the batching marker.
+
+Usage:
+    python tests/builds/batch_execution.py [--srcdir tests/batch_execution]
+"""
+
+import argparse
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+
+DOCNAME = "batch"
+## colour codes and the names of the input cells differ between kernels and runs
+VOLATILE = re.compile(r"\x1b\[[0-9;]*m|Cell In\[\d+\]|<ipython-input-[^>]*>|line \d+")
+
+
+def build(srcdir, outdir):
+    subprocess.run(
+        [sys.executable, "-m", "sphinx", "-q", "-b", "jupyter", srcdir, outdir],
+        check=True, stdout=subprocess.DEVNULL
+    )
+
+
+def load(filename):
+    with open(filename, encoding="UTF-8") as f:
+        return json.load(f)
+
+
+def normalize(output):
+    output = dict(output)
+    if "traceback" in output:
+        output["traceback"] = [VOLATILE.sub("", line) for line in output["traceback"]]
+    return output
+
+
+def code_cells(notebook):
+    return [(cell["execution_count"], [normalize(output) for output in cell["outputs"]])
+            for cell in notebook["cells"] if cell["cell_type"] == "code"]
+
+
+def build_project(source, tmpdir, name, batch):
+    srcdir = os.path.join(tmpdir, name)
+    shutil.copytree(source, srcdir, ignore=shutil.ignore_patterns("_build"))
+    if not batch:
+        filename = os.path.join(srcdir, DOCNAME + ".rst")
+        with open(filename, encoding="UTF-8") as f:
+            text = f.read()
+        with open(filename, "w", encoding="UTF-8") as f:
+            f.write(text.replace("   :execute: batch\n", ""))
+    outdir = os.path.join(srcdir, "_build", "jupyter")
+    build(srcdir, outdir)
+    return load(os.path.join(outdir, DOCNAME + ".ipynb")), load(os.path.join(outdir, "executed", DOCNAME + ".ipynb"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--srcdir", default=os.path.join("tests", "batch_execution"), help="project to build")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        published, batched = build_project(args.srcdir, tmpdir, "batch", batch=True)
+        _, by_cell = build_project(args.srcdir, tmpdir, "cells", batch=False)
+
+    failures = []
+    for notebook, name in ((published, "published"), (batched, "executed")):
+        if "tojupyter_execute" in notebook["metadata"]:
+            failures.append("the {} notebook carries the batching marker".format(name))
+    batched_cells, cell_cells = code_cells(batched), code_cells(by_cell)
+    if len(batched_cells) != len(cell_cells):
+        failures.append("{} code cells executed in batches, {} one by one".format(len(batched_cells), len(cell_cells)))
+    for index, (batched_cell, cell) in enumerate(zip(batched_cells, cell_cells)):
+        if batched_cell != cell:
+            failures.append("code cell {} differs:\n  batched: {}\n  one by one: {}".format(index, batched_cell, cell))
+    if not any(output["output_type"] == "error" for _, outputs in cell_cells for output in outputs):
+        failures.append("the failing cell did not fail")
+
+    print("{} code cells compared".format(len(cell_cells)))
+    if failures:
+        for failure in failures:
+            print("FAIL: " + failure)
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
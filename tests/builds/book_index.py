@@ -0,0 +1,64 @@
+"""
+PDF book index test for sphinx-tojupyter
+
+Builds ``tests/book_index``, a pdf book whose index lists ``self``, external
+links (one with a ``#`` fragment) and the references document next to its
+chapters, and checks that the index notebook has a ``\\part`` for each toctree
+caption and a ``\\chapter``/``\\input`` line for each chapter document only.
+
+Usage:
+    python tests/builds/book_index.py [--srcdir tests/book_index]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+EXPECTED = [
+    "\\cleardoublepage\\part{Introduction}",
+    "\\chapter{Introduction}\\input{intro.tex}",
+    "\\cleardoublepage\\part{Models}",
+    "\\chapter{Growth}\\input{growth.tex}",
+    "\\chapter{Markets}\\input{markets.tex}",
+]
+
+
+def build(srcdir, outdir):
+    subprocess.run(
+        [sys.executable, "-m", "sphinx", "-q", "-E", "-b", "jupyter", srcdir, outdir],
+        check=True, stdout=subprocess.DEVNULL
+    )
+
+
+def index_lines(filename):
+    """The \\part and \\chapter lines of the index notebook"""
+    with open(filename, encoding="UTF-8") as f:
+        notebook = json.load(f)
+    text = "".join("".join(cell["source"]) for cell in notebook["cells"])
+    return [line for line in text.splitlines() if line.startswith(("\\cleardoublepage\\part", "\\chapter"))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--srcdir", default=os.path.join("tests", "book_index"), help="project to build")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as outdir:
+        build(args.srcdir, outdir)
+        lines = index_lines(os.path.join(outdir, "index.ipynb"))
+
+    print("{} part and chapter lines in the book index".format(len(lines)))
+    if lines != EXPECTED:
+        print("FAIL: the book index does not list the parts and chapters of the book")
+        print("  expected:\n    " + "\n    ".join(EXPECTED))
+        print("  found:\n    " + "\n    ".join(lines))
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
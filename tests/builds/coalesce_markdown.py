@@ -0,0 +1,110 @@
+"""
+Markdown coalescing test for sphinx-tojupyter
+
+Builds ``tests/coalesce_markdown`` with ``tojupyter_coalesce_markdown`` off,
+on, and on with a ``tojupyter_coalesce_markdown_limit`` that only fits two
+sections. The cells of each notebook are compared with the expected ones, as
+their type and the paragraphs they contain:
+
+* coalescing merges adjacent markdown cells, but the code cell and the
+  ``:cell-break:`` still start new cells
+* with the limit, a merged cell stops growing once the next section would not fit
+* the notebook with slides is the same in every build, slide metadata included
+
+The markdown of each notebook, joined with blank lines, must not change.
+
+Usage:
+    python tests/builds/coalesce_markdown.py [--srcdir tests/coalesce_markdown]
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+LIMIT = 60
+PARAGRAPH = re.compile(r"Paragraph (\w+)\.")
+
+## the cells of prose.ipynb as (cell type, paragraphs), by build
+EXPECTED = {
+    "off": [
+        ("markdown", ["one"]), ("markdown", ["two"]), ("markdown", ["three"]), ("code", []),
+        ("markdown", ["four"]), ("markdown", ["five"]), ("markdown", ["six"]), ("markdown", ["seven"]),
+    ],
+    "on": [
+        ("markdown", ["one", "two", "three"]), ("code", []),
+        ("markdown", ["four"]), ("markdown", ["five", "six", "seven"]),
+    ],
+    "limit": [
+        ("markdown", ["one", "two"]), ("markdown", ["three"]), ("code", []),
+        ("markdown", ["four"]), ("markdown", ["five", "six"]), ("markdown", ["seven"]),
+    ],
+}
+OPTIONS = {
+    "off": [],
+    "on": ["-D", "tojupyter_coalesce_markdown=1"],
+    "limit": ["-D", "tojupyter_coalesce_markdown=1", "-D", "tojupyter_coalesce_markdown_limit={}".format(LIMIT)],
+}
+
+
+def build(srcdir, outdir, *options):
+    subprocess.run(
+        [sys.executable, "-m", "sphinx", "-q", "-b", "jupyter", srcdir, outdir] + list(options),
+        check=True, stdout=subprocess.DEVNULL
+    )
+
+
+def read(filename):
+    """The cells of the notebook `filename`, as (cell type, source, metadata)"""
+    with open(filename, encoding="UTF-8") as f:
+        notebook = json.load(f)
+    return [(cell["cell_type"], "".join(cell["source"]), cell["metadata"]) for cell in notebook["cells"]]
+
+
+def markdown(cells):
+    return "\n\n".join(source for cell_type, source, _ in cells if cell_type == "markdown")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--srcdir", default=os.path.join("tests", "coalesce_markdown"), help="project to build")
+    args = parser.parse_args()
+
+    failures = []
+    prose = dict()
+    slides = dict()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for name, options in OPTIONS.items():
+            outdir = os.path.join(tmpdir, name)
+            build(args.srcdir, outdir, "-d", os.path.join(tmpdir, name + "-doctrees"), *options)
+            prose[name] = read(os.path.join(outdir, "prose.ipynb"))
+            slides[name] = read(os.path.join(outdir, "slides.ipynb"))
+
+    for name, expected in EXPECTED.items():
+        cells = [(cell_type, PARAGRAPH.findall(source)) for cell_type, source, _ in prose[name]]
+        print("{}: {} cells in prose.ipynb, {} in slides.ipynb".format(name, len(cells), len(slides[name])))
+        if cells != expected:
+            failures.append("{}: prose.ipynb has the cells {} instead of {}".format(name, cells, expected))
+        if markdown(prose[name]) != markdown(prose["off"]):
+            failures.append("{}: the markdown of prose.ipynb differs from the build without coalescing".format(name))
+        if slides[name] != slides["off"]:
+            failures.append("{}: slides.ipynb differs from the build without coalescing".format(name))
+    if any("slideshow" not in metadata for cell_type, _, metadata in slides["off"] if cell_type == "markdown"):
+        failures.append("a markdown cell of slides.ipynb has no slideshow metadata")
+    for cell_type, source, _ in prose["limit"]:
+        if cell_type == "markdown" and len(source) > LIMIT:
+            failures.append("limit: a merged cell has {} characters, more than {}".format(len(source), LIMIT))
+
+    if failures:
+        for failure in failures:
+            print("FAIL: " + failure)
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""
+Reproducible build test for sphinx-tojupyter
+
+Builds two copies of ``tests/base``, in different directories, with
+``tojupyter_deterministic`` and ``SOURCE_DATE_EPOCH`` set. The notebooks of the
+two builds must be byte-identical, dated ``SOURCE_DATE_EPOCH`` and have an id
+for each cell, unique in the notebook. Without the option the notebooks of the
+two builds differ, since nbformat assigns random cell ids.
+
+Usage:
+    python tests/builds/deterministic.py [--srcdir tests/base]
+"""
+
+import argparse
+import glob
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+SOURCE_DATE_EPOCH = 1700000000
+
+
+def build(srcdir, outdir, *options):
+    env = dict(os.environ, SOURCE_DATE_EPOCH=str(SOURCE_DATE_EPOCH))
+    subprocess.run(
+        [sys.executable, "-m", "sphinx", "-q", "-b", "jupyter", srcdir, outdir] + list(options),
+        check=True, stdout=subprocess.DEVNULL, env=env
+    )
+
+
+def build_copy(source, tmpdir, name, *options):
+    """Build a copy of `source` and return the bytes of its notebooks, by file name"""
+    srcdir = os.path.join(tmpdir, name)
+    shutil.copytree(source, srcdir, ignore=shutil.ignore_patterns("_build"))
+    outdir = os.path.join(srcdir, "_build", "jupyter")
+    build(srcdir, outdir, *options)
+    notebooks = dict()
+    for filename in sorted(glob.glob(os.path.join(outdir, "*.ipynb"))):
+        with open(filename, "rb") as f:
+            notebooks[os.path.basename(filename)] = f.read()
+    return notebooks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--srcdir", default=os.path.join("tests", "base"), help="project to build")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        first = build_copy(args.srcdir, tmpdir, "first", "-D", "tojupyter_deterministic=1")
+        second = build_copy(args.srcdir, tmpdir, "second", "-D", "tojupyter_deterministic=1")
+        random_first = build_copy(args.srcdir, tmpdir, "random-first")
+        random_second = build_copy(args.srcdir, tmpdir, "random-second")
+
+    failures = []
+    if not first or sorted(first) != sorted(second):
+        failures.append("the builds wrote different notebooks: {} and {}".format(sorted(first), sorted(second)))
+    for name in sorted(set(first) & set(second)):
+        if first[name] != second[name]:
+            failures.append("{} differs between the builds".format(name))
+        notebook = json.loads(first[name])
+        if notebook["metadata"].get("date") != SOURCE_DATE_EPOCH:
+            failures.append("{} is dated {}".format(name, notebook["metadata"].get("date")))
+        ids = [cell.get("id") for cell in notebook["cells"]]
+        if None in ids or len(set(ids)) != len(ids):
+            failures.append("{} has missing or duplicate cell ids".format(name))
+    if random_first == random_second:
+        failures.append("the notebooks are identical without tojupyter_deterministic, so the comparison shows nothing")
+
+    print("{} notebooks compared".format(len(first)))
+    if failures:
+        for failure in failures:
+            print("FAIL: " + failure)
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+"""
+Image attachment test for sphinx-tojupyter
+
+Builds ``tests/glue`` with ``tojupyter_image_embed = "attachments"``, with and
+without ``tojupyter_coalesce_markdown``, and once with the default data URIs.
+In the attachment builds no markdown cell may contain a ``data:`` URI, and the
+``attachments`` of each markdown cell must be exactly the images it references
+as ``attachment:<name>``, each named after its content with the extension of
+its MIME type. Replacing every reference with its attachment must give the
+images of the data URI build, in the same order.
+
+Requires matplotlib.
+
+Usage:
+    python tests/builds/image_attachments.py [--srcdir tests/glue]
+"""
+
+import argparse
+import glob
+import json
+import mimetypes
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+
+CONF = """
+tojupyter_image_embed = "attachments"
+"""
+DATA_URI = re.compile(r"data:(image/[a-z+]+);base64,([A-Za-z0-9+/=]+)")
+ATTACHMENT = re.compile(r"attachment:([0-9a-f]{16}\.[a-z]+)")
+
+
+def build(srcdir, outdir, *options):
+    subprocess.run(
+        [sys.executable, "-m", "sphinx", "-q", "-b", "jupyter", srcdir, outdir] + list(options),
+        check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+
+def markdown_cells(outdir):
+    """The markdown cells of the notebooks of `outdir`, as (notebook name, cell) pairs"""
+    cells = []
+    for filename in sorted(glob.glob(os.path.join(outdir, "*.ipynb"))):
+        with open(filename, encoding="UTF-8") as f:
+            notebook = json.load(f)
+        cells.extend((os.path.basename(filename), cell) for cell in notebook["cells"]
+                     if cell["cell_type"] == "markdown")
+    return cells
+
+
+def embedded_images(outdir):
+    """The (MIME type, data) of the data URIs of the notebooks of `outdir`, by notebook, in order"""
+    images = dict()
+    for name, cell in markdown_cells(outdir):
+        images.setdefault(name, []).extend(DATA_URI.findall("".join(cell["source"])))
+    return images
+
+
+def check_attachments(outdir, label):
+    """The attached images of the notebooks of `outdir`, by notebook, in order, and the failures found"""
+    images = dict()
+    failures = []
+    for name, cell in markdown_cells(outdir):
+        source = "".join(cell["source"])
+        if DATA_URI.search(source):
+            failures.append("{}: {}: a markdown cell contains a data URI".format(label, name))
+        references = ATTACHMENT.findall(source)
+        attachments = cell.get("attachments", {})
+        if set(references) != set(attachments):
+            failures.append("{}: {}: the cell references {} but has the attachments {}".format(
+                label, name, sorted(set(references)), sorted(attachments)))
+        for attachment, bundle in attachments.items():
+            if len(bundle) != 1 or mimetypes.guess_extension(next(iter(bundle))) != os.path.splitext(attachment)[1]:
+                failures.append("{}: {}: attachment {} has the MIME types {}".format(
+                    label, name, attachment, sorted(bundle)))
+        images.setdefault(name, []).extend(next(iter(attachments[reference].items()))
+                                           for reference in references if reference in attachments)
+    return images, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--srcdir", default=os.path.join("tests", "glue"), help="project to build")
+    args = parser.parse_args()
+
+    failures = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        srcdir = os.path.join(tmpdir, "src")
+        shutil.copytree(args.srcdir, srcdir, ignore=shutil.ignore_patterns("_build"))
+        outdir = os.path.join(tmpdir, "data-uri")
+        build(srcdir, outdir)
+        expected = embedded_images(outdir)
+        count = sum(len(images) for images in expected.values())
+        print("{} images embedded as data URIs".format(count))
+        if not count:
+            failures.append("no glued image is embedded in the notebooks")
+
+        with open(os.path.join(srcdir, "conf.py"), "a", encoding="UTF-8") as f:
+            f.write(CONF)
+        for label, options in (("attachments", []), ("attachments, coalesced", ["-D", "tojupyter_coalesce_markdown=1"])):
+            outdir = os.path.join(tmpdir, label.replace(", ", "-"))
+            build(srcdir, outdir, *options)
+            images, found = check_attachments(outdir, label)
+            failures.extend(found)
+            print("{}: {} images referenced as attachments".format(label, sum(len(refs) for refs in images.values())))
+            if {name: refs for name, refs in images.items() if refs} != {name: refs for name, refs in expected.items() if refs}:
+                failures.append("{}: the attached images differ from the images embedded as data URIs".format(label))
+
+    if failures:
+        for failure in failures:
+            print("FAIL: " + failure)
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
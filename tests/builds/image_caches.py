@@ -0,0 +1,121 @@
+"""
+Image and translation cache test for sphinx-tojupyter
+
+Builds ``tests/glue`` with ``tojupyter_image_optimization`` and
+``tojupyter_translation_cache``, with the output and doctree directories in
+separate folders (``sphinx-build -d``). The stores of the image cache, the
+optimized images and the translation cache must be in the doctree directory and
+nowhere else, and the glued images embedded in the notebooks must be
+downscaled. The project is built again with the size limits of the stores set
+to 0, and every store must be empty after that build while the notebooks still
+embed the same images.
+
+Requires matplotlib and Pillow.
+
+Usage:
+    python tests/builds/image_caches.py [--srcdir tests/glue]
+"""
+
+import argparse
+import base64
+import glob
+import io
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+
+MAX_WIDTH = 300
+CONF = """
+tojupyter_image_optimization = {{"website": {{"max_width": {}}}}}
+tojupyter_translation_cache = True
+""".format(MAX_WIDTH)
+STORES = ("images", "optimized", "translations")
+DATA_URI = re.compile(r"data:image/png;base64,([A-Za-z0-9+/=]+)")
+
+
+def build(srcdir, outdir, doctreedir, *options):
+    subprocess.run(
+        [sys.executable, "-m", "sphinx", "-q", "-b", "jupyter", "-d", doctreedir, srcdir, outdir] + list(options),
+        check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+
+def embedded_images(outdir):
+    """The PNG images embedded in the notebooks of `outdir`"""
+    images = []
+    for filename in sorted(glob.glob(os.path.join(outdir, "*.ipynb"))):
+        with open(filename, encoding="UTF-8") as f:
+            notebook = json.load(f)
+        for cell in notebook["cells"]:
+            if cell["cell_type"] == "markdown":
+                images.extend(DATA_URI.findall("".join(cell["source"])))
+    return images
+
+
+def store_files(doctreedir):
+    """The number of files of each store of the cache"""
+    return {store: len(os.listdir(os.path.join(doctreedir, ".tojupyter-cache", store)))
+            if os.path.isdir(os.path.join(doctreedir, ".tojupyter-cache", store)) else 0
+            for store in STORES}
+
+
+def main():
+    from PIL import Image
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--srcdir", default=os.path.join("tests", "glue"), help="project to build")
+    args = parser.parse_args()
+
+    failures = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        srcdir = os.path.join(tmpdir, "src")
+        shutil.copytree(args.srcdir, srcdir, ignore=shutil.ignore_patterns("_build"))
+        with open(os.path.join(srcdir, "conf.py"), "a", encoding="UTF-8") as f:
+            f.write(CONF)
+        outdir = os.path.join(tmpdir, "www")
+        doctreedir = os.path.join(tmpdir, "doctrees")
+
+        build(srcdir, outdir, doctreedir)
+        images = embedded_images(outdir)
+        stores = store_files(doctreedir)
+        print("{} embedded images, cache files: {}".format(len(images), stores))
+        if not images:
+            failures.append("no glued image is embedded in the notebooks")
+        for data in images:
+            with Image.open(io.BytesIO(base64.b64decode(data))) as image:
+                if image.width > MAX_WIDTH:
+                    failures.append("an embedded image is {} pixels wide, wider than max_width".format(image.width))
+        for store, count in stores.items():
+            if not count:
+                failures.append("the {} store is empty or missing in the doctree directory".format(store))
+        for root, dirs, _ in os.walk(tmpdir):
+            if root == doctreedir:
+                dirs[:] = []
+            elif ".tojupyter-cache" in dirs:
+                failures.append("cache directory outside the doctree directory: {}".format(
+                    os.path.relpath(os.path.join(root, ".tojupyter-cache"), tmpdir)))
+
+        build(srcdir, outdir, doctreedir, "-E", "-D", "tojupyter_image_cache_size=0",
+              "-D", "tojupyter_translation_cache_size=0")
+        stores = store_files(doctreedir)
+        print("cache files after a build with size limits of 0: {}".format(stores))
+        for store, count in stores.items():
+            if count:
+                failures.append("{} files left in the {} store, whose size limit is 0".format(count, store))
+        if embedded_images(outdir) != images:
+            failures.append("the embedded images changed when the stores were pruned")
+
+    if failures:
+        for failure in failures:
+            print("FAIL: " + failure)
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,167 @@
+"""
+Incremental build test for sphinx-tojupyter
+
+Builds a copy of ``tests/base`` with the jupyter builder and rebuilds it with
+each of the features that avoid work on unchanged documents:
+
+* the build manifest (``tojupyter_build_manifest``): a rebuild of the unchanged
+  project translates nothing, ``sphinx-build -a`` translates every document
+  again, and so does a rebuild after a file is added to ``templates_path``
+* compare-before-write (``tojupyter_compare_before_write``): with the manifest
+  off, ``sphinx-build -E`` translates every document again but leaves the files
+  whose bytes did not change untouched; with the option off they are rewritten
+* the translation cache (``tojupyter_translation_cache``): a second
+  ``sphinx-build -E`` takes every notebook from the cache, except those of the
+  documents that copy ``jupyter-dependency`` files, which are always translated
+
+Every rebuild must produce the same notebooks as the first build. The builds
+set ``tojupyter_deterministic`` and ``SOURCE_DATE_EPOCH`` so that notebooks are
+byte-identical between builds.
+
+Usage:
+    python tests/builds/incremental.py [--srcdir tests/base]
+"""
+
+import argparse
+import glob
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+
+## modification time given to the notebooks before each rebuild, to see which ones were rewritten
+OLD_MTIME = 1000000000
+
+
+def build(srcdir, outdir, *options):
+    """Run the jupyter builder and return its output"""
+    env = dict(os.environ, SOURCE_DATE_EPOCH="1700000000")
+    process = subprocess.run(
+        [sys.executable, "-m", "sphinx", "-N", "-b", "jupyter", srcdir, outdir,
+         "-D", "tojupyter_deterministic=1"] + list(options),
+        check=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, env=env, text=True
+    )
+    return process.stdout
+
+
+def snapshot(outdir):
+    """The bytes of the notebooks of `outdir`, by file name"""
+    notebooks = dict()
+    for filename in sorted(glob.glob(os.path.join(outdir, "*.ipynb"))):
+        with open(filename, "rb") as f:
+            notebooks[os.path.basename(filename)] = f.read()
+    return notebooks
+
+
+def age(outdir):
+    for filename in glob.glob(os.path.join(outdir, "*.ipynb")):
+        os.utime(filename, (OLD_MTIME, OLD_MTIME))
+
+
+def rewritten(outdir):
+    """The notebooks written since `age`"""
+    return sorted(os.path.basename(filename) for filename in glob.glob(os.path.join(outdir, "*.ipynb"))
+                  if os.path.getmtime(filename) != OLD_MTIME)
+
+
+def copying_files(srcdir):
+    """The documents of `srcdir` that copy files to the output directory"""
+    documents = []
+    for filename in glob.glob(os.path.join(srcdir, "*.rst")):
+        with open(filename, encoding="UTF-8") as f:
+            if ".. jupyter-dependency::" in f.read():
+                documents.append(filename)
+    return documents
+
+
+def translated(output):
+    """The number of notebooks handed to the writer by the build, written or skipped as unchanged"""
+    match = re.search(r"notebooks written: (\d+), unchanged and skipped: (\d+)", output)
+    return int(match.group(1)) + int(match.group(2)) if match else 0
+
+
+def reported(output, pattern):
+    """The number logged by the build in the message matching `pattern`, or 0"""
+    match = re.search(pattern, output)
+    return int(match.group(1)) if match else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--srcdir", default=os.path.join("tests", "base"), help="project to build")
+    args = parser.parse_args()
+
+    failures = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        srcdir = os.path.join(tmpdir, "src")
+        shutil.copytree(args.srcdir, srcdir, ignore=shutil.ignore_patterns("_build"))
+        outdir = os.path.join(srcdir, "_build", "jupyter")
+        build(srcdir, outdir)
+        expected = snapshot(outdir)
+        count = len(expected)
+        print("{} notebooks built".format(count))
+
+        def check(name, output):
+            if snapshot(outdir) != expected:
+                failures.append("{}: the notebooks differ from the first build".format(name))
+            return output
+
+        ## build manifest
+        age(outdir)
+        output = check("manifest", build(srcdir, outdir))
+        print("manifest: {} notebooks translated by a rebuild".format(translated(output)))
+        if translated(output) or rewritten(outdir):
+            failures.append("manifest: {} notebooks translated by a rebuild, rewritten: {}".format(
+                translated(output), ", ".join(rewritten(outdir))))
+        output = check("manifest -a", build(srcdir, outdir, "-a"))
+        up_to_date = reported(output, r"(\d+) notebooks are up to date")
+        print("manifest: {} notebooks translated with -a".format(translated(output)))
+        if up_to_date or translated(output) != count or rewritten(outdir):
+            failures.append("manifest -a: {} of {} notebooks translated, {} up to date, rewritten: {}".format(
+                translated(output), count, up_to_date, ", ".join(rewritten(outdir))))
+        ## sphinx does not re-read the documents for a template, only the manifest notices it
+        os.makedirs(os.path.join(srcdir, "_templates"), exist_ok=True)
+        with open(os.path.join(srcdir, "_templates", "layout.html"), "w", encoding="UTF-8") as f:
+            f.write("{% extends \"!layout.html\" %}\n")
+        output = check("manifest template", build(srcdir, outdir))
+        print("manifest: {} notebooks translated after a template change".format(translated(output)))
+        if translated(output) != count:
+            failures.append("manifest template: {} of {} notebooks translated after a template change".format(
+                translated(output), count))
+
+        ## compare-before-write
+        age(outdir)
+        output = check("compare-before-write", build(srcdir, outdir, "-E", "-D", "tojupyter_build_manifest=0"))
+        skipped = reported(output, r"unchanged and skipped: (\d+)")
+        print("compare-before-write: {} notebooks unchanged and skipped".format(skipped))
+        if skipped != count or rewritten(outdir):
+            failures.append("compare-before-write: {} of {} notebooks skipped, rewritten: {}".format(
+                skipped, count, ", ".join(rewritten(outdir))))
+        age(outdir)
+        check("compare-before-write off", build(srcdir, outdir, "-E", "-D", "tojupyter_build_manifest=0",
+                                                "-D", "tojupyter_compare_before_write=0"))
+        if len(rewritten(outdir)) != count:
+            failures.append("compare-before-write off: {} of {} notebooks rewritten".format(len(rewritten(outdir)), count))
+
+        ## translation cache
+        options = ["-E", "-D", "tojupyter_translation_cache=1"]
+        check("translation cache (filled)", build(srcdir, outdir, *options))
+        output = check("translation cache", build(srcdir, outdir, *options))
+        cached = reported(output, r"(\d+) notebooks were taken from the translation cache")
+        print("translation cache: {} notebooks taken from the cache".format(cached))
+        cacheable = count - len(copying_files(srcdir))
+        if cached != cacheable:
+            failures.append("translation cache: {} of {} notebooks taken from the cache".format(cached, cacheable))
+
+    if failures:
+        for failure in failures:
+            print("FAIL: " + failure)
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
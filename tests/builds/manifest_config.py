@@ -0,0 +1,62 @@
+"""
+Build manifest regression test for sphinx-tojupyter
+
+Builds a copy of ``tests/base`` with the jupyter builder, then builds it again
+with ``rst_epilog`` set on the command line. The option is not a
+``tojupyter_*`` option, but Sphinx re-reads every document for it, so every
+notebook must be rebuilt and end with the epilog. The test fails when a
+notebook was reported up to date by the build manifest instead.
+
+Usage:
+    python tests/builds/manifest_config.py [--srcdir tests/base]
+"""
+
+import argparse
+import glob
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+MARKER = "Text added by rst_epilog."
+
+
+def build(srcdir, outdir, *options):
+    subprocess.run(
+        [sys.executable, "-m", "sphinx", "-q", "-b", "jupyter", srcdir, outdir] + list(options),
+        check=True, stdout=subprocess.DEVNULL
+    )
+
+
+def notebook_text(filename):
+    with open(filename, encoding="UTF-8") as f:
+        notebook = json.load(f)
+    return "".join("".join(cell["source"]) for cell in notebook["cells"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--srcdir", default=os.path.join("tests", "base"), help="project to build")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        srcdir = os.path.join(tmpdir, "src")
+        shutil.copytree(args.srcdir, srcdir, ignore=shutil.ignore_patterns("_build"))
+        outdir = os.path.join(srcdir, "_build", "jupyter")
+        build(srcdir, outdir)
+        build(srcdir, outdir, "-D", "rst_epilog=\n\n" + MARKER + "\n")
+        notebooks = sorted(glob.glob(os.path.join(outdir, "*.ipynb")))
+        missing = [os.path.basename(nb) for nb in notebooks if MARKER not in notebook_text(nb)]
+
+    print("{} notebooks rebuilt after changing rst_epilog".format(len(notebooks) - len(missing)))
+    if not notebooks or missing:
+        print("FAIL: notebooks left as they were before the configuration change: {}".format(", ".join(missing)))
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
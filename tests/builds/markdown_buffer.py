@@ -0,0 +1,192 @@
+"""
+Markdown buffer test for sphinx-tojupyter
+
+Checks ``MarkdownBuffer`` against a plain list of strings that applies each
+indent at once, by rewriting the entries it covers in place, as the translator
+did before the indents were deferred to ``MarkdownBuffer.text``. After every
+operation the text, the entries read back one by one and the iteration of the
+two must be the same.
+
+The fixed cases cover nested list items, indents whose ranges overlap without
+nesting, and ``strip_last`` on an entry covered by an indent that is still
+open, followed by more indents. Random sequences of operations, from a fixed
+seed, cover the rest.
+
+Usage:
+    python tests/builds/markdown_buffer.py [--sequences 2000] [--seed 0]
+"""
+
+import argparse
+import random
+import sys
+
+from sphinx_tojupyter.writers.markdown import MarkdownBuffer
+
+
+class ReferenceBuffer():
+    """The markdown as a list of strings, indented in place"""
+
+    def __init__(self):
+        self.lines = []
+
+    def append(self, text):
+        self.lines.append(text)
+
+    def mark(self):
+        return len(self.lines)
+
+    def indent(self, mark, indent):
+        for index in range(mark, len(self.lines)):
+            self.lines[index] = self.lines[index].replace("\n", "\n" + indent)
+
+    def strip_last(self, suffix):
+        if self.lines and self.lines[-1].endswith(suffix):
+            self.lines[-1] = self.lines[-1][:-len(suffix)]
+
+    def pop(self, index=-1):
+        return self.lines.pop(index)
+
+    def remove(self, text):
+        self.lines.remove(text)
+
+    def __setitem__(self, index, text):
+        self.lines[index] = text
+
+    def text(self):
+        return "".join(self.lines)
+
+
+def compare(buffer, reference):
+    """The differences between `buffer` and `reference`, as messages"""
+    differences = []
+    if buffer.text() != reference.text():
+        differences.append("text {!r} instead of {!r}".format(buffer.text(), reference.text()))
+    if list(buffer) != reference.lines:
+        differences.append("entries {!r} instead of {!r}".format(list(buffer), reference.lines))
+    for index in range(len(reference.lines)):
+        if buffer[index] != reference.lines[index] or buffer[index - len(reference.lines)] != reference.lines[index]:
+            differences.append("entry {} is {!r} instead of {!r}".format(index, buffer[index], reference.lines[index]))
+    return differences
+
+
+def run(operations):
+    """Apply `operations`, as (method, arguments) pairs, to both buffers and return the first differences"""
+    buffer = MarkdownBuffer()
+    reference = ReferenceBuffer()
+    for step, (method, arguments) in enumerate(operations):
+        if method == "setitem":
+            buffer[arguments[0]] = arguments[1]
+            reference[arguments[0]] = arguments[1]
+        else:
+            result = getattr(buffer, method)(*arguments)
+            expected = getattr(reference, method)(*arguments)
+            if result != expected:
+                return ["step {} {}{!r} returned {!r} instead of {!r}".format(step, method, arguments, result, expected)]
+        differences = compare(buffer, reference)
+        if differences:
+            return ["step {} {}{!r}: {}".format(step, method, arguments, difference) for difference in differences]
+    return []
+
+
+## each case is a list of (method, arguments); the marks are the positions `mark` would return
+CASES = {
+    "nested list items": [
+        ("append", ("- outer\n",)),
+        ("append", ("- inner\nline\n",)),
+        ("append", ("- innermost\nline\n",)),
+        ("indent", (2, "  ")),
+        ("append", ("more\ntext\n",)),
+        ("indent", (1, "  ")),
+        ("indent", (0, "  ")),
+        ("append", ("after\nthe list\n",)),
+    ],
+    "overlapping indents": [
+        ("append", ("a\n",)),
+        ("append", ("b\n",)),
+        ("indent", (1, "  ")),
+        ("append", ("c\n",)),
+        ("append", ("d\n",)),
+        ("indent", (2, "    ")),
+        ("indent", (0, "> ")),
+        ("append", ("e\nf\n",)),
+        ("indent", (3, "\t")),
+    ],
+    "strip_last in an open indent": [
+        ("append", ("- item\n",)),
+        ("append", ("paragraph\n\n",)),
+        ("indent", (1, "  ")),
+        ("strip_last", ("\n",)),
+        ("append", ("- nested\n\n",)),
+        ("indent", (0, "  ")),
+        ("strip_last", ("\n",)),
+        ("indent", (0, "  ")),
+        ("strip_last", ("\n",)),
+        ("append", ("\n",)),
+    ],
+    "assignments and removals under indents": [
+        ("append", ("x\n",)),
+        ("append", ("y\n",)),
+        ("append", ("z\n",)),
+        ("indent", (1, "  ")),
+        ("setitem", (1, "w\nv\n")),
+        ("indent", (0, "- ")),
+        ("pop", (0,)),
+        ("append", ("u\n",)),
+        ("indent", (1, "  ")),
+        ("remove", ("z\n  -   ",)),
+        ("indent", (0, "  ")),
+    ],
+}
+
+TEXTS = ["a", "\n", "b\n", "\nc", "d\n\n", "e\nf\n", "\n\n"]
+INDENTS = ["  ", "   ", "\t", "> "]
+
+
+def random_operations(generator, length):
+    """A random sequence of `length` operations, valid for the buffers they are applied to"""
+    operations = []
+    size = 0
+    for _ in range(length):
+        choice = generator.random()
+        if not size or choice < 0.4:
+            operations.append(("append", (generator.choice(TEXTS),)))
+            size += 1
+        elif choice < 0.7:
+            operations.append(("indent", (generator.randrange(size + 1), generator.choice(INDENTS))))
+        elif choice < 0.8:
+            operations.append(("strip_last", (generator.choice(["\n", "\n\n", "a"]),)))
+        elif choice < 0.9:
+            operations.append(("setitem", (generator.randrange(size), generator.choice(TEXTS))))
+        else:
+            operations.append(("pop", (generator.randrange(-size, size),)))
+            size -= 1
+    return operations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sequences", type=int, default=2000, help="number of random sequences of operations")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random sequences")
+    args = parser.parse_args()
+
+    failures = []
+    for name, operations in CASES.items():
+        failures.extend("{}: {}".format(name, difference) for difference in run(operations))
+    generator = random.Random(args.seed)
+    for sequence in range(args.sequences):
+        differences = run(random_operations(generator, generator.randrange(1, 40)))
+        if differences:
+            failures.extend("random sequence {}: {}".format(sequence, difference) for difference in differences)
+            break
+
+    print("{} fixed cases and {} random sequences checked".format(len(CASES), args.sequences))
+    if failures:
+        for failure in failures:
+            print("FAIL: " + failure)
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
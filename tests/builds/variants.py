@@ -0,0 +1,117 @@
+"""
+Notebook variants test for sphinx-tojupyter
+
+Builds a copy of ``tests/base`` for the website with download notebooks
+(``tojupyter_download_nb``) and a ``_solutions`` variant
+(``tojupyter_notebook_variants``), each with its own link and image urlpaths.
+Every document is translated once for all of them, so the test checks that
+each notebook gets the urlpaths of its own variant, that solutions and tests
+are only kept in the variant that keeps them, and that no placeholder of the
+shared translation is left in any notebook.
+
+Usage:
+    python tests/builds/variants.py [--srcdir tests/base]
+"""
+
+import argparse
+import glob
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+CONF = """
+tojupyter_target_html = True
+tojupyter_urlpath = "https://site.example/"
+tojupyter_image_urlpath = "https://site.example/img/"
+tojupyter_download_nb = True
+tojupyter_download_nb_urlpath = "https://download.example/"
+tojupyter_download_nb_image_urlpath = "https://download.example/img/"
+tojupyter_drop_solutions = True
+tojupyter_drop_tests = True
+tojupyter_notebook_variants = {
+    "_solutions": {"urlpath": "https://solutions.example/", "drop_solutions": False, "drop_tests": False},
+}
+"""
+
+## text that must be present (True) or absent (False) in each notebook, by folder
+EXPECTED = {
+    "": {
+        "links": {"](https://site.example/links_target.html": True},
+        "images": {"](https://site.example/img/hood.jpg)": True},
+        "solutions": {"np.linspace": False},
+        "tests": {"@test x == 3": False},
+    },
+    "_downloads": {
+        "links": {"](https://download.example/links_target.html": True},
+        "images": {"](https://download.example/img/hood.jpg)": True},
+        "solutions": {"np.linspace": False},
+        "tests": {"@test x == 3": False},
+    },
+    "_solutions": {
+        "links": {"](https://solutions.example/links_target.html": True},
+        ## the variant has no image urlpath, so it uses the one of the site
+        "images": {"](https://site.example/img/hood.jpg)": True},
+        "solutions": {"np.linspace": True},
+        "tests": {"@test x == 3": True},
+    },
+}
+
+
+def build(srcdir, outdir):
+    subprocess.run(
+        [sys.executable, "-m", "sphinx", "-q", "-b", "jupyter", srcdir, outdir],
+        check=True, stdout=subprocess.DEVNULL
+    )
+
+
+def read(filename):
+    """The text of the cells of the notebook `filename`"""
+    with open(filename, encoding="UTF-8") as f:
+        notebook = json.load(f)
+    return "".join("".join(cell["source"]) for cell in notebook["cells"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--srcdir", default=os.path.join("tests", "base"), help="project to build")
+    args = parser.parse_args()
+
+    failures = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        srcdir = os.path.join(tmpdir, "src")
+        shutil.copytree(args.srcdir, srcdir, ignore=shutil.ignore_patterns("_build"))
+        with open(os.path.join(srcdir, "conf.py"), "a", encoding="UTF-8") as f:
+            f.write(CONF)
+        outdir = os.path.join(srcdir, "_build", "jupyter")
+        build(srcdir, outdir)
+
+        for folder, documents in EXPECTED.items():
+            for docname, texts in documents.items():
+                filename = os.path.join(outdir, folder, docname + ".ipynb")
+                if not os.path.exists(filename):
+                    failures.append("{} was not written".format(os.path.join(folder, docname + ".ipynb")))
+                    continue
+                notebook = read(filename)
+                for text, present in texts.items():
+                    if (text in notebook) != present:
+                        failures.append("{}: {!r} is {}".format(
+                            os.path.join(folder, docname + ".ipynb"), text, "missing" if present else "present"))
+        notebooks = [filename for folder in EXPECTED for filename in glob.glob(os.path.join(outdir, folder, "*.ipynb"))]
+        for filename in notebooks:
+            if "\ue000" in read(filename):
+                failures.append("{} contains an unresolved urlpath placeholder".format(os.path.relpath(filename, outdir)))
+
+    print("{} notebooks checked".format(len(notebooks)))
+    if failures:
+        for failure in failures:
+            print("FAIL: " + failure)
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,27 @@
+# Configuration file for the markdown coalescing tests
+
+# -- Project information -----------------------------------------------------
+project = 'Coalesce Markdown Test'
+copyright = '2025, QuantEcon'
+author = 'QuantEcon'
+
+# -- General configuration ---------------------------------------------------
+extensions = [
+    'sphinx_tojupyter'
+]
+
+# Jupyter configuration
+tojupyter_build_manifest = False
+tojupyter_kernels = {
+    "python3": {
+        "kernelspec": {
+            "display_name": "Python",
+            "language": "python3",
+            "name": "python3"
+        },
+        "file_extension": ".py",
+    },
+}
+tojupyter_default_lang = "python3"
+
+exclude_patterns = ['_build', 'Thumbs.db', '.DS_Store', 'README.md']